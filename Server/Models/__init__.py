@@ -1,5 +1,16 @@
-from Models.item import Item, Base
-from Models.database import engine, SessionLocal, get_db, init_db
+from Models.item import Item, Base, DEFAULT_LIST_ID, ITEM_COLUMNS, item_to_dict
+from Models.grocery_list import GroceryList, can_access_list, new_list_token, ensure_default_list
+from Models.changes import ItemTombstone, current_version, allocate_versions, add_tombstones, get_changes
+from Models.conversation import ConversationMessage
+from Models.writes import matching_item_id, insert_item, update_item_checked, delete_item_row
+from Models.database import engine, SessionLocal, get_db, get_session_factory, init_db
 
-__all__ = ["Item", "Base", "engine", "SessionLocal", "get_db", "init_db"]
+__all__ = [
+    "Item", "Base", "DEFAULT_LIST_ID", "ITEM_COLUMNS", "item_to_dict",
+    "GroceryList", "can_access_list", "new_list_token", "ensure_default_list",
+    "ItemTombstone", "current_version", "allocate_versions", "add_tombstones", "get_changes",
+    "ConversationMessage",
+    "matching_item_id", "insert_item", "update_item_checked", "delete_item_row",
+    "engine", "SessionLocal", "get_db", "get_session_factory", "init_db",
+]
 
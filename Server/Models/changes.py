@@ -0,0 +1,119 @@
+from collections import defaultdict
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from Models.item import Base, Item, DEFAULT_LIST_ID
+from Models.grocery_list import GroceryList
+
+
+class ItemTombstone(Base):
+    """
+    Record of a deleted item, kept so delta sync can report deletions
+    """
+    __tablename__ = "item_tombstones"
+    __table_args__ = (
+        Index("ix_item_tombstones_list_version", "list_id", "version"),
+        Index("ix_item_tombstones_list_deleted_at", "list_id", "deleted_at"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    list_id = Column(Integer, ForeignKey("lists.id"), nullable=False)
+    item_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<ItemTombstone(item_id={self.item_id}, version={self.version})>"
+
+
+def current_version(db: Session, list_id: int = DEFAULT_LIST_ID) -> int:
+    """Return the highest change version written so far to a list"""
+    return db.execute(select(GroceryList.version).where(GroceryList.id == list_id)).scalar() or 0
+
+
+def allocate_versions(db: Session, list_id: int, count: int = 1) -> int:
+    """
+    Reserve the next count change versions of a list and return the last one.
+
+    UPDATE ... RETURNING locks the list row until the transaction ends, so
+    concurrent writers to a list never share a version and commit in version
+    order; a client synced past a version can never miss an earlier one.
+    """
+    return db.execute(
+        update(GroceryList)
+        .where(GroceryList.id == list_id)
+        .values(version=GroceryList.version + count)
+        .returning(GroceryList.version),
+        execution_options={"synchronize_session": False},
+    ).scalar_one()
+
+
+def add_tombstones(db: Session, list_id: int, item_ids: list[int], version: int):
+    """Record deletions made by bulk statements, which skip the flush listener"""
+    if item_ids:
+        db.execute(
+            insert(ItemTombstone),
+            [{"list_id": list_id, "item_id": item_id, "version": version} for item_id in item_ids],
+        )
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_versions(session, flush_context, instances):
+    """Give every created, modified or deleted item the next change version of its list"""
+    changed = defaultdict(list)
+    deleted = defaultdict(list)
+    for obj in session.new:
+        if isinstance(obj, Item):
+            changed[obj.list_id or DEFAULT_LIST_ID].append(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Item) and session.is_modified(obj):
+            changed[obj.list_id].append(obj)
+    for obj in session.deleted:
+        if isinstance(obj, Item):
+            deleted[obj.list_id].append(obj)
+
+    for list_id in changed.keys() | deleted.keys():
+        count = len(changed[list_id]) + len(deleted[list_id])
+        version = allocate_versions(session, list_id, count) - count
+        for item in changed[list_id]:
+            version += 1
+            item.list_id = list_id
+            item.version = version
+        for item in deleted[list_id]:
+            version += 1
+            # Also stamped on the deleted instance so callers can publish the version
+            item.version = version
+            session.add(ItemTombstone(list_id=list_id, item_id=item.id, version=version))
+
+
+def get_changes(db: Session, list_id: int, since) -> dict:
+    """
+    Return items of a list changed and ids deleted after a cursor.
+
+    since is either a version number or a datetime; version cursors are exact,
+    timestamp cursors are bounded by the database clock resolution.
+    """
+    if isinstance(since, int):
+        item_filter = Item.version > since
+        tombstone_filter = ItemTombstone.version > since
+    else:
+        item_filter = Item.updated_at > since
+        tombstone_filter = ItemTombstone.deleted_at > since
+
+    items = (
+        db.query(Item)
+        .filter(Item.list_id == list_id, item_filter)
+        .order_by(Item.version)
+        .all()
+    )
+    tombstones = (
+        db.query(ItemTombstone.item_id)
+        .filter(ItemTombstone.list_id == list_id, tombstone_filter)
+        .order_by(ItemTombstone.version)
+        .all()
+    )
+    return {
+        "version": current_version(db, list_id),
+        "items": [item.to_dict() for item in items],
+        "deleted": [item_id for (item_id,) in tombstones],
+    }
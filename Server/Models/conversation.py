@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from sqlalchemy.sql import func
+
+from Models.item import Base
+
+
+class ConversationMessage(Base):
+    """
+    SQLAlchemy model for one turn of a /chat conversation
+    """
+    __tablename__ = "conversation_messages"
+    __table_args__ = (
+        Index("ix_conversation_messages_conversation_id", "conversation_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    conversation_id = Column(String(64), nullable=False)
+    role = Column(String(16), nullable=False)
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<ConversationMessage(conversation_id='{self.conversation_id}', role='{self.role}')>"
+
+    def to_message(self):
+        """Convert to the {"role", "content"} shape sent to the LLM"""
+        return {"role": self.role, "content": self.content}
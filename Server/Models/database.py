@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, Session
 from dotenv import load_dotenv
 
@@ -32,8 +32,76 @@ def get_db() -> Session:
         db.close()
 
 
+def get_session_factory():
+    """
+    Dependency for connections that outlive a request, such as WebSockets.
+    They open a short-lived session per unit of work instead of holding a
+    pooled connection for as long as the client stays connected.
+    """
+    return SessionLocal
+
+
+# Columns added to tables that existed in an earlier release: (table, column, definition)
+ADDED_COLUMNS = (
+    ("items", "list_id", "INTEGER NOT NULL DEFAULT 1"),
+    ("items", "version", "INTEGER NOT NULL DEFAULT 0"),
+    ("item_tombstones", "list_id", "INTEGER NOT NULL DEFAULT 1"),
+    ("lists", "version", "INTEGER NOT NULL DEFAULT 0"),
+    ("lists", "token", "VARCHAR(64)"),
+)
+
+
+def upgrade_schema():
+    """
+    Bring tables created by an earlier release up to the current models.
+
+    create_all only creates missing tables, so the columns added since are
+    added here: existing items and tombstones belong to the default list (1)
+    and lists.version starts at the highest change version already written.
+    Lists other than the default one get a token, printed once so it can be
+    handed to the household. Missing indexes are created too.
+    """
+    from Models.item import Base, DEFAULT_LIST_ID
+    from Models.grocery_list import new_list_token
+    existing = {
+        table: {column["name"] for column in inspect(engine).get_columns(table)}
+        for table in {table for table, _, _ in ADDED_COLUMNS}
+    }
+    with engine.begin() as connection:
+        for table, column, definition in ADDED_COLUMNS:
+            if column in existing[table]:
+                continue
+            print(f"Adding {table}.{column}")
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+            if (table, column) == ("lists", "version"):
+                for source in ("items", "item_tombstones"):
+                    latest = f"(SELECT MAX(version) FROM {source} WHERE {source}.list_id = lists.id)"
+                    connection.execute(text(f"UPDATE lists SET version = {latest} WHERE {latest} > version"))
+            if (table, column) == ("lists", "token"):
+                list_ids = connection.execute(
+                    text("SELECT id FROM lists WHERE id != :default ORDER BY id"), {"default": DEFAULT_LIST_ID}
+                ).scalars().all()
+                for list_id in list_ids:
+                    token = new_list_token()
+                    connection.execute(text("UPDATE lists SET token = :token WHERE id = :id"), {"token": token, "id": list_id})
+                    print(f"List {list_id} token: {token}")
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+
 def init_db():
     """Initialize database tables"""
     from Models.item import Base, Item
+    from Models.grocery_list import GroceryList, ensure_default_list
+    from Models.changes import ItemTombstone
+    from Models.conversation import ConversationMessage
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+
+    db = SessionLocal()
+    try:
+        ensure_default_list(db)
+    finally:
+        db.close()
 
@@ -0,0 +1,62 @@
+import secrets
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from Models.item import Base, DEFAULT_LIST_ID
+
+
+class GroceryList(Base):
+    """
+    SQLAlchemy model for a household's grocery list
+    """
+    __tablename__ = "lists"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    name = Column(String(255), nullable=False)
+    # Last change version handed out for the list's items; see allocate_versions
+    version = Column(Integer, default=0, server_default="0", nullable=False)
+    # Secret clients send to use the list; lists without one (the default list) are open
+    token = Column(String(64), unique=True, index=True, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<GroceryList(id={self.id}, name='{self.name}')>"
+
+    def to_dict(self):
+        """Convert the GroceryList object to a dictionary"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+
+
+def new_list_token() -> str:
+    """An unguessable list token"""
+    return secrets.token_urlsafe(32)
+
+
+# Lists are never deleted and their tokens never change, so a list read once
+# skips the lookup: list id -> token (None for open lists)
+_list_tokens: dict[int, str | None] = {}
+
+
+def can_access_list(db: Session, list_id: int, token: str | None) -> bool:
+    """Check that a list exists and that token is its token (any token for open lists)"""
+    if list_id not in _list_tokens:
+        grocery_list = db.get(GroceryList, list_id)
+        if grocery_list is None:
+            return False
+        _list_tokens[list_id] = grocery_list.token
+    expected = _list_tokens[list_id]
+    return expected is None or (token is not None and secrets.compare_digest(expected, token))
+
+
+def ensure_default_list(db: Session):
+    """Create the list used by clients that do not pass a list_id"""
+    if db.get(GroceryList, DEFAULT_LIST_ID) is None:
+        # Let the database assign the id so Postgres sequences stay in step;
+        # lists are never deleted, so on a fresh table this is DEFAULT_LIST_ID
+        db.add(GroceryList(name="Default"))
+        db.commit()
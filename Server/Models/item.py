@@ -1,33 +1,54 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from datetime import datetime
 
 Base = declarative_base()
 
+# List used by clients that do not pass a list_id
+DEFAULT_LIST_ID = 1
+
 
 class Item(Base):
     """
     SQLAlchemy model for grocery list items
     """
     __tablename__ = "items"
+    __table_args__ = (
+        # Every query is scoped to one list, so list_id leads each index
+        Index("ix_items_list_checked_id", "list_id", "checked", "id"),
+        Index("ix_items_list_version", "list_id", "version"),
+        Index("ix_items_list_updated_at", "list_id", "updated_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    list_id = Column(Integer, ForeignKey("lists.id"), default=DEFAULT_LIST_ID, nullable=False)
     description = Column(String(255), nullable=False)
     checked = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    # Per-list change sequence number used by delta sync, stamped on every write
+    version = Column(Integer, default=0, nullable=False)
     
     def __repr__(self):
         return f"<Item(id={self.id}, description='{self.description}', checked={self.checked})>"
     
     def to_dict(self):
         """Convert the Item object to a dictionary"""
-        return {
-            "id": self.id,
-            "description": self.description,
-            "checked": self.checked,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
+        return item_to_dict(self)
+
+
+# Columns of the public item shape, for statements that return rows instead of objects
+ITEM_COLUMNS = (Item.id, Item.description, Item.checked, Item.created_at, Item.updated_at)
+
+
+def item_to_dict(item):
+    """Convert an Item or a result row selected with ITEM_COLUMNS to a dictionary"""
+    return {
+        "id": item.id,
+        "description": item.description,
+        "checked": item.checked,
+        "created_at": item.created_at.isoformat() if item.created_at else None,
+        "updated_at": item.updated_at.isoformat() if item.updated_at else None,
+    }
 
@@ -34,3 +34,30 @@ class ItemCheckedUpdate(BaseModel):
     """Schema for updating only the checked status"""
     checked: bool
 
+
+
+class ItemBatchCreate(BaseModel):
+    """Schema for creating several items in one request"""
+    items: list[ItemCreate] = Field(..., min_length=1, max_length=1000)
+
+
+class ItemsCheckedBatchUpdate(BaseModel):
+    """Schema for updating the checked status of several items at once"""
+    checked: bool
+    ids: Optional[list[int]] = Field(None, max_length=1000, description="Items to update; every item when omitted")
+
+
+class GroceryListCreate(BaseModel):
+    """Schema for creating a new grocery list"""
+    name: str = Field(..., min_length=1, max_length=255, description="List name, e.g. the household")
+
+
+class GroceryListResponse(BaseModel):
+    """Schema for a newly created GroceryList"""
+    id: int
+    name: str
+    token: str = Field(..., description="Secret to send as X-List-Token (or token) with every request to the list")
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,71 @@
+from sqlalchemy import case, delete, func, insert, literal, select, update
+from sqlalchemy.orm import Session
+
+from Models.item import Item, ITEM_COLUMNS
+from Models.changes import ItemTombstone, allocate_versions
+
+
+def matching_item_id(list_id: int, value: str):
+    """
+    Subquery selecting the item of a list that value refers to.
+
+    An exact (case-insensitive) description wins over one that only contains
+    value, so "milk" picks "Milk" before "Almond milk"; ties go to the oldest item.
+    """
+    return (
+        select(Item.id)
+        .where(Item.list_id == list_id, Item.description.ilike(f"%{value}%"))
+        .order_by(case((func.lower(Item.description) == value.lower(), 0), else_=1), Item.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def insert_item(db: Session, list_id: int, description: str, checked: bool = False):
+    """Insert an item with INSERT ... RETURNING and return its row"""
+    return db.execute(
+        insert(Item)
+        .values(list_id=list_id, description=description, checked=checked, version=allocate_versions(db, list_id))
+        .returning(*ITEM_COLUMNS, Item.version)
+    ).one()
+
+
+def update_item_checked(db: Session, list_id: int, item_id, checked: bool):
+    """
+    Set checked on one item with UPDATE ... RETURNING; None when no row matched.
+
+    A version is reserved either way; callers roll back when nothing matched.
+    """
+    return db.execute(
+        update(Item)
+        .where(Item.list_id == list_id, Item.id == item_id)
+        .values(checked=checked, version=allocate_versions(db, list_id))
+        .returning(*ITEM_COLUMNS, Item.version),
+        execution_options={"synchronize_session": False},
+    ).one_or_none()
+
+
+def delete_item_row(db: Session, list_id: int, item_id):
+    """
+    Record the tombstone of one item with INSERT ... SELECT ... RETURNING, then delete it.
+
+    Returns (item_id, version) or None when no row matched; a version is
+    reserved either way, so callers roll back when nothing matched.
+    """
+    version = allocate_versions(db, list_id)
+    tombstone = db.execute(
+        insert(ItemTombstone)
+        .from_select(
+            ["list_id", "item_id", "version"],
+            select(Item.list_id, Item.id, literal(version))
+            .where(Item.list_id == list_id, Item.id == item_id),
+        )
+        .returning(ItemTombstone.item_id, ItemTombstone.version)
+    ).one_or_none()
+    if tombstone is None:
+        return None
+    db.execute(
+        delete(Item).where(Item.id == tombstone.item_id),
+        execution_options={"synchronize_session": False},
+    )
+    return tombstone.item_id, tombstone.version
@@ -0,0 +1,133 @@
+"""
+Admission queue for LLM calls with priority classes
+
+"interactive" requests (short voice commands) and "conversational" ones (long
+turns, full histories) share a fixed number of concurrent LLM calls. Waiting
+requests are admitted by strict priority or, by default, weighted round robin
+so conversational turns are slowed down but never starved.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+INTERACTIVE = "interactive"
+CONVERSATIONAL = "conversational"
+PRIORITIES = (INTERACTIVE, CONVERSATIONAL)
+WEIGHTS = {INTERACTIVE: 4, CONVERSATIONAL: 1}
+# Utterances up to this many words count as short commands
+SHORT_WORDS = int(os.getenv("PRIORITY_SHORT_WORDS", "8"))
+
+
+def classify(text: str | None, requested: str | None = None, voice: bool = False, history: bool = False,
+             short_words: int = SHORT_WORDS) -> str:
+    """
+    Priority class of a chat request.
+
+    An explicit valid request flag wins; otherwise long utterances and requests
+    carrying their own full history are conversational, short ones interactive.
+    """
+    if requested in PRIORITIES:
+        return requested
+    if text is not None and len(text.split()) > short_words:
+        return CONVERSATIONAL
+    if history and not voice:
+        return CONVERSATIONAL
+    return INTERACTIVE
+
+
+class AdmissionQueue:
+    """Limits concurrent LLM calls and decides which waiting request goes next"""
+
+    def __init__(self, max_concurrency: int = 0, policy: str = "weighted", weights: dict | None = None):
+        if policy not in ("weighted", "strict"):
+            raise ValueError(f"Unknown admission policy: {policy}. Available: weighted, strict")
+        self.max_concurrency = max_concurrency
+        self.policy = policy
+        self.weights = weights or WEIGHTS
+        self.active = 0
+        self._waiting = {priority: deque() for priority in PRIORITIES}
+        self._current = {priority: 0 for priority in PRIORITIES}
+        self._waits = {priority: deque(maxlen=1000) for priority in PRIORITIES}
+        self._admitted = {priority: 0 for priority in PRIORITIES}
+
+    def _has_capacity(self) -> bool:
+        return not self.max_concurrency or self.active < self.max_concurrency
+
+    def _next_priority(self) -> str | None:
+        ready = [priority for priority in PRIORITIES if self._waiting[priority]]
+        if not ready:
+            return None
+        if self.policy == "strict":
+            return ready[0]
+        # Smooth weighted round robin over the classes that have waiters
+        for priority in ready:
+            self._current[priority] += self.weights[priority]
+        chosen = max(ready, key=lambda priority: self._current[priority])
+        self._current[chosen] -= sum(self.weights[priority] for priority in ready)
+        return chosen
+
+    def _grant(self):
+        while self._has_capacity():
+            priority = self._next_priority()
+            if priority is None:
+                return
+            future = self._waiting[priority].popleft()
+            if future.done():
+                continue
+            self.active += 1
+            future.set_result(None)
+
+    def _record(self, priority: str, waited: float):
+        self._admitted[priority] += 1
+        self._waits[priority].append(waited)
+
+    async def acquire(self, priority: str):
+        """Wait for an LLM slot"""
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[priority].append(future)
+        self._grant()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller gave up
+                self.release()
+            elif future in self._waiting[priority]:
+                self._waiting[priority].remove(future)
+            raise
+        self._record(priority, time.monotonic() - started)
+
+    def release(self):
+        """Free a slot taken by acquire() and admit the next waiting request"""
+        self.active -= 1
+        self._grant()
+
+    @asynccontextmanager
+    async def slot(self, priority: str):
+        """Hold an LLM slot for the duration of a block"""
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> dict:
+        classes = {}
+        for priority in PRIORITIES:
+            waits = sorted(self._waits[priority])
+            classes[priority] = {
+                "admitted": self._admitted[priority],
+                "waiting": len(self._waiting[priority]),
+                "p99_wait_seconds": waits[min(len(waits) - 1, int(len(waits) * 0.99))] if waits else 0.0,
+            }
+        return {"active": self.active, "max_concurrency": self.max_concurrency, "policy": self.policy, "classes": classes}
+
+
+# 0 means no limit: requests are classified and counted but never wait
+admission_queue = AdmissionQueue(
+    int(os.getenv("LLM_MAX_CONCURRENCY", "0")),
+    os.getenv("ADMISSION_POLICY", "weighted"),
+)
@@ -1,19 +1,44 @@
 import os
 import fastapi as fastapi
-from fastapi import Request, Depends
+from datetime import datetime
+import asyncio
+from fastapi import Request, Depends, Header, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
+from starlette.websockets import WebSocketState
+from sqlalchemy import insert, select, update, delete
 from sqlalchemy.orm import Session
 import uvicorn
 from dotenv import load_dotenv
 import llm
 import json
+from conversations import conversation_store
+import intents
+from intents import intent_cache, normalize, speculate
+import orjson
 
-from Models import Item, get_db, init_db
-from Models.schemas import ItemCreate, ItemResponse, ItemCheckedUpdate
+from Models import (
+    Item, DEFAULT_LIST_ID, ITEM_COLUMNS, item_to_dict, get_db, get_session_factory, init_db,
+    GroceryList, can_access_list, new_list_token,
+    current_version, allocate_versions, add_tombstones, get_changes,
+    matching_item_id, insert_item, update_item_checked, delete_item_row,
+)
+from Models.schemas import (
+    ItemCreate, ItemResponse, ItemCheckedUpdate, ItemBatchCreate, ItemsCheckedBatchUpdate,
+    GroceryListCreate, GroceryListResponse,
+)
+from items_cache import items_cache
+from events import event_data, item_events, sse_stream
+from serialization import JSON_MEDIA_TYPE, negotiate_media_type, rows_to_items, encode_items
+from list_context import build_list_context
+from admission import INTERACTIVE, admission_queue, classify
+from slo import NORMAL, SHED_MESSAGE, llm_allowed, slo_controller
 
 load_dotenv()
 
+# Token budget for the current list items sent with each chat turn; 0 disables it
+LIST_CONTEXT_TOKENS = int(os.getenv("LIST_CONTEXT_TOKENS", "0"))
+
 # Initialize database tables
 init_db()
 
@@ -26,52 +51,167 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Conversation-Id"],
 )
 
 @app.get("/health")
 def health():
-    return {"message": "Grocery List API is running"}
+    return {"message": "Grocery List API is running", "mode": slo_controller.evaluate()}
+
+
+@app.get("/llm/status")
+def llm_status():
+    """Circuit breaker state of every LLM provider, host load, admission queue and prompt metrics"""
+    return {**llm.status(), "admission": admission_queue.snapshot()}
+
+
+def get_list_id(
+    list_id: int = DEFAULT_LIST_ID,
+    token: str | None = None,
+    x_list_token: str | None = Header(None),
+    db: Session = Depends(get_db),
+) -> int:
+    """
+    Resolve the list a request is scoped to from the list_id query parameter.
+
+    Lists created through POST /lists need their token, in the X-List-Token
+    header or (for EventSource, which cannot set headers) the token query
+    parameter. A wrong token looks like a missing list.
+    """
+    if not can_access_list(db, list_id, x_list_token or token):
+        raise HTTPException(status_code=404, detail="List not found")
+    return list_id
+
+
+def item_changed(list_id: int, event_type: str, item: dict, version: int):
+    """Invalidate the cached list and notify change feed subscribers after a commit"""
+    items_cache.invalidate(list_id)
+    item_events.publish(list_id, event_type, item, version)
+
+
+def items_changed(list_id: int, changes: list[dict]):
+    """Like item_changed for every row of a bulk statement, published as one batch event"""
+    if changes:
+        items_cache.invalidate(list_id)
+        item_events.publish_batch(list_id, changes)
+
+
+def get_items_body(db: Session, list_id: int, media_type: str = JSON_MEDIA_TYPE) -> bytes:
+    """Return the encoded items of a list, from the cache when possible"""
+    body = items_cache.get(list_id, media_type)
+    if body is None:
+        generation = items_cache.generation(list_id)
+        # Plain column tuples skip ORM hydration; the encoder handles datetimes itself
+        rows = db.execute(
+            select(*ITEM_COLUMNS).where(Item.list_id == list_id).order_by(Item.id)
+        ).all()
+        print(f"Found {len(rows)} items")
+        body = encode_items(rows_to_items(rows), media_type)
+        items_cache.set(list_id, body, generation, media_type)
+    return body
+
+
+@app.post("/lists", response_model=GroceryListResponse)
+def create_list(list_data: GroceryListCreate, db: Session = Depends(get_db)):
+    """Create a new grocery list, e.g. for another household"""
+    print(f'Request create list {list_data.name}')
+
+    grocery_list = GroceryList(name=list_data.name, token=new_list_token())
+    db.add(grocery_list)
+    db.commit()
+    db.refresh(grocery_list)
+    return grocery_list
 
 
 @app.get("/items", response_model=list[ItemResponse])
-def get_items(db: Session = Depends(get_db)):
+def get_items(request: Request, list_id: int = Depends(get_list_id), db: Session = Depends(get_db)):
     """Get all grocery list items"""
-    print('Request get items')
-    items = db.query(Item).all()
-    print(f"Found {len(items)} items")
-    return items
+    print(f'Request get items of list {list_id}')
+    media_type = negotiate_media_type(request.headers.get("accept"))
+    return Response(
+        content=get_items_body(db, list_id, media_type),
+        media_type=media_type,
+        headers={"Vary": "Accept"},
+    )
+
+
+@app.get("/items/stream")
+async def stream_items(list_id: int = Depends(get_list_id), db: Session = Depends(get_db)):
+    """Push the item list and every later change as Server-Sent Events"""
+    print(f'Request items stream of list {list_id}')
+
+    # Subscribe before taking the snapshot so no change can fall in between
+    subscriber = item_events.subscribe(list_id)
+    snapshot = {
+        "version": current_version(db, list_id),
+        "items": orjson.loads(get_items_body(db, list_id)),
+    }
+
+    return StreamingResponse(
+        sse_stream(subscriber, snapshot),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",  # Disable buffering for nginx
+        }
+    )
+
+
+@app.get("/items/changes")
+def get_item_changes(
+    since: str = "0",
+    list_id: int = Depends(get_list_id),
+    db: Session = Depends(get_db)
+):
+    """Get items changed and ids deleted after a version number or ISO timestamp"""
+    print(f'Request item changes since {since}')
+
+    if since.isdigit():
+        cursor = int(since)
+    else:
+        try:
+            cursor = datetime.fromisoformat(since)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="since must be a version number or an ISO timestamp")
+
+    changes = get_changes(db, list_id, cursor)
+    print(f"Found {len(changes['items'])} changed and {len(changes['deleted'])} deleted items")
+    return changes
 
 
 @app.post("/items", response_model=ItemResponse)
-async def create_item(item_data: ItemCreate, db: Session = Depends(get_db)):
+async def create_item(
+    item_data: ItemCreate,
+    list_id: int = Depends(get_list_id),
+    db: Session = Depends(get_db)
+):
     """Create a new grocery list item"""
     print('Request create item')
     print(f"Item data: {item_data}")
-    
-    new_item = Item(
-        description=item_data.description,
-        checked=item_data.checked
-    )
-    db.add(new_item)
+
+    row = insert_item(db, list_id, item_data.description, item_data.checked)
     db.commit()
-    db.refresh(new_item)
-    
+    new_item = item_to_dict(row)
+    item_changed(list_id, "created", new_item, row.version)
+
     print(f"Created item: {new_item}")
     return new_item
 
 
 @app.delete("/items/{item_id}")
-def delete_item(item_id: int, db: Session = Depends(get_db)):
+def delete_item(item_id: int, list_id: int = Depends(get_list_id), db: Session = Depends(get_db)):
     """Delete a grocery list item"""
     print(f'Request delete item {item_id}')
-    
-    item = db.query(Item).filter(Item.id == item_id).first()
-    
-    if item:
-        db.delete(item)
+
+    deleted = delete_item_row(db, list_id, item_id)
+
+    if deleted:
         db.commit()
+        item_changed(list_id, "deleted", {"id": item_id}, deleted[1])
         return {"message": "Item deleted"}
     else:
+        db.rollback()
         return {"message": "Item not found"}
 
 
@@ -79,24 +219,229 @@ def delete_item(item_id: int, db: Session = Depends(get_db)):
 async def mark_item_as_checked(
     item_id: int, 
     update_data: ItemCheckedUpdate, 
+    list_id: int = Depends(get_list_id),
     db: Session = Depends(get_db)
 ):
     """Update the checked status of a grocery list item"""
     print(f'Request mark item {item_id} as checked')
     print(f"Checked value: {update_data.checked}")
-    
-    item = db.query(Item).filter(Item.id == item_id).first()
-    
-    if item:
-        item.checked = update_data.checked
+
+    row = update_item_checked(db, list_id, item_id, update_data.checked)
+
+    if row is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+
+    db.commit()
+    item = item_to_dict(row)
+    item_changed(list_id, "updated", item, row.version)
+    return item
+
+
+@app.post("/items/batch")
+def create_items(
+    batch: ItemBatchCreate,
+    list_id: int = Depends(get_list_id),
+    db: Session = Depends(get_db)
+):
+    """Create several grocery list items with one INSERT"""
+    print(f'Request create {len(batch.items)} items')
+
+    first_version = allocate_versions(db, list_id, len(batch.items)) - len(batch.items) + 1
+    rows = db.execute(
+        insert(Item).returning(*ITEM_COLUMNS, Item.version, sort_by_parameter_order=True),
+        [
+            {
+                "list_id": list_id,
+                "description": item.description,
+                "checked": item.checked,
+                "version": first_version + index,
+            }
+            for index, item in enumerate(batch.items)
+        ],
+    ).all()
+    db.commit()
+
+    results = [item_to_dict(row) for row in rows]
+    items_changed(list_id, [
+        {"type": "created", "version": row.version, "item": item} for row, item in zip(rows, results)
+    ])
+    return {"version": first_version + len(rows) - 1, "results": results}
+
+
+@app.patch("/items/checked")
+def mark_items_as_checked(
+    update_data: ItemsCheckedBatchUpdate,
+    list_id: int = Depends(get_list_id),
+    db: Session = Depends(get_db)
+):
+    """Update the checked status of the given items, or of every item, with one UPDATE"""
+    print(f'Request mark items {update_data.ids or "all"} as checked')
+    print(f"Checked value: {update_data.checked}")
+
+    version = allocate_versions(db, list_id)
+    statement = update(Item).where(Item.list_id == list_id, Item.checked != update_data.checked)
+    if update_data.ids is not None:
+        statement = statement.where(Item.id.in_(update_data.ids))
+    rows = db.execute(
+        statement.values(checked=update_data.checked, version=version).returning(*ITEM_COLUMNS),
+        execution_options={"synchronize_session": False},
+    ).all()
+    if rows:
         db.commit()
-        db.refresh(item)
-        return item
     else:
-        return {"message": "Item not found"}
-    
+        # Give back the reserved version
+        db.rollback()
+
+    updated_ids = {row.id for row in rows}
+    items_changed(list_id, [{"type": "updated", "version": version, "item": item_to_dict(row)} for row in rows])
+
+    results = [{"id": item_id, "status": "updated"} for item_id in sorted(updated_ids)]
+    if update_data.ids is not None:
+        # Ids that were not updated are either already in the requested state or missing
+        remaining = set(update_data.ids) - updated_ids
+        existing = {
+            item_id for (item_id,) in db.query(Item.id).filter(
+                Item.list_id == list_id, Item.id.in_(remaining)
+            )
+        } if remaining else set()
+        results += [
+            {"id": item_id, "status": "unchanged" if item_id in existing else "not_found"}
+            for item_id in sorted(remaining)
+        ]
+    return {"version": version if rows else current_version(db, list_id), "results": results}
+
+
+@app.delete("/items")
+def delete_items(checked: bool, list_id: int = Depends(get_list_id), db: Session = Depends(get_db)):
+    """Delete every checked (or unchecked) grocery list item with one DELETE"""
+    print(f'Request delete items with checked={checked}')
+
+    version = allocate_versions(db, list_id)
+    deleted_ids = db.execute(
+        delete(Item).where(Item.list_id == list_id, Item.checked == checked).returning(Item.id),
+        execution_options={"synchronize_session": False},
+    ).scalars().all()
+    if deleted_ids:
+        add_tombstones(db, list_id, deleted_ids, version)
+        db.commit()
+    else:
+        db.rollback()
+
+    items_changed(list_id, [{"type": "deleted", "version": version, "item": {"id": item_id}} for item_id in deleted_ids])
+    return {
+        "version": version if deleted_ids else current_version(db, list_id),
+        "results": [{"id": item_id, "status": "deleted"} for item_id in sorted(deleted_ids)],
+    }
+
+
+def execute_commands(db: Session, list_id: int, commands: str, candidates: dict | None = None) -> list[dict]:
+    """Parse the LLM output and apply its commands to a list; candidates are prefetched item ids"""
+    commands = commands.replace("```json", "").replace("```", "").strip()
+    print(f"Command: {commands}")
+    results = []
+    candidates = candidates or {}
+
+    try:
+        command_json = json.loads(commands)
+        print(f"Command JSON: {command_json}")
+
+        for command in command_json:
+            command_type = command.get("command")
+            value = command.get("value", "")
+            result = {"command": command_type, "value": value, "status": "ok"}
+
+            if command_type == "AddItem":
+                print(f"Adding item: {value}")
+                row = insert_item(db, list_id, value)
+                db.commit()
+                result["item"] = item_to_dict(row)
+                item_changed(list_id, "created", result["item"], row.version)
+
+            elif command_type == "RemoveItem":
+                print(f"Removing item: {value}")
+                deleted = delete_item_row(db, list_id, candidates.get(value) or matching_item_id(list_id, value))
+                if deleted:
+                    db.commit()
+                    result["item"] = {"id": deleted[0]}
+                    item_changed(list_id, "deleted", result["item"], deleted[1])
+                else:
+                    db.rollback()
+                    print(f"Item not found: {value}")
+                    result["status"] = "not_found"
+
+            elif command_type in ("CheckItem", "UncheckItem"):
+                checked = command_type == "CheckItem"
+                print(f"{'Checking' if checked else 'Unchecking'} item: {value}")
+                row = update_item_checked(
+                    db, list_id, candidates.get(value) or matching_item_id(list_id, value), checked
+                )
+                if row:
+                    db.commit()
+                    result["item"] = item_to_dict(row)
+                    item_changed(list_id, "updated", result["item"], row.version)
+                else:
+                    db.rollback()
+                    print(f"Item not found: {value}")
+                    result["status"] = "not_found"
+
+            else:
+                result["status"] = "unknown_command"
+
+            results.append(result)
+
+    except json.JSONDecodeError as e:
+        print(f"Error parsing JSON: {e}")
+    except Exception as e:
+        print(f"Error executing commands: {e}")
+
+    return results
+
+
+def add_list_context(db: Session, list_id: int, messages: list[dict]) -> list[dict]:
+    """Insert the list items most relevant to the last user message right before it"""
+    positions = [i for i, message in enumerate(messages) if message.get("role") == "user"]
+    if not positions:
+        return messages
+    # Built from the cached GET /items body, so turns do not query the items table
+    items = orjson.loads(get_items_body(db, list_id))
+    context = build_list_context(items, messages[positions[-1]]["content"], LIST_CONTEXT_TOKENS)
+    if context is None:
+        return messages
+    return messages[:positions[-1]] + [{"role": "system", "content": context}] + messages[positions[-1]:]
+
+
+async def respond(db: Session, list_id: int, message: str | None, messages: list[dict], priority: str = INTERACTIVE):
+    """Stream the commands for a turn, skipping the LLM when the intent router can answer"""
+    mode = slo_controller.evaluate()
+    commands = intents.route(message, mode) if message is not None else None
+    if commands is not None:
+        yield json.dumps(commands)
+        return
+    if mode != NORMAL and not llm_allowed(mode, intents.predict(message) if message is not None else None):
+        # The LLM is struggling; keep it for what only it can answer
+        yield f"Error: {SHED_MESSAGE}"
+        return
+    if LIST_CONTEXT_TOKENS > 0:
+        messages = add_list_context(db, list_id, messages)
+    # End the read transaction so no pooled connection is held while the LLM runs
+    db.commit()
+    # Short voice commands are admitted ahead of long conversational turns
+    async with admission_queue.slot(priority):
+        async for chunk in llm.get_response(messages):
+            yield chunk
+
+
+def remember_intent(message: str, results: list[dict]):
+    """Cache the commands the LLM produced for a transcript so speculation can reuse them"""
+    intent_cache.set(message, [
+        {"command": result["command"], "value": result["value"]}
+        for result in results
+        if result["status"] != "unknown_command"
+    ])
+
+
 @app.post("/chat")
-async def chat(request: Request, db: Session = Depends(get_db)):
+async def chat(request: Request, list_id: int = Depends(get_list_id), db: Session = Depends(get_db)):
     """Chat with AI to manage grocery list"""
     print(f'Request chat')
     
@@ -104,78 +449,37 @@ async def chat(request: Request, db: Session = Depends(get_db)):
     body = await request.json()
     
     # Support both formats: single message or messages array
+    conversation_id = None
     if "messages" in body:
         messages = body.get("messages", [])
         print(f"Messages history: {len(messages)} messages")
+        user_messages = [m.get("content", "") for m in messages if m.get("role") == "user"]
+        priority = classify(user_messages[-1] if user_messages else None, body.get("priority"), history=True)
     else:
-        # Legacy format with single message
+        # Single message; the history is kept server side under conversation_id
         message = body.get("message", "")
-        messages = [{"role": "user", "content": message}]
-        print(f"Single message: {message}")
+        conversation_id = body.get("conversation_id") or conversation_store.new_id()
+        if not isinstance(conversation_id, str) or len(conversation_id) > 64:
+            raise HTTPException(status_code=400, detail="Invalid conversation_id")
+        conversation_store.append(conversation_id, {"role": "user", "content": message}, db)
+        messages = conversation_store.history(conversation_id, db)
+        priority = classify(message, body.get("priority"))
+        print(f"Single message: {message} (conversation {conversation_id})")
     
     print(f"Full conversation: {messages}")
 
     async def generate():
         commands = ""
-        async for chunk in llm.get_response(messages):
+        async for chunk in respond(db, list_id, message if conversation_id else None, messages, priority):
             commands = commands + chunk
             yield chunk
+
+        if conversation_id:
+            conversation_store.append(conversation_id, {"role": "assistant", "content": commands}, db)
             
-        # Parse and execute commands
-        commands = commands.replace("```json", "").replace("```", "").strip()
-        print(f"Command: {commands}")
-        
-        try:
-            command_json = json.loads(commands)
-            print(f"Command JSON: {command_json}")
-            
-            for command in command_json:
-                command_type = command.get("command")
-                value = command.get("value", "")
-                
-                if command_type == "AddItem":
-                    print(f"Adding item: {value}")
-                    new_item = Item(description=value, checked=False)
-                    db.add(new_item)
-                    db.commit()
-                    
-                elif command_type == "RemoveItem":
-                    print(f"Removing item: {value}")
-                    item = db.query(Item).filter(
-                        Item.description.ilike(f"%{value}%")
-                    ).first()
-                    if item:
-                        db.delete(item)
-                        db.commit()
-                    else:
-                        print(f"Item not found: {value}")
-                        
-                elif command_type == "CheckItem":
-                    print(f"Checking item: {value}")
-                    item = db.query(Item).filter(
-                        Item.description.ilike(f"%{value}%")
-                    ).first()
-                    if item:
-                        item.checked = True
-                        db.commit()
-                    else:
-                        print(f"Item not found: {value}")
-                        
-                elif command_type == "UncheckItem":
-                    print(f"Unchecking item: {value}")
-                    item = db.query(Item).filter(
-                        Item.description.ilike(f"%{value}%")
-                    ).first()
-                    if item:
-                        item.checked = False
-                        db.commit()
-                    else:
-                        print(f"Item not found: {value}")
-                        
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON: {e}")
-        except Exception as e:
-            print(f"Error executing commands: {e}")
+        results = execute_commands(db, list_id, commands)
+        if conversation_id:
+            remember_intent(message, results)
 
     return StreamingResponse(
         generate(),
@@ -183,9 +487,130 @@ async def chat(request: Request, db: Session = Depends(get_db)):
         headers={
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"  # Disable buffering for nginx
+            "X-Accel-Buffering": "no",  # Disable buffering for nginx
+            **({"X-Conversation-Id": conversation_id} if conversation_id else {}),
         }
     )
 
+@app.websocket("/ws/chat")
+async def chat_socket(
+    websocket: WebSocket,
+    list_id: int = DEFAULT_LIST_ID,
+    token: str | None = None,
+    conversation_id: str | None = None,
+    sessions=Depends(get_session_factory),
+):
+    """Chat over one persistent connection per voice session"""
+    # A session per unit of work, so idle voice sessions do not hold pooled connections
+    with sessions() as db:
+        if not can_access_list(db, list_id, websocket.headers.get("x-list-token") or token):
+            await websocket.close(code=1008, reason="List not found")
+            return
+    if conversation_id is None or len(conversation_id) > 64:
+        conversation_id = conversation_store.new_id()
+
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+    tasks: dict[str, asyncio.Task] = {}
+
+    async def send(frame: dict):
+        async with send_lock:
+            # Cancelled requests may still report back after the client left
+            if websocket.client_state == WebSocketState.CONNECTED:
+                await websocket.send_text(json.dumps(frame))
+
+    speculations: dict[str, dict] = {}
+
+    def commit(message: str, commands: str, candidates: dict | None = None) -> list[dict]:
+        with sessions() as db:
+            conversation_store.append(conversation_id, {"role": "user", "content": message}, db)
+            conversation_store.append(conversation_id, {"role": "assistant", "content": commands}, db)
+            return execute_commands(db, list_id, commands, candidates)
+
+    async def run_chat(request_id: str, message: str, stream: bool, priority: str):
+        commands = ""
+        try:
+            with sessions() as db:
+                messages = conversation_store.history(conversation_id, db) + [{"role": "user", "content": message}]
+                async for chunk in respond(db, list_id, message, messages, priority):
+                    commands = commands + chunk
+                    if stream:
+                        await send({"type": "token", "id": request_id, "text": chunk})
+
+            results = commit(message, commands)
+            remember_intent(message, results)
+            await send({"type": "result", "id": request_id, "commands": results})
+        except asyncio.CancelledError:
+            await send({"type": "cancelled", "id": request_id})
+        finally:
+            tasks.pop(request_id, None)
+
+    async def forward_changes():
+        # Push changes made by any client so the session never has to poll
+        while True:
+            subscriber = item_events.subscribe(list_id)
+            try:
+                while (event := await subscriber.get()) is not None:
+                    await send({"type": "change", "event": event["type"], **event_data(event)})
+            finally:
+                item_events.unsubscribe(subscriber)
+            await send({"type": "reset", "version": item_events.version(list_id)})
+
+    with sessions() as db:
+        version = current_version(db, list_id)
+    await send({"type": "session", "conversation_id": conversation_id, "version": version})
+    changes = asyncio.create_task(forward_changes())
+    try:
+        while True:
+            try:
+                frame = json.loads(await websocket.receive_text())
+            except json.JSONDecodeError:
+                await send({"type": "error", "message": "Invalid JSON"})
+                continue
+
+            request_id = str(frame.get("id", ""))
+            frame_type = frame.get("type")
+            if frame_type == "partial":
+                # Resolve interim transcripts ahead of time; nothing is written yet
+                previous = speculations.get(request_id)
+                with sessions() as db:
+                    speculation = speculate(db, list_id, frame.get("text", ""))
+                speculations[request_id] = speculation
+                if speculation["commands"] is not None and (
+                    previous is None or previous["commands"] != speculation["commands"]
+                ):
+                    await send({"type": "speculation", "id": request_id, "commands": speculation["commands"]})
+            elif frame_type == "chat":
+                if request_id in tasks:
+                    await send({"type": "error", "id": request_id, "message": "Duplicate request id"})
+                    continue
+                message = frame.get("message", "")
+                print(f"Socket chat {request_id}: {message}")
+                speculation = speculations.pop(request_id, None)
+                if (
+                    speculation is not None
+                    and speculation["resolved"]
+                    and speculation["text"] == normalize(message)
+                ):
+                    results = commit(message, json.dumps(speculation["commands"]), speculation["candidates"])
+                    await send({"type": "result", "id": request_id, "commands": results, "speculative": True})
+                    continue
+                priority = classify(message, frame.get("priority"), voice=True)
+                tasks[request_id] = asyncio.create_task(run_chat(request_id, message, frame.get("stream", True), priority))
+            elif frame_type == "cancel":
+                speculations.pop(request_id, None)
+                task = tasks.get(request_id)
+                if task:
+                    task.cancel()
+            else:
+                await send({"type": "error", "id": request_id, "message": f"Unknown frame type: {frame_type}"})
+    except WebSocketDisconnect:
+        print("Chat socket closed")
+    finally:
+        changes.cancel()
+        for task in list(tasks.values()):
+            task.cancel()
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
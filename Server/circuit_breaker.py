@@ -0,0 +1,90 @@
+"""
+Per-provider circuit breaker
+
+closed:    calls go through; the outcome of the last `window` calls is kept.
+open:      the error rate (failures and calls slower than slow_seconds) reached
+           error_rate, so calls are refused until open_seconds have passed.
+half_open: one probe call is let through; success closes the breaker, failure
+           opens it again.
+"""
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when no provider is allowed to take a request"""
+
+
+class CircuitBreaker:
+    """Error-rate and latency based breaker for one LLM provider"""
+
+    def __init__(self, name: str, error_rate: float = 0.5, min_requests: int = 5, window: int = 20,
+                 slow_seconds: float = 10.0, open_seconds: float = 30.0):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_requests = min_requests
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.transitions = 0
+        self._outcomes = deque(maxlen=window)
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str):
+        print(f"Circuit breaker {self.name}: {self.state} -> {state}")
+        self.state = state
+        self.transitions += 1
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+        if state != HALF_OPEN:
+            self._probing = False
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now; in half-open only one probe at a time"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.open_seconds:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, ok: bool, seconds: float):
+        """Record the outcome and latency (time to first token) of a call allowed by allow()"""
+        failed = not ok or seconds > self.slow_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                if failed:
+                    self._set_state(OPEN)
+                else:
+                    self._outcomes.clear()
+                    self._set_state(CLOSED)
+                return
+            self._outcomes.append(failed)
+            if (self.state == CLOSED and len(self._outcomes) >= self.min_requests
+                    and sum(self._outcomes) / len(self._outcomes) >= self.error_rate):
+                self._set_state(OPEN)
+
+    def cancel(self):
+        """Give back an allowed call that ended without an outcome"""
+        with self._lock:
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self.state,
+                "error_rate": sum(self._outcomes) / len(self._outcomes) if self._outcomes else 0.0,
+                "calls": len(self._outcomes),
+                "transitions": self.transitions,
+            }
@@ -0,0 +1,102 @@
+"""
+Compact line-based command encoding for LLM output
+
+One command per line, an opcode followed by the item: "A Milk", "C Bread".
+A line with just "-" means there is nothing to do.
+"""
+import json
+
+OPCODES = {
+    "A": "AddItem",
+    "R": "RemoveItem",
+    "C": "CheckItem",
+    "U": "UncheckItem",
+}
+COMMANDS = {command: opcode for opcode, command in OPCODES.items()}
+
+
+def encode_compact(commands: list[dict]) -> str:
+    """Encode command objects as compact lines"""
+    lines = [
+        f"{COMMANDS[command['command']]} {command.get('value', '')}"
+        for command in commands
+        if command.get("command") in COMMANDS
+    ]
+    return "\n".join(lines) if lines else "-"
+
+
+def decode_line(line: str) -> dict | None:
+    """Decode one compact line, or None for blank, "-" and unknown lines"""
+    opcode, _, value = line.strip().partition(" ")
+    if opcode not in OPCODES or not value.strip():
+        return None
+    return {"command": OPCODES[opcode], "value": value.strip()}
+
+
+class CompactDecoder:
+    """
+    Incremental decoder for streamed compact output.
+
+    feed() returns the commands completed by a chunk so they can be acted on
+    before the generation ends. Output that starts like JSON (the model ignored
+    the compact format) is buffered and parsed as a whole by finish().
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._json = None
+
+    def feed(self, chunk: str) -> list[dict]:
+        if self._json is not None:
+            self._json += chunk
+            return []
+        self._buffer += chunk
+        if self._buffer.lstrip()[:1] in ("[", "{", "`"):
+            self._json, self._buffer = self._buffer, ""
+            return []
+        *lines, self._buffer = self._buffer.split("\n")
+        return [command for command in map(decode_line, lines) if command]
+
+    def finish(self) -> list[dict]:
+        """Decode whatever is left once the stream has ended"""
+        if self._json is not None:
+            text = self._json.replace("```json", "").replace("```", "").strip()
+            try:
+                commands = json.loads(text)
+            except json.JSONDecodeError:
+                print(f"Could not parse JSON fallback: {text}")
+                return []
+            return commands if isinstance(commands, list) else []
+        command = decode_line(self._buffer)
+        self._buffer = ""
+        return [command] if command else []
+
+
+def compact_history(messages: list[dict]) -> list[dict]:
+    """Re-encode earlier JSON assistant answers so the conversation matches the compact format"""
+    converted = []
+    for message in messages:
+        if message.get("role") == "assistant":
+            try:
+                commands = json.loads(message["content"])
+            except (json.JSONDecodeError, TypeError):
+                commands = None
+            if isinstance(commands, list):
+                message = {"role": "assistant", "content": encode_compact(commands)}
+        converted.append(message)
+    return converted
+
+
+async def compact_to_json(stream):
+    """Decode a compact stream and re-emit it as a JSON array, one command at a time"""
+    decoder = CompactDecoder()
+    separator = ""
+    yield "["
+    async for chunk in stream:
+        for command in decoder.feed(chunk):
+            yield separator + json.dumps(command)
+            separator = ", "
+    for command in decoder.finish():
+        yield separator + json.dumps(command)
+        separator = ", "
+    yield "]"
@@ -2,12 +2,17 @@
 Pytest configuration and shared fixtures for testing
 """
 import pytest
+from contextlib import nullcontext
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 
 from api import app
-from Models import Base, get_db
+from Models import Base, GroceryList, get_db, get_session_factory
+from items_cache import items_cache
+from conversations import conversation_store
+from intents import intent_cache
+from Models import grocery_list
 
 
 # Configure pytest-asyncio
@@ -25,6 +30,9 @@ def db_engine():
         connect_args={"check_same_thread": False},
     )
     Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        session.add(GroceryList(name="Default"))
+        session.commit()
     yield engine
     Base.metadata.drop_all(bind=engine)
 
@@ -34,7 +42,10 @@ def db_session(db_engine):
     """Create a test database session"""
     connection = db_engine.connect()
     transaction = connection.begin()
-    session = sessionmaker(autocommit=False, autoflush=False, bind=connection)()
+    # Savepoints let code under test commit and roll back inside the outer transaction
+    session = sessionmaker(
+        autocommit=False, autoflush=False, bind=connection, join_transaction_mode="create_savepoint"
+    )()
 
     yield session
 
@@ -53,6 +64,13 @@ def client(db_session):
             pass
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: lambda: nullcontext(db_session)
+    # Tests seed rows directly through db_session, bypassing cache invalidation
+    items_cache.clear()
+    conversation_store.clear()
+    intent_cache.clear()
+    # List ids are reused once each test's transaction is rolled back
+    grocery_list._list_tokens.clear()
 
     with TestClient(app) as test_client:
         yield test_client
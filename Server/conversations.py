@@ -0,0 +1,107 @@
+"""
+Server-side conversation history for /chat
+"""
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from sqlalchemy.orm import Session
+
+from Models import ConversationMessage
+
+
+def _message_size(message: dict) -> int:
+    return len(message["content"].encode("utf-8"))
+
+
+class ConversationStore:
+    """
+    LRU store of recent conversation turns with a byte budget.
+
+    Each conversation keeps at most window messages in memory; older turns are
+    compacted away. When persist is enabled every turn is also written to the
+    conversation_messages table, and conversations evicted from memory are
+    reloaded from it on their next turn.
+    """
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024, window: int = 20, persist: bool = False):
+        self.max_bytes = max_bytes
+        self.window = window
+        self.persist = persist
+        self._conversations: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_id() -> str:
+        """Generate a conversation id"""
+        return uuid.uuid4().hex
+
+    def history(self, conversation_id: str, db: Session | None = None) -> list[dict]:
+        """Return a copy of the stored window of a conversation"""
+        with self._lock:
+            messages = self._conversations.get(conversation_id)
+            if messages is not None:
+                self._conversations.move_to_end(conversation_id)
+                return list(messages)
+
+        if not (self.persist and db is not None):
+            return []
+        rows = (
+            db.query(ConversationMessage)
+            .filter(ConversationMessage.conversation_id == conversation_id)
+            .order_by(ConversationMessage.id.desc())
+            .limit(self.window)
+            .all()
+        )
+        messages = [row.to_message() for row in reversed(rows)]
+        with self._lock:
+            if conversation_id not in self._conversations:
+                self._store(conversation_id, messages)
+        return list(messages)
+
+    def append(self, conversation_id: str, message: dict, db: Session | None = None):
+        """Add a turn to a conversation, compacting it to the window"""
+        if self.persist and db is not None:
+            # Reload a conversation evicted from memory first, or only the new turn would be kept
+            self.history(conversation_id, db)
+            db.add(ConversationMessage(
+                conversation_id=conversation_id,
+                role=message["role"],
+                content=message["content"],
+            ))
+            db.commit()
+
+        with self._lock:
+            messages = self._conversations.pop(conversation_id, [])
+            self._bytes -= sum(_message_size(m) for m in messages)
+            self._store(conversation_id, (messages + [message])[-self.window:])
+
+    def _store(self, conversation_id: str, messages: list[dict]):
+        self._conversations[conversation_id] = messages
+        self._bytes += sum(_message_size(m) for m in messages)
+        # Never evict the conversation that is being written
+        while self._bytes > self.max_bytes and len(self._conversations) > 1:
+            _, evicted = self._conversations.popitem(last=False)
+            self._bytes -= sum(_message_size(m) for m in evicted)
+
+    def clear(self):
+        """Forget every in-memory conversation"""
+        with self._lock:
+            self._conversations.clear()
+            self._bytes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        """Bytes of message content currently held in memory"""
+        return self._bytes
+
+    def __len__(self):
+        return len(self._conversations)
+
+
+conversation_store = ConversationStore(
+    max_bytes=int(os.getenv("CONVERSATION_CACHE_BYTES", str(8 * 1024 * 1024))),
+    window=int(os.getenv("CONVERSATION_WINDOW", "20")),
+    persist=os.getenv("CONVERSATION_PERSIST", "false").lower() == "true",
+)
@@ -0,0 +1,143 @@
+"""
+In-process publish/subscribe hub for live item change events
+"""
+import asyncio
+import json
+import threading
+
+
+class Subscriber:
+    """A single change feed consumer with its own bounded queue"""
+
+    def __init__(self, hub, list_key, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.hub = hub
+        self.list_key = list_key
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.evicted = False
+
+    def _offer(self, event: dict):
+        """Queue an event on the subscriber's loop, evicting it when it falls behind"""
+        if self.evicted:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            print(f"Evicting slow change feed subscriber of list {self.list_key}")
+            self.hub.unsubscribe(self)
+            self.evicted = True
+            # Make room for the sentinel so a waiting consumer wakes up and closes
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self) -> dict | None:
+        """Wait for the next event; None means the subscriber was evicted"""
+        return await self.queue.get()
+
+
+class EventHub:
+    """
+    Broadcasts item events to every subscriber of a list.
+
+    publish() may be called from the event loop or from the threadpool that runs
+    sync endpoints; delivery is always scheduled on each subscriber's own loop.
+    """
+
+    def __init__(self, max_queue: int = 100):
+        self.max_queue = max_queue
+        self._subscribers: dict = {}
+        self._versions: dict = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, list_key) -> Subscriber:
+        """Register a consumer; must be called from a running event loop"""
+        subscriber = Subscriber(self, list_key, asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subscribers.setdefault(list_key, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        """Remove a consumer; safe to call more than once"""
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.list_key)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.list_key]
+
+    def version(self, list_key) -> int:
+        """Return the version of the last event published for a list"""
+        with self._lock:
+            return self._versions.get(list_key, 0)
+
+    def publish(self, list_key, event_type: str, item: dict, version: int) -> dict:
+        """Fan an event carrying the list version produced by the change out to subscribers"""
+        return self._broadcast(list_key, {"type": event_type, "version": version, "item": item})
+
+    def publish_batch(self, list_key, changes: list[dict]) -> dict:
+        """
+        Fan the changes of one bulk statement out as a single batch event.
+
+        Each change has the shape of a single event ({"type", "version", "item"}),
+        so a bulk write takes one queue slot instead of evicting every subscriber.
+        """
+        version = max(change["version"] for change in changes)
+        return self._broadcast(list_key, {"type": "batch", "version": version, "changes": changes})
+
+    def _broadcast(self, list_key, event: dict) -> dict:
+        closed = []
+        with self._lock:
+            self._versions[list_key] = max(self._versions.get(list_key, 0), event["version"])
+            # Schedule under the lock so every loop receives events in publish order
+            for subscriber in self._subscribers.get(list_key, ()):
+                try:
+                    subscriber.loop.call_soon_threadsafe(subscriber._offer, event)
+                except RuntimeError:
+                    # The subscriber's loop is closed, so nobody is reading it anymore
+                    closed.append(subscriber)
+        for subscriber in closed:
+            self.unsubscribe(subscriber)
+        return event
+
+    def subscriber_count(self, list_key) -> int:
+        """Return the number of live subscribers of a list"""
+        with self._lock:
+            return len(self._subscribers.get(list_key, ()))
+
+
+
+def event_data(event: dict) -> dict:
+    """The payload of an event: version plus item, or changes for a batch"""
+    return {key: value for key, value in event.items() if key != "type"}
+
+
+def format_sse(event_type: str, data: dict, event_id: int | None = None) -> str:
+    """Encode one Server-Sent Events frame"""
+    frame = f"event: {event_type}\n"
+    if event_id is not None:
+        frame += f"id: {event_id}\n"
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+async def sse_stream(subscriber: Subscriber, snapshot: dict, keepalive: float = 15.0):
+    """Yield the list snapshot followed by live events until the client goes away"""
+    try:
+        yield format_sse("snapshot", snapshot, snapshot["version"])
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                # Comment frames keep proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                # Evicted for falling behind; the client must reload the snapshot
+                yield format_sse("reset", {"version": subscriber.hub.version(subscriber.list_key)})
+                return
+            yield format_sse(event["type"], event_data(event), event["version"])
+    finally:
+        subscriber.hub.unsubscribe(subscriber)
+
+
+item_events = EventHub()
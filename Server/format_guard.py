@@ -0,0 +1,115 @@
+"""
+Early check that a streamed LLM answer is a command stream and not prose
+
+The first non-whitespace characters decide: a JSON answer has to open with [
+(optionally inside a ```json fence), a compact answer with an opcode and a
+space or a lone "-". Anything else is aborted before the caller sees it.
+"""
+import threading
+
+from command_codec import OPCODES
+
+FENCES = ("```json", "```")
+
+
+class OffFormatError(Exception):
+    """Raised when a stream starts with something other than commands"""
+
+    def __init__(self, text: str):
+        super().__init__(f"Off-format answer: {text!r}")
+        self.text = text
+
+
+def verdict(text: str, compact: bool = False) -> bool | None:
+    """Whether the start of an answer is a valid command stream, or None when it is too early to tell"""
+    text = text.lstrip()
+    if text.startswith("`"):
+        if any(fence.startswith(text) for fence in FENCES):
+            return None
+        fence = next((fence for fence in FENCES if text.startswith(fence)), None)
+        if fence is None:
+            return False
+        text = text[len(fence):].lstrip()
+    if not text:
+        return None
+    if text[0] == "[" or (compact and text[0] == "{"):
+        return True
+    if not compact:
+        return False
+    if text[0] != "-" and text[0] not in OPCODES:
+        return False
+    if len(text) == 1:
+        return None
+    return text[1] == " " if text[0] in OPCODES else text[1].isspace()
+
+
+async def check(stream, compact: bool = False, max_chars: int = 16):
+    """
+    Hold back the start of a stream until verdict() accepts it, then pass it through.
+
+    Raises OffFormatError after closing the stream when the answer starts off-format,
+    or is still undecided after max_chars non-whitespace characters.
+    """
+    buffer = ""
+    passed = False
+    async for chunk in stream:
+        if passed:
+            yield chunk
+            continue
+        buffer += chunk
+        valid = verdict(buffer, compact)
+        if valid is None and len("".join(buffer.split())) >= max_chars:
+            valid = False
+        if valid is None:
+            continue
+        if not valid:
+            await stream.aclose()
+            raise OffFormatError(buffer)
+        passed = True
+        yield buffer
+    if not passed and buffer:
+        yield buffer
+
+
+class GuardMetrics:
+    """Counts of checked, aborted and retried answers and what the aborted ones cost"""
+
+    def __init__(self):
+        self.checked = 0
+        self.aborted = 0
+        self.retried = 0
+        self.fallbacks = 0
+        self.wasted_chars = 0
+        self.wasted_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_check(self):
+        with self._lock:
+            self.checked += 1
+
+    def record_abort(self, text: str, seconds: float, retry: bool):
+        """Record an aborted answer, the text generated before the abort and the time spent on it"""
+        print(f"Aborted off-format answer after {seconds:.2f}s: {text!r} ({'retrying' if retry else 'falling back'})")
+        with self._lock:
+            self.aborted += 1
+            self.retried += int(retry)
+            self.wasted_chars += len(text)
+            self.wasted_seconds += seconds
+
+    def record_fallback(self):
+        with self._lock:
+            self.fallbacks += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "aborted": self.aborted,
+                "retried": self.retried,
+                "fallbacks": self.fallbacks,
+                "wasted_chars": self.wasted_chars,
+                "wasted_seconds": self.wasted_seconds,
+            }
+
+
+guard_metrics = GuardMetrics()
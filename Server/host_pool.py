@@ -0,0 +1,130 @@
+"""
+Least-outstanding-requests balancing over several inference hosts
+
+Each host wraps an LLM client (Ollama or any OpenAI-compatible server such as
+llama.cpp or vLLM). Hosts that fail several times in a row are ejected for a
+while and come back after a successful health check or once the ejection ends.
+"""
+import asyncio
+import threading
+import time
+
+OPENAI_PREFIX = "openai+"
+
+
+def parse_hosts(value: str) -> list[tuple[str, str]]:
+    """Split a comma separated host list into (kind, url); "openai+http://..." marks OpenAI-compatible servers"""
+    hosts = []
+    for url in value.split(","):
+        url = url.strip()
+        if not url:
+            continue
+        if url.startswith(OPENAI_PREFIX):
+            hosts.append(("openai", url[len(OPENAI_PREFIX):]))
+        else:
+            hosts.append(("ollama", url))
+    return hosts
+
+
+class Host:
+    """One inference endpoint and its load and health counters"""
+
+    def __init__(self, url: str, client):
+        self.url = url
+        self.client = client
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def is_ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+
+class HostPool:
+    """Pick the healthy host with the fewest requests in flight"""
+
+    def __init__(self, hosts: list[Host], max_failures: int = 3, eject_seconds: float = 30.0):
+        if not hosts:
+            raise ValueError("At least one host is required")
+        self.hosts = hosts
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self._turn = 0
+        self._lock = threading.Lock()
+        self._health_task = None
+
+    def acquire(self) -> Host:
+        """Reserve the least loaded healthy host; with every host ejected, the one ejected longest ago"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [(i, host) for i, host in enumerate(self.hosts) if not host.is_ejected(now)]
+            if healthy:
+                # Ties go round robin so idle hosts share the load evenly
+                _, host = min(healthy, key=lambda entry: (entry[1].in_flight, (entry[0] - self._turn) % len(self.hosts)))
+                self._turn += 1
+            else:
+                host = min(self.hosts, key=lambda host: host.ejected_until)
+                print(f"All hosts ejected, trying {host.url}")
+            host.in_flight += 1
+            host.requests += 1
+            return host
+
+    def release(self, host: Host, failed: bool | None = False):
+        """Return a host reserved by acquire() and record whether the request failed (None: unknown)"""
+        with self._lock:
+            host.in_flight -= 1
+        if failed is not None:
+            self.record(host, not failed)
+
+    def record(self, host: Host, ok: bool):
+        """Reset a host after a success; eject it after max_failures failures in a row"""
+        with self._lock:
+            if ok:
+                if host.ejected_until:
+                    print(f"Host {host.url} is back")
+                host.failures = 0
+                host.ejected_until = 0.0
+                return
+            host.failures += 1
+            if host.failures >= self.max_failures:
+                host.ejected_until = time.monotonic() + self.eject_seconds
+                print(f"Host {host.url} ejected for {self.eject_seconds}s after {host.failures} failures")
+
+    async def check_health(self):
+        """Ping every host once and record the outcome"""
+        async def ping(host: Host):
+            try:
+                await host.client.ping()
+            except Exception as e:
+                print(f"Health check of {host.url} failed: {e}")
+                self.record(host, False)
+            else:
+                self.record(host, True)
+
+        await asyncio.gather(*(ping(host) for host in self.hosts))
+
+    async def run_health_checks(self, interval: float):
+        """Check the hosts every interval seconds until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_health()
+
+    def start_health_checks(self, interval: float):
+        """Run the health checks in the background; every client sharing the pool may call this"""
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self.run_health_checks(interval))
+
+    def snapshot(self) -> list[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "url": host.url,
+                    "in_flight": host.in_flight,
+                    "requests": host.requests,
+                    "failures": host.failures,
+                    "ejected": host.is_ejected(now),
+                }
+                for host in self.hosts
+            ]
@@ -0,0 +1,209 @@
+"""
+Hashed n-gram linear intent classifier for chat utterances
+
+Usage:
+  python3 intent_classifier.py train <examples.jsonl> <model.npz>
+  python3 intent_classifier.py evaluate <examples.jsonl> <model.npz>
+  python3 intent_classifier.py export <examples.jsonl>   # label stored conversations
+
+Examples are JSON lines with at least {"text": ..., "intent": ...}.
+"""
+import functools
+import json
+import os
+import re
+import sys
+import zlib
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+LABELS = ("add", "remove", "check", "uncheck", "out_of_scope", "complex")
+COMMAND_LABELS = {
+    "AddItem": "add",
+    "RemoveItem": "remove",
+    "CheckItem": "check",
+    "UncheckItem": "uncheck",
+}
+FORMAT_VERSION = 1
+
+
+def features(text: str, n_features: int):
+    """L2-normalized hashed word 1-2 gram and char 3-5 gram counts"""
+    words = re.findall(r"\w+", text.lower())
+    grams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f"<{word}>"
+        grams += [padded[i:i + n] for n in (3, 4, 5) for i in range(len(padded) - n + 1)]
+
+    vector = np.zeros(n_features, dtype=np.float32)
+    for gram in grams:
+        # crc32 instead of hash() so indices are stable across processes
+        vector[zlib.crc32(gram.encode("utf-8")) % n_features] += 1
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def label_commands(commands: list) -> str:
+    """Derive the intent label of an utterance from the commands it produced"""
+    kinds = {COMMAND_LABELS.get(command.get("command")) for command in commands if isinstance(command, dict)}
+    if not kinds:
+        return "out_of_scope"
+    if len(kinds) > 1 or None in kinds:
+        return "complex"
+    return kinds.pop()
+
+
+class IntentClassifier:
+    """Multinomial logistic regression over hashed n-gram features"""
+
+    def __init__(self, weights, bias, labels=LABELS):
+        if np is None:
+            raise RuntimeError("numpy is required for the intent classifier (pip install grocery-list[classifier])")
+        self.weights = weights
+        self.bias = bias
+        self.labels = tuple(labels)
+
+    @property
+    def n_features(self) -> int:
+        return self.weights.shape[0]
+
+    @classmethod
+    def train(cls, texts: list[str], intents: list[str], n_features: int = 2 ** 14,
+              epochs: int = 300, learning_rate: float = 10.0, l2: float = 1e-4):
+        """Fit the model with full-batch gradient descent on the softmax loss"""
+        if np is None:
+            raise RuntimeError("numpy is required for the intent classifier (pip install grocery-list[classifier])")
+        x = np.stack([features(text, n_features) for text in texts])
+        y = np.array([LABELS.index(intent) for intent in intents])
+        targets = np.eye(len(LABELS), dtype=np.float32)[y]
+        weights = np.zeros((n_features, len(LABELS)), dtype=np.float32)
+        bias = np.zeros(len(LABELS), dtype=np.float32)
+
+        for _ in range(epochs):
+            probabilities = _softmax(x @ weights + bias)
+            error = (probabilities - targets) / len(texts)
+            weights -= learning_rate * (x.T @ error + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+        return cls(weights, bias)
+
+    def predict(self, text: str) -> tuple[str, float]:
+        """Return the most likely intent and its probability"""
+        probabilities = _softmax(features(text, self.n_features) @ self.weights + self.bias)
+        index = int(probabilities.argmax())
+        return self.labels[index], float(probabilities[index])
+
+    def save(self, path: str):
+        """Write the model as an uncompressed .npz so it loads with a single read"""
+        np.savez(
+            path,
+            version=np.array(FORMAT_VERSION),
+            labels=np.array(self.labels),
+            weights=self.weights,
+            bias=self.bias,
+        )
+
+    @classmethod
+    def load(cls, path: str):
+        """Load a model written by save()"""
+        if np is None:
+            raise RuntimeError("numpy is required for the intent classifier (pip install grocery-list[classifier])")
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != FORMAT_VERSION:
+                raise ValueError(f"Unsupported intent model version: {int(data['version'])}")
+            return cls(data["weights"], data["bias"], [str(label) for label in data["labels"]])
+
+
+def _softmax(scores):
+    scores = scores - scores.max(axis=-1, keepdims=True)
+    exponentials = np.exp(scores)
+    return exponentials / exponentials.sum(axis=-1, keepdims=True)
+
+
+@functools.lru_cache(maxsize=None)
+def load_configured() -> "IntentClassifier | None":
+    """The model at INTENT_MODEL, loaded once per process, or None when it is not set"""
+    path = os.getenv("INTENT_MODEL")
+    return IntentClassifier.load(path) if path else None
+
+
+def evaluate(classifier: IntentClassifier, texts: list[str], intents: list[str]) -> dict:
+    """Return accuracy and per-label precision and recall"""
+    predicted = [classifier.predict(text)[0] for text in texts]
+    report = {"accuracy": sum(p == t for p, t in zip(predicted, intents)) / len(intents), "labels": {}}
+    for label in classifier.labels:
+        true_positives = sum(p == t == label for p, t in zip(predicted, intents))
+        predicted_count = predicted.count(label)
+        actual_count = intents.count(label)
+        report["labels"][label] = {
+            "precision": true_positives / predicted_count if predicted_count else 0.0,
+            "recall": true_positives / actual_count if actual_count else 0.0,
+            "support": actual_count,
+        }
+    return report
+
+
+def read_examples(path: str) -> tuple[list[str], list[str]]:
+    """Read texts and intents from a JSON lines file"""
+    texts, intents = [], []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                example = json.loads(line)
+                texts.append(example["text"])
+                intents.append(example["intent"])
+    return texts, intents
+
+
+def export_conversations(path: str):
+    """Label stored user turns with the commands the LLM answered them with"""
+    from Models import ConversationMessage, SessionLocal
+
+    db = SessionLocal()
+    try:
+        rows = db.query(ConversationMessage).order_by(
+            ConversationMessage.conversation_id, ConversationMessage.id
+        ).all()
+    finally:
+        db.close()
+
+    count = 0
+    with open(path, "w", encoding="utf-8") as file:
+        for user, answer in zip(rows, rows[1:]):
+            if user.role != "user" or answer.role != "assistant" or user.conversation_id != answer.conversation_id:
+                continue
+            try:
+                commands = json.loads(answer.content.replace("```json", "").replace("```", "").strip())
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(commands, list):
+                continue
+            file.write(json.dumps({"text": user.content, "intent": label_commands(commands), "commands": commands}) + "\n")
+            count += 1
+    print(f"Exported {count} examples to {path}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("train", "evaluate", "export"):
+        print(__doc__.strip())
+        sys.exit(1)
+
+    action = sys.argv[1]
+    if action == "export":
+        export_conversations(sys.argv[2])
+        sys.exit(0)
+    if len(sys.argv) < 4:
+        print(__doc__.strip())
+        sys.exit(1)
+
+    texts, intents = read_examples(sys.argv[2])
+    if action == "train":
+        IntentClassifier.train(texts, intents).save(sys.argv[3])
+        print(f"Trained on {len(texts)} examples, saved to {sys.argv[3]}")
+    else:
+        report = evaluate(IntentClassifier.load(sys.argv[3]), texts, intents)
+        print(f"Accuracy: {report['accuracy']:.3f}")
+        for label, scores in report["labels"].items():
+            print(f"  {label:<13} precision {scores['precision']:.3f}  recall {scores['recall']:.3f}  support {scores['support']}")
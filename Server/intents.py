@@ -0,0 +1,183 @@
+"""
+Fast intent resolution for voice transcripts that skips the LLM when it can
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from Models import matching_item_id
+from intent_classifier import COMMAND_LABELS, load_configured
+
+VERBS = {
+    "add": "AddItem",
+    "buy": "AddItem",
+    "put": "AddItem",
+    "remove": "RemoveItem",
+    "delete": "RemoveItem",
+    "check off": "CheckItem",
+    "tick off": "CheckItem",
+    "cross off": "CheckItem",
+    "check": "CheckItem",
+    "conclude": "CheckItem",
+    "uncheck": "UncheckItem",
+    "unconclude": "UncheckItem",
+}
+# Leading words that are not part of the item name
+DETERMINERS = {"the", "a", "an", "some", "my", "our", "more", "any", "another"}
+
+_COMMAND = re.compile(
+    r"^(?:please )?(?P<verb>" + "|".join(VERBS) + r") (?:item )?(?P<values>.+?)"
+    r"(?: (?:to|from|on|in|off) (?:the |my )?(?:grocery |shopping )?list| off)?$"
+)
+# Only commas separate items; a bare "and" may be part of a name ("mac and cheese")
+_SEPARATOR = re.compile(r", (?:and )?")
+
+
+def normalize(text: str) -> str:
+    """Lowercase a transcript and drop punctuation and repeated spaces"""
+    text = re.sub(r"[^\w\s,]", " ", text.lower())
+    text = re.sub(r"\s*,\s*", ", ", text)
+    return re.sub(r"\s+", " ", text).strip(" ,")
+
+
+def parse_command(text: str) -> list[dict] | None:
+    """
+    Parse simple commands like "add the milk" or "check off eggs, bread" without the LLM.
+
+    Returns None for anything it is not sure about (another verb inside the
+    values, pronouns that need the conversation history, an "and" that may
+    join two items or name one), so those go to the LLM.
+    """
+    match = _COMMAND.match(normalize(text))
+    if not match:
+        return None
+    values = []
+    for value in _SEPARATOR.split(match.group("values")):
+        words = value.split()
+        while words and words[0] in DETERMINERS:
+            words = words[1:]
+        if not words or words[0] in VERBS or words[0] in ("it", "that", "them", "everything", "all", "off"):
+            return None
+        if "and" in words:
+            return None
+        values.append(" ".join(words))
+    command = VERBS[match.group("verb")]
+    return [{"command": command, "value": value[0].upper() + value[1:]} for value in values]
+
+
+class IntentCache:
+    """
+    LRU cache of the commands the LLM produced for a normalized transcript.
+
+    Only transcripts whose command values all appear in the text are cached, so
+    answers that depended on the conversation history are never replayed.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text: str) -> list[dict] | None:
+        """Return the cached commands of a transcript, or None on a miss"""
+        key = normalize(text)
+        with self._lock:
+            commands = self._entries.get(key)
+            if commands is not None:
+                self._entries.move_to_end(key)
+            return commands
+
+    def set(self, text: str, commands: list[dict]):
+        """Remember the commands produced for a transcript when they are context free"""
+        key = normalize(text)
+        if not commands or not all(
+            isinstance(command, dict) and normalize(str(command.get("value", ""))) in key
+            for command in commands
+        ):
+            return
+        with self._lock:
+            self._entries[key] = commands
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Forget every cached transcript"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def resolve(text: str) -> list[dict] | None:
+    """Resolve a transcript through the fast-path parser, then the intent cache"""
+    commands = parse_command(text)
+    if commands is None:
+        commands = intent_cache.get(text)
+    return commands
+
+
+def predict(text: str) -> str | None:
+    """The intent the classifier is confident about, or None"""
+    if intent_classifier is None:
+        return None
+    intent, confidence = intent_classifier.predict(text)
+    return intent if confidence >= INTENT_THRESHOLD else None
+
+
+def route(text: str, mode: str = "normal") -> list[dict] | None:
+    """
+    Answer an utterance without the LLM when the intent classifier is confident.
+
+    Out-of-scope utterances get [] right away; simple intents go through the
+    fast path and cache. In any degraded mode (see slo.py) the fast path and
+    cache answer whatever they can first. None means the LLM has to handle it.
+    """
+    if mode != "normal":
+        commands = resolve(text)
+        if commands is not None:
+            return commands
+    if intent_classifier is None:
+        return None
+    intent, confidence = intent_classifier.predict(text)
+    print(f"Intent: {intent} ({confidence:.2f})")
+    if confidence < INTENT_THRESHOLD or intent == "complex":
+        return None
+    if intent == "out_of_scope":
+        return []
+    commands = resolve(text)
+    if commands and all(COMMAND_LABELS.get(command.get("command")) == intent for command in commands):
+        return commands
+    return None
+
+
+def speculate(db: Session, list_id: int, text: str) -> dict:
+    """
+    Resolve a partial transcript and prefetch the items its commands refer to.
+
+    The result is only committed if the final transcript normalizes to the
+    same text and every command on an existing item found its item;
+    candidates map command values to item ids (or None).
+    """
+    commands = resolve(text)
+    candidates = {}
+    for command in commands or ():
+        if command["command"] != "AddItem":
+            candidates[command["value"]] = db.execute(select(matching_item_id(list_id, command["value"]))).scalar()
+    return {
+        "text": normalize(text),
+        "commands": commands,
+        "candidates": candidates,
+        "resolved": commands is not None and None not in candidates.values(),
+    }
+
+
+intent_cache = IntentCache()
+
+# Trained with `python3 intent_classifier.py train`; routing is off without a model
+INTENT_THRESHOLD = float(os.getenv("INTENT_THRESHOLD", "0.5"))
+intent_classifier = load_configured()
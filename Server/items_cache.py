@@ -0,0 +1,68 @@
+"""
+In-process cache for the serialized GET /items response
+"""
+import threading
+from collections import OrderedDict
+
+class ItemsCache:
+    """
+    Bounded LRU cache holding the pre-encoded items response of each list,
+    one body per negotiated media type.
+
+    Every mutation path must call invalidate() after committing. Readers take
+    a generation token before querying the database and pass it back to set(),
+    so a response built from a snapshot older than the last invalidation is
+    never stored.
+    """
+
+    def __init__(self, max_lists: int = 128):
+        self.max_lists = max_lists
+        self._entries: OrderedDict = OrderedDict()
+        self._generations: dict = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get(self, list_key, media_type: str = "application/json") -> bytes | None:
+        """Return the cached response body for a list, or None on a miss"""
+        with self._lock:
+            bodies = self._entries.get(list_key)
+            if bodies is None:
+                return None
+            self._entries.move_to_end(list_key)
+            return bodies.get(media_type)
+
+    def generation(self, list_key) -> tuple:
+        """Return the current generation token of a list"""
+        with self._lock:
+            return self._generation(list_key)
+
+    def set(self, list_key, body: bytes, generation: tuple, media_type: str = "application/json"):
+        """Store a response body unless the list changed since generation was taken"""
+        with self._lock:
+            if self._generation(list_key) != generation:
+                return
+            self._entries.setdefault(list_key, {})[media_type] = body
+            self._entries.move_to_end(list_key)
+            while len(self._entries) > self.max_lists:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, list_key):
+        """Drop the cached response of a list after a write"""
+        with self._lock:
+            self._entries.pop(list_key, None)
+            self._generations[list_key] = self._generations.get(list_key, 0) + 1
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._entries.clear()
+            self._epoch += 1
+
+    def _generation(self, list_key) -> tuple:
+        return (self._epoch, self._generations.get(list_key, 0))
+
+    def __len__(self):
+        return len(self._entries)
+
+
+items_cache = ItemsCache()
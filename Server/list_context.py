@@ -0,0 +1,49 @@
+"""
+Current list items for the LLM prompt, ranked by relevance and capped by a budget
+"""
+
+HEADER = "Items currently on the list ([x] = checked). Prefer these exact names in command values:\n"
+MIN_SIMILARITY = 0.3
+
+
+def trigrams(text: str) -> set[str]:
+    """Character trigrams of a lowercased text with padded word boundaries"""
+    text = f" {' '.join(text.lower().split())} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(utterance_trigrams: set[str], description: str) -> float:
+    """Share of an item's trigrams that also appear in the utterance"""
+    item_trigrams = trigrams(description)
+    if not item_trigrams:
+        return 0.0
+    return len(item_trigrams & utterance_trigrams) / len(item_trigrams)
+
+
+def rank_items(items: list[dict], text: str) -> list[dict]:
+    """Order items by lexical similarity to the utterance, then by most recent update"""
+    utterance_trigrams = trigrams(text)
+    by_recency = sorted(items, key=lambda item: (item.get("updated_at") or "", item["id"]), reverse=True)
+    scored = [(similarity(utterance_trigrams, item["description"]), position, item) for position, item in enumerate(by_recency)]
+    matches = [entry for entry in scored if entry[0] >= MIN_SIMILARITY]
+    others = [entry for entry in scored if entry[0] < MIN_SIMILARITY]
+    matches.sort(key=lambda entry: (-entry[0], entry[1]))
+    return [entry[2] for entry in matches + others]
+
+
+def build_list_context(items: list[dict], text: str, max_tokens: int) -> str | None:
+    """
+    Render the most relevant items that fit in max_tokens (about four characters
+    per token). Returns None for an empty list or a budget too small for one item.
+    """
+    budget = max_tokens * 4 - len(HEADER)
+    lines = []
+    for item in rank_items(items, text):
+        line = f"- {'[x] ' if item.get('checked') else ''}{item['description']}\n"
+        if len(line) > budget:
+            break
+        lines.append(line)
+        budget -= len(line)
+    if not lines:
+        return None
+    return HEADER + "".join(lines)
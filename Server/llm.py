@@ -1,8 +1,22 @@
+import asyncio
+import copy
+import functools
 import os
+import time
 from abc import ABC, abstractmethod
 from openai import AsyncOpenAI
 from ollama import AsyncClient
 from dotenv import load_dotenv
+import prompts
+import command_codec
+import circuit_breaker
+import format_guard
+import host_pool
+import intent_classifier
+import local_llm
+import model_router
+import retry
+import slo
 
 # Load environment variables from .env file
 load_dotenv()
@@ -10,6 +24,17 @@ load_dotenv()
 llm_type = os.getenv("LLM")
 model = os.getenv("MODEL")
 key = os.getenv("OPENAI_API_KEY")
+# "dynamic" picks few-shot examples per utterance, "static" sends SYSTEM_PROMPT
+prompt_mode = os.getenv("PROMPT_MODE", "dynamic")
+prompt_examples = int(os.getenv("PROMPT_EXAMPLES_K", "3"))
+# "compact" asks for one "A Milk" line per command instead of JSON
+command_format = os.getenv("COMMAND_FORMAT", "json")
+# Connect / read timeout of provider HTTP calls; the SDKs otherwise wait up to forever
+request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "60"))
+# "retry" re-asks once with a stricter prompt when an answer starts off-format,
+# "fallback" answers [] right away, "off" streams whatever the model says
+format_guard_mode = os.getenv("FORMAT_GUARD", "off")
+format_guard_chars = int(os.getenv("FORMAT_GUARD_CHARS", "16"))
 
 SYSTEM_PROMPT = """
 You are a helpful assistant that can help with grocery list software.
@@ -64,7 +89,8 @@ if not model:
     raise ValueError(
         "MODEL environment variable is not set. Please set it in your .env file.\n"
         "For Ollama: MODEL=llama2\n"
-        "For ChatGPT: MODEL=gpt-3.5-turbo"
+        "For ChatGPT: MODEL=gpt-3.5-turbo\n"
+        "For llama.cpp: MODEL=/path/to/model.gguf"
     )
 
 if llm_type == "chatgpt" and not key:
@@ -73,13 +99,66 @@ if llm_type == "chatgpt" and not key:
         "Please set it in your .env file."
     )
 
+if format_guard_mode not in ("off", "retry", "fallback"):
+    raise ValueError(f"Unknown FORMAT_GUARD: {format_guard_mode}. Available: off, retry, fallback")
+
+
+# Decoding presets; "command" caps the answer and stops at the closing ] of the array
+DECODING_PRESETS = {
+    "default": {},
+    "command": {"max_tokens": 256, "temperature": 0, "seed": 42, "stop": ["]"]},
+    "compact": {"max_tokens": 96, "temperature": 0, "seed": 42, "stop": ["\n\n"]},
+}
+
+
+def decoding_options(preset: str) -> dict:
+    """Return a decoding preset with the LLM_* / OLLAMA_* environment overrides applied"""
+    if preset not in DECODING_PRESETS:
+        raise ValueError(f"Unknown decoding preset: {preset}. Available: {', '.join(DECODING_PRESETS)}")
+    options = dict(DECODING_PRESETS[preset])
+    overrides = {
+        "max_tokens": ("LLM_MAX_TOKENS", int),
+        "temperature": ("LLM_TEMPERATURE", float),
+        "seed": ("LLM_SEED", int),
+        "stop": ("LLM_STOP", lambda value: value.split("|")),
+        "num_ctx": ("OLLAMA_NUM_CTX", int),
+        "num_thread": ("OLLAMA_NUM_THREAD", int),
+    }
+    for option, (variable, parse) in overrides.items():
+        if os.getenv(variable):
+            options[option] = parse(os.getenv(variable))
+    return options
+
+
+# Reasoning models reject temperature, seed and stop sequences
+REASONING_MODEL_PREFIXES = ("o1", "o3", "o4", "gpt-5")
+
+
+def closing_stop(text: str, stop: list[str]) -> str:
+    """Return the ] a stop sequence cut off when the array would otherwise be left open"""
+    if "]" in stop and text.count("[") > text.count("]"):
+        return "]"
+    return ""
+
 
 # Abstract base class for LLM clients
 class LLMClient(ABC):
     """Abstract base class for LLM clients"""
     
-    def __init__(self, model: str):
+    # True when the first chunk only comes after the whole answer; stream_chat then takes on_first_token
+    buffered = False
+    
+    def __init__(self, model: str, options: dict | None = None):
         self.model = model
+        self.options = options or {}
+    
+    def with_model(self, model: str) -> "LLMClient":
+        """The same client and connection for another model"""
+        if model == self.model:
+            return self
+        client = copy.copy(self)
+        client.model = model
+        return client
     
     @abstractmethod
     async def stream_chat(self, messages: list[dict]):
@@ -87,71 +166,506 @@ class LLMClient(ABC):
         pass
 
 
+# Returned by anext() once a stream is exhausted
+_END = object()
+
+
 # ChatGPT implementation
 class ChatGPTClient(LLMClient):
     """OpenAI ChatGPT client implementation"""
     
-    def __init__(self, model: str, api_key: str):
-        super().__init__(model)
-        self.client = AsyncOpenAI(api_key=api_key)
+    def __init__(self, model: str, api_key: str, options: dict | None = None, base_url: str | None = None):
+        super().__init__(model, options)
+        # base_url points the client at an OpenAI-compatible server (llama.cpp, vLLM)
+        # retry.py is the only retry layer; SDK retries would multiply its attempts
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=request_timeout, max_retries=0)
+    
+    async def ping(self):
+        """Fail unless the API answers"""
+        await self.client.models.list()
     
     async def stream_chat(self, messages: list[dict]):
         print("Using ChatGPT API")
+        options = {}
+        if "max_tokens" in self.options:
+            options["max_completion_tokens"] = self.options["max_tokens"]
+        sampling = () if self.model.startswith(REASONING_MODEL_PREFIXES) else ("temperature", "seed", "stop")
+        for option in sampling:
+            if option in self.options:
+                options[option] = self.options[option]
+        if messages and messages[0].get("role") == "system":
+            # Requests sharing a key are routed to the same prompt cache
+            options["prompt_cache_key"] = prompts.prefix_key(messages[0]["content"])
         stream = await self.client.chat.completions.create(
             model=self.model,
             messages=messages,
-            stream=True
+            stream=True,
+            stream_options={"include_usage": True},
+            **options
         )
         
-        async for chunk in stream:
-            if chunk.choices[0].delta.content is not None:
-                yield chunk.choices[0].delta.content
+        text = ""
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    # include_usage adds a final chunk with no choices and the token counts
+                    if chunk.usage:
+                        details = chunk.usage.prompt_tokens_details
+                        prompts.prompt_metrics.record_usage(
+                            chunk.usage.prompt_tokens,
+                            details.cached_tokens if details else None,
+                            chunk.usage.completion_tokens,
+                        )
+                    continue
+                if chunk.choices[0].delta.content is not None:
+                    text += chunk.choices[0].delta.content
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Closing the response stops the generation when the caller gives up early
+            await stream.aclose()
+        if closing := closing_stop(text, options.get("stop", [])):
+            yield closing
 
 
 # Ollama implementation
 class OllamaClient(LLMClient):
     """Ollama client implementation"""
     
-    def __init__(self, model: str, host: str = "http://localhost:11434"):
-        super().__init__(model)
-        self.client = AsyncClient(host=host)
+    def __init__(self, model: str, host: str = "http://localhost:11434", options: dict | None = None):
+        super().__init__(model, options)
+        self.client = AsyncClient(host=host, timeout=request_timeout)
+    
+    async def ping(self):
+        """Fail unless the server answers"""
+        await self.client.list()
     
     async def stream_chat(self, messages: list[dict]):
         print("Using Ollama API")
+        options = {"num_predict": self.options["max_tokens"]} if "max_tokens" in self.options else {}
+        for option in ("temperature", "seed", "stop", "num_ctx", "num_thread"):
+            if option in self.options:
+                options[option] = self.options[option]
         stream = await self.client.chat(
             model=self.model,
             messages=messages,
-            stream=True
+            stream=True,
+            **({"options": options} if options else {})
         )
         
-        async for chunk in stream:
-            if chunk.get("message") and chunk["message"].get("content"):
-                yield chunk["message"]["content"]
+        text = ""
+        try:
+            async for chunk in stream:
+                if chunk.get("message") and chunk["message"].get("content"):
+                    text += chunk["message"]["content"]
+                    yield chunk["message"]["content"]
+                if chunk.get("done") and chunk.get("prompt_eval_count") is not None:
+                    # Ollama only reports the prompt tokens it had to evaluate, so a
+                    # reused prefix shows up as a drop in prompt_eval_count
+                    prompts.prompt_metrics.record_usage(chunk["prompt_eval_count"], None, chunk.get("eval_count"))
+        finally:
+            await stream.aclose()
+        if closing := closing_stop(text, self.options.get("stop", [])):
+            yield closing
+
+
+# llama.cpp in local worker processes
+class LlamaCppClient(LLMClient):
+    """Runs a GGUF model on the CPU through llama-cpp-python, without an Ollama daemon"""
+    
+    def __init__(self, model: str, options: dict | None = None, workers: int = 1, n_threads: int | None = None,
+                 n_ctx: int = 2048, cache_bytes: int = 2 ** 28):
+        super().__init__(model, options)
+        if not local_llm.available():
+            raise RuntimeError("llama-cpp-python is required for LLM=llamacpp (pip install grocery-list[local])")
+        self.pool = local_llm.WorkerPool(
+            {
+                "model_path": model,
+                "n_ctx": n_ctx,
+                # Split the cores between the workers unless told otherwise
+                "n_threads": n_threads or max(1, (os.cpu_count() or 1) // workers),
+                "cache_bytes": cache_bytes,
+            },
+            workers,
+        )
+    
+    async def stream_chat(self, messages: list[dict]):
+        print("Using llama.cpp")
+        options = {option: self.options[option] for option in ("max_tokens", "temperature", "seed", "stop")
+                   if option in self.options}
+        text = ""
+        async for token in self.pool.generate(messages, options):
+            text += token
+            yield token
+        if closing := closing_stop(text, self.options.get("stop", [])):
+            yield closing
+
+
+# Several inference hosts behind one client
+class PooledClient(LLMClient):
+    """Spreads requests over Ollama / OpenAI-compatible hosts, least outstanding requests first"""
+    
+    def __init__(self, model: str, hosts: list[tuple[str, str]], options: dict | None = None,
+                 api_key: str | None = None, health_interval: float = 0, pool: host_pool.HostPool | None = None):
+        super().__init__(model, options)
+        # Model tiers pass the first tier's pool, so they share its hosts, load counters and health checks
+        self.pool = pool or host_pool.HostPool(
+            [
+                host_pool.Host(url, ChatGPTClient(model, api_key or "unused", options, base_url=url) if kind == "openai"
+                               else OllamaClient(model, url, options))
+                for kind, url in hosts
+            ],
+            max_failures=int(os.getenv("HOST_MAX_FAILURES", "3")),
+            eject_seconds=float(os.getenv("HOST_EJECT_SECONDS", "30")),
+        )
+        self.clients = {host.url: host.client.with_model(model) for host in self.pool.hosts}
+        self.health_interval = health_interval
+    
+    async def stream_chat(self, messages: list[dict]):
+        if self.health_interval:
+            # Started on the first request, when there is an event loop to run it
+            self.pool.start_health_checks(self.health_interval)
+        host = self.pool.acquire()
+        print(f"Using host {host.url}")
+        # Stays None when the caller stops reading early, which says nothing about the host
+        failed = None
+        try:
+            async for chunk in self.clients[host.url].stream_chat(messages):
+                yield chunk
+            failed = False
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.pool.release(host, failed)
+
+
+# Small model first, larger models for hard utterances
+class TieredClient(LLMClient):
+    """
+    Routes each request to a model tier by the complexity of the last user message.
+
+    Answers of every tier but the last are buffered and validated before they are
+    streamed, so an invalid one can be escalated to the next tier. on_first_token
+    is called when a tier sends its first token, which the caller would otherwise
+    only see once the answer is complete.
+    """
+    
+    buffered = True
+    
+    def __init__(self, tiers: list[tuple[str, LLMClient]], max_words: int = 12, classifier=None,
+                 min_confidence: float = 0.5):
+        super().__init__(tiers[0][1].model, tiers[0][1].options)
+        self.tiers = tiers
+        self.max_words = max_words
+        self.classifier = classifier
+        self.min_confidence = min_confidence
+    
+    async def stream_chat(self, messages: list[dict], on_first_token=None):
+        async def timed(stream):
+            async for chunk in stream:
+                if on_first_token:
+                    on_first_token()
+                yield chunk
+
+        user_messages = [m["content"] for m in messages if m.get("role") == "user"]
+        reason = model_router.escalation_reason(
+            user_messages[-1] if user_messages else "", self.max_words, self.classifier, self.min_confidence
+        )
+        start = 0
+        if reason:
+            start = len(self.tiers) - 1
+            model_router.tier_metrics.record_route(reason)
+            print(f"Routing to {self.tiers[start][0]} ({reason})")
+        for position in range(start, len(self.tiers)):
+            name, client = self.tiers[position]
+            started = time.monotonic()
+            if position == len(self.tiers) - 1:
+                async for chunk in timed(client.stream_chat(messages)):
+                    yield chunk
+                model_router.tier_metrics.record(name, time.monotonic() - started)
+                return
+            output = "".join([chunk async for chunk in timed(client.stream_chat(messages))])
+            valid = model_router.is_valid_output(output)
+            model_router.tier_metrics.record(name, time.monotonic() - started, escalated=not valid)
+            if valid:
+                yield output
+                return
+            print(f"Escalating from {name}, invalid answer: {output!r}")
+
+
+# Providers in order of preference, each behind a circuit breaker
+class FailoverClient(LLMClient):
+    """
+    Tries providers in order, skipping those whose circuit breaker is open.
+
+    Transient errors before the first token are retried on the same provider
+    first (with a retry policy); a provider that still fails, or sends no token
+    within first_token_seconds, hands the request to the next one. Once tokens
+    have been streamed an error is raised as is.
+    """
+    
+    def __init__(self, providers: list[tuple[str, LLMClient]], breaker_options: dict | None = None,
+                 retry_policy: retry.RetryPolicy | None = None, slo_controller: slo.SLOController | None = None,
+                 first_token_seconds: float | None = None):
+        super().__init__(providers[0][1].model, providers[0][1].options)
+        self.providers = [
+            (name, client, circuit_breaker.CircuitBreaker(name, **(breaker_options or {})))
+            for name, client in providers
+        ]
+        self.retry_policy = retry_policy
+        self.slo_controller = slo_controller
+        self.first_token_seconds = first_token_seconds
+    
+    async def stream_chat(self, messages: list[dict]):
+        errors = []
+        for name, client, breaker in self.providers:
+            if not breaker.allow():
+                errors.append(f"{name}: circuit open")
+                if self.slo_controller:
+                    self.slo_controller.record(name, False, 0.0)
+                continue
+            started = time.monotonic()
+            # Set once a chunk reached the caller; ttft is when the provider sent its first token
+            first_token = None
+            ttft = None
+            # Stays None when the caller stops reading before the first token
+            ok = None
+            deadline = asyncio.timeout(self.first_token_seconds)
+            
+            def first_token_seen():
+                nonlocal ttft
+                if ttft is None:
+                    ttft = time.monotonic() - started
+                    deadline.reschedule(None)
+            
+            stream_chat = client.stream_chat
+            if client.buffered:
+                stream_chat = functools.partial(client.stream_chat, on_first_token=first_token_seen)
+            if self.retry_policy:
+                stream = retry.stream_with_retry(stream_chat, messages, self.retry_policy, retry_metrics)
+            else:
+                stream = stream_chat(messages)
+            try:
+                try:
+                    # A hung provider counts as failed so its breaker and the SLO see it
+                    async with deadline:
+                        chunk = await anext(stream, _END)
+                except TimeoutError:
+                    raise TimeoutError(f"no first token within {self.first_token_seconds:g}s") from None
+                first_token = time.monotonic() - started
+                if ttft is None:
+                    ttft = first_token
+                if chunk is not _END:
+                    yield chunk
+                    async for chunk in stream:
+                        yield chunk
+                ok = True
+            except Exception as e:
+                ok = False
+                if first_token is not None:
+                    raise
+                print(f"Provider {name} failed: {e}")
+                errors.append(f"{name}: {e}")
+                continue
+            finally:
+                if ok is None and first_token is not None:
+                    ok = True
+                if ok is None:
+                    breaker.cancel()
+                else:
+                    seconds = ttft if ttft is not None else time.monotonic() - started
+                    breaker.record(ok, seconds)
+                    if self.slo_controller:
+                        self.slo_controller.record(name, ok, seconds)
+                await stream.aclose()
+            return
+        raise circuit_breaker.CircuitOpenError(f"All LLM providers are unavailable ({'; '.join(errors)})")
+    
+    def snapshot(self) -> list[dict]:
+        """Breaker state of every provider"""
+        return [breaker.snapshot() for _, _, breaker in self.providers]
 
 
 # Factory function
-def create_llm_client(llm_type: str, model: str, api_key: str = None) -> LLMClient:
-    """Factory function to create the appropriate LLM client"""
+def create_llm_client(llm_type: str, model: str, api_key: str = None, options: dict | None = None,
+                      hosts: list[tuple[str, str]] | None = None, tiers: list[str] | None = None,
+                      pool: host_pool.HostPool | None = None) -> LLMClient:
+    """Factory function to create the appropriate LLM client; tiers lists models from small to large"""
+    if tiers:
+        clients = []
+        for tier in tiers:
+            clients.append((tier, create_llm_client(llm_type, tier, api_key, options, hosts, pool=pool)))
+            # Every tier runs on the same hosts: one pool, one health check
+            pool = pool or next((c.pool for c in walk_clients(clients[-1][1]) if isinstance(c, PooledClient)), None)
+        return TieredClient(
+            clients,
+            max_words=int(os.getenv("TIER_ESCALATE_WORDS", "12")),
+            classifier=intent_classifier.load_configured(),
+            min_confidence=float(os.getenv("TIER_ESCALATE_CONFIDENCE", "0.5")),
+        )
     if llm_type == "chatgpt":
         if not api_key:
             raise ValueError("API key is required for ChatGPT")
-        return ChatGPTClient(model, api_key)
+        return ChatGPTClient(model, api_key, options)
+    if llm_type == "llamacpp":  # model is the path of a GGUF file
+        client = LlamaCppClient(
+            model,
+            options,
+            workers=int(os.getenv("LLAMACPP_WORKERS", "1")),
+            n_threads=int(os.getenv("LLAMACPP_THREADS", "0")) or None,
+            n_ctx=int(os.getenv("LLAMACPP_CTX", "2048")),
+            cache_bytes=int(os.getenv("LLAMACPP_CACHE_BYTES", str(2 ** 28))),
+        )
+    elif hosts:  # ollama or OpenAI-compatible servers, balanced
+        # Self-hosted servers get their own key so OPENAI_API_KEY never leaves for OpenAI
+        client = PooledClient(model, hosts, options, os.getenv("OPENAI_COMPAT_API_KEY"),
+                              float(os.getenv("HOST_HEALTH_INTERVAL", "10")), pool)
     else:  # ollama
-        return OllamaClient(model)
+        client = OllamaClient(model, options=options)
+    return client
 
 
 # Initialize the client
-llm_client = create_llm_client(llm_type, model, key)
+llm_preset = os.getenv("LLM_PRESET", "compact" if command_format == "compact" else "command")
+# Comma separated, e.g. "http://gpu1:11434,openai+http://gpu2:8080/v1"
+llm_hosts = host_pool.parse_hosts(os.getenv("OLLAMA_HOSTS", ""))
+
+
+def parse_providers(value: str) -> list[tuple[str, str, str | None]]:
+    """
+    Split a comma separated list of llm_type:model[@preset], e.g. ollama:llama3.2,chatgpt:gpt-5-mini@default.
+
+    The preset is None when an entry does not name one.
+    """
+    providers = []
+    for entry in value.split(","):
+        if entry.strip():
+            provider_type, _, provider_model = entry.strip().partition(":")
+            provider_model, _, preset = provider_model.partition("@")
+            if not provider_model:
+                raise ValueError(f"Invalid LLM_FALLBACKS entry: {entry}. Expected llm_type:model[@preset]")
+            providers.append((provider_type, provider_model, preset or None))
+    return providers
+
+
+retry_metrics = retry.RetryMetrics()
+# LLM_PRESET applies to the main provider and to fallbacks that do not name their own preset
+llm_providers = [(llm_type or "ollama", model, None)] + parse_providers(os.getenv("LLM_FALLBACKS", ""))
+# Comma separated models of the main provider from small to large, e.g. "llama3.2:1b,llama3.1:8b"
+model_tiers = [tier.strip() for tier in os.getenv("MODEL_TIERS", "").split(",") if tier.strip()]
+llm_client = FailoverClient(
+    [
+        (f"{provider_type}:{provider_model}",
+         create_llm_client(provider_type, provider_model, key, decoding_options(preset or llm_preset), llm_hosts,
+                           model_tiers if position == 0 else None))
+        for position, (provider_type, provider_model, preset) in enumerate(llm_providers)
+    ],
+    {
+        "error_rate": float(os.getenv("BREAKER_ERROR_RATE", "0.5")),
+        "min_requests": int(os.getenv("BREAKER_MIN_REQUESTS", "5")),
+        "window": int(os.getenv("BREAKER_WINDOW", "20")),
+        "slow_seconds": float(os.getenv("BREAKER_SLOW_SECONDS", "10")),
+        "open_seconds": float(os.getenv("BREAKER_OPEN_SECONDS", "30")),
+    },
+    retry.RetryPolicy(
+        max_attempts=int(os.getenv("LLM_RETRY_ATTEMPTS", "3")),
+        base_delay=float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.25")),
+        max_delay=float(os.getenv("LLM_RETRY_MAX_SECONDS", "4")),
+        budget_seconds=float(os.getenv("LLM_RETRY_BUDGET_SECONDS", "10")),
+    ),
+    slo.slo_controller,
+    first_token_seconds=float(os.getenv("BREAKER_SLOW_SECONDS", "10")),
+)
+
+
+def walk_clients(client: LLMClient):
+    """A client and every client it wraps"""
+    yield client
+    if isinstance(client, FailoverClient):
+        children = [child for _, child, _ in client.providers]
+    elif isinstance(client, TieredClient):
+        children = [child for _, child in client.tiers]
+    else:
+        children = []
+    for child in children:
+        yield from walk_clients(child)
+
+
+def status() -> dict:
+    """Provider health and prompt metrics for the /llm/status endpoint"""
+    clients = list(walk_clients(llm_client))
+    return {
+        "providers": llm_client.snapshot(),
+        "hosts": [
+            host
+            for pool in dict.fromkeys(client.pool for client in clients if isinstance(client, PooledClient))
+            for host in pool.snapshot()
+        ],
+        "prompt": prompts.prompt_metrics.snapshot(),
+        "format_guard": format_guard.guard_metrics.snapshot(),
+        "retries": retry_metrics.snapshot(),
+        "model_tiers": model_router.tier_metrics.snapshot(),
+        "slo": slo.slo_controller.snapshot(),
+    }
+
+
+def build_messages(messages: list[dict]) -> list[dict]:
+    """Return the provider request for a conversation according to PROMPT_MODE and COMMAND_FORMAT"""
+    compact = command_format == "compact"
+    if compact:
+        messages = command_codec.compact_history(messages)
+    if prompt_mode == "static":
+        return prompts.assemble_messages(prompts.COMPACT_PROMPT if compact else SYSTEM_PROMPT, messages, [])
+    user_messages = [m["content"] for m in messages if m.get("role") == "user"]
+    examples = prompts.build_examples(user_messages[-1] if user_messages else "", prompt_examples, compact)
+    prefix = prompts.COMPACT_PROMPT if compact else prompts.CORE_PROMPT
+    return prompts.assemble_messages(prefix, messages, [examples] if examples else [])
+
+
+def strict_request(request: list[dict]) -> list[dict]:
+    """The same request with a reminder of the answer format right before the last user message"""
+    reminder = prompts.STRICT_COMPACT_REMINDER if command_format == "compact" else prompts.STRICT_REMINDER
+    return prompts.assemble_messages(request[0]["content"], request[1:], [reminder])
+
+
+async def guarded_stream(request: list[dict]):
+    """
+    Stream an answer through the format guard.
+
+    An answer that starts off-format is cancelled after a few characters and, in
+    "retry" mode, asked for once more with a stricter prompt; when that fails too
+    the empty command list is returned instead.
+    """
+    compact = command_format == "compact"
+    attempts = 2 if format_guard_mode == "retry" else 1
+    for attempt in range(attempts):
+        started = time.monotonic()
+        format_guard.guard_metrics.record_check()
+        try:
+            async for chunk in format_guard.check(llm_client.stream_chat(request), compact, format_guard_chars):
+                yield chunk
+            return
+        except format_guard.OffFormatError as e:
+            retrying = attempt + 1 < attempts
+            format_guard.guard_metrics.record_abort(e.text, time.monotonic() - started, retrying)
+        request = strict_request(request)
+    format_guard.guard_metrics.record_fallback()
+    yield "-" if compact else "[]"
 
 
 # Main function - now much simpler!
 async def get_response(messages: list[dict]):
     """Get streaming response from the LLM"""
-    # Add system prompt at the beginning
-    messages.insert(0, {"role": "system", "content": SYSTEM_PROMPT})
+    # The system prompt is a stable prefix; the caller's list is left untouched
+    request = build_messages(messages)
+    print(f"Prompt {prompts.prefix_key(request[0]['content'])}: {prompts.prompt_metrics.record(request)}")
     
     try:
-        async for chunk in llm_client.stream_chat(messages):
+        stream = guarded_stream(request) if format_guard_mode != "off" else llm_client.stream_chat(request)
+        if command_format == "compact":
+            # Callers always receive the JSON command array
+            stream = command_codec.compact_to_json(stream)
+        async for chunk in stream:
             print(f"Chunk: {chunk}")
             yield chunk
     except Exception as e:
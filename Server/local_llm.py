@@ -0,0 +1,245 @@
+"""
+In-process CPU inference of a GGUF model through llama.cpp (llama-cpp-python)
+
+Each worker process loads the model once and runs one generation at a time,
+streaming tokens back over a pipe, so inference never holds the GIL or the
+event loop of the API process. Workers keep a RAM cache of prompt KV states:
+requests start with the same system prompt, so its evaluation is reused.
+"""
+import asyncio
+import importlib.util
+import multiprocessing
+import threading
+
+
+def available() -> bool:
+    """Whether llama-cpp-python is installed"""
+    return importlib.util.find_spec("llama_cpp") is not None
+
+
+def load_model(settings: dict):
+    """Load the model in a worker process"""
+    import llama_cpp
+
+    model = llama_cpp.Llama(
+        model_path=settings["model_path"],
+        n_ctx=settings["n_ctx"],
+        n_threads=settings["n_threads"],
+        verbose=False,
+    )
+    if settings.get("cache_bytes"):
+        model.set_cache(llama_cpp.LlamaRAMCache(capacity_bytes=settings["cache_bytes"]))
+    return model
+
+
+def serve(conn, model):
+    """
+    Answer ("chat", messages, options) requests from a pipe until it is closed.
+
+    Sends ("token", text) per chunk, then ("done", None) or ("error", message).
+    A ("cancel",) received while generating stops the generation early.
+    """
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request[0] != "chat":
+            # A cancel that arrived after its generation had already finished
+            continue
+        _, messages, options = request
+        try:
+            for chunk in model.create_chat_completion(messages=messages, stream=True, **options):
+                if conn.poll() and conn.recv()[0] == "cancel":
+                    break
+                text = chunk["choices"][0]["delta"].get("content")
+                if text:
+                    conn.send(("token", text))
+        except Exception as e:
+            conn.send(("error", str(e)))
+        else:
+            conn.send(("done", None))
+
+
+def _worker_main(conn, settings: dict):
+    try:
+        model = load_model(settings)
+    except Exception as e:
+        conn.send(("error", f"Could not load {settings['model_path']}: {e}"))
+        return
+    conn.send(("ready", None))
+    serve(conn, model)
+
+
+class Channel:
+    """
+    Our end of a worker's pipe.
+
+    A thread reads the pipe and hands each message to the event loop, which
+    works on every event loop (add_reader is not available on the Windows
+    proactor loop, and pipe handles there are not sockets anyway). The thread
+    also closes the pipe once the worker is gone, so its handle is never
+    closed (and reused) under a read in progress.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._loop = asyncio.get_running_loop()
+        self._messages = asyncio.Queue()
+        self._closed = False
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        while not self._closed:
+            try:
+                message = self.conn.recv()
+            except (EOFError, OSError) as e:
+                message = e
+            try:
+                self._loop.call_soon_threadsafe(self._messages.put_nowait, message)
+            except RuntimeError:  # the event loop is closed
+                break
+            if isinstance(message, Exception):
+                break
+        self.conn.close()
+
+    async def recv(self):
+        """The next message; raises EOFError / OSError once the worker is gone"""
+        message = await self._messages.get()
+        if isinstance(message, Exception):
+            self._messages.put_nowait(message)
+            raise message
+        return message
+
+    def send(self, message):
+        self.conn.send(message)
+
+    def close(self):
+        """Stop using the worker; its pipe is closed when the worker exits"""
+        self._closed = True
+
+
+class WorkerPool:
+    """Worker processes running the model, started on first use"""
+
+    def __init__(self, settings: dict, workers: int = 1):
+        self.settings = settings
+        self.workers = workers
+        self._idle = None
+        self._starting = None
+        self._processes = []
+
+    def _start_worker(self):
+        """Start one worker process and return our end of its pipe"""
+        context = multiprocessing.get_context("spawn")
+        conn, child = context.Pipe()
+        process = context.Process(target=_worker_main, args=(child, self.settings), daemon=True)
+        process.start()
+        child.close()
+        self._processes = [process for process in self._processes if process.is_alive()] + [process]
+        return conn
+
+    async def _spawn(self):
+        """Start a worker and wait until its model is loaded"""
+        conn = Channel(self._start_worker())
+        try:
+            kind, detail = await conn.recv()
+        except (EOFError, OSError) as e:
+            kind, detail = "error", f"worker exited while loading the model: {e!r}"
+        if kind != "ready":
+            conn.close()
+            raise RuntimeError(detail)
+        return conn
+
+    async def _start(self):
+        idle = asyncio.Queue()
+        try:
+            for _ in range(self.workers):
+                idle.put_nowait(await self._spawn())
+        except BaseException:
+            # Do not leave the workers that did load running without a pool to use them
+            while not idle.empty():
+                idle.get_nowait().close()
+            for process in self._processes:
+                process.terminate()
+            self._processes = []
+            raise
+        print(f"Started {self.workers} llama.cpp worker(s) for {self.settings['model_path']}")
+        self._idle = idle
+
+    async def _respawn(self):
+        """
+        Put a fresh worker in place of one that died.
+
+        If it cannot start, the error takes the worker's place in the queue so
+        the next request fails with it (and tries again) instead of waiting forever.
+        """
+        try:
+            conn = await self._spawn()
+        except Exception as e:
+            print(f"Could not restart a llama.cpp worker: {e}")
+            self._idle.put_nowait(e)
+            return
+        self._idle.put_nowait(conn)
+
+    def _replace(self, conn):
+        """Drop the pipe of a worker that died (OOM, crash) and start another one"""
+        print("A llama.cpp worker died, starting a new one")
+        conn.close()
+        asyncio.ensure_future(self._respawn())
+
+    async def _drain(self, conn):
+        """Wait for a cancelled generation to end, then hand the worker back"""
+        try:
+            while (await conn.recv())[0] == "token":
+                pass
+        except (EOFError, OSError):
+            self._replace(conn)
+            return
+        self._idle.put_nowait(conn)
+
+    async def generate(self, messages: list[dict], options: dict):
+        """Stream the tokens of one chat completion from an idle worker"""
+        if self._idle is None:
+            if self._starting is None:
+                self._starting = asyncio.ensure_future(self._start())
+            starting = self._starting
+            try:
+                await asyncio.shield(starting)
+            except Exception:
+                # The next request starts over instead of failing with this error forever
+                if self._starting is starting:
+                    self._starting = None
+                raise
+        conn = await self._idle.get()
+        if isinstance(conn, Exception):
+            asyncio.ensure_future(self._respawn())
+            raise RuntimeError(f"llama.cpp worker unavailable: {conn}")
+        finished = False
+        died = False
+        try:
+            conn.send(("chat", messages, options))
+            while True:
+                kind, payload = await conn.recv()
+                if kind == "token":
+                    yield payload
+                    continue
+                finished = True
+                if kind == "error":
+                    raise RuntimeError(payload)
+                return
+        except (EOFError, OSError) as e:
+            died = True
+            raise RuntimeError(f"llama.cpp worker died: {e!r}") from e
+        finally:
+            if died:
+                self._replace(conn)
+            elif finished:
+                self._idle.put_nowait(conn)
+            else:
+                try:
+                    conn.send(("cancel",))
+                except OSError:
+                    self._replace(conn)
+                else:
+                    asyncio.ensure_future(self._drain(conn))
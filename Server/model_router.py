@@ -0,0 +1,88 @@
+"""
+Complexity-based routing between a small fast model and larger ones
+
+Short, simple utterances go to the first (smallest) tier. Long utterances and
+ones the intent classifier labels complex or is unsure about go straight to the
+largest tier, and an answer of a smaller tier that is not a valid command list
+is escalated to the next tier.
+"""
+import json
+import threading
+from collections import Counter
+
+from command_codec import OPCODES, decode_line
+
+COMMANDS = set(OPCODES.values())
+
+
+def escalation_reason(text: str, max_words: int, classifier=None, min_confidence: float = 0.5) -> str | None:
+    """Why an utterance needs the largest model ("length", "complex", "uncertain"), or None"""
+    if len(text.split()) > max_words:
+        return "length"
+    if classifier is not None:
+        intent, confidence = classifier.predict(text)
+        if intent == "complex":
+            return "complex"
+        if confidence < min_confidence:
+            return "uncertain"
+    return None
+
+
+def is_valid_output(text: str) -> bool:
+    """Whether an answer is a command list, as a JSON array or compact lines"""
+    text = text.replace("```json", "").replace("```", "").strip()
+    if text.startswith("["):
+        try:
+            commands = json.loads(text)
+        except json.JSONDecodeError:
+            return False
+        return isinstance(commands, list) and all(
+            isinstance(command, dict) and command.get("command") in COMMANDS and command.get("value")
+            for command in commands
+        )
+    lines = [line for line in text.splitlines() if line.strip()]
+    if lines == ["-"]:
+        return True
+    return bool(lines) and all(decode_line(line) for line in lines)
+
+
+class TierMetrics:
+    """Per-tier request counts, latency and escalations"""
+
+    def __init__(self):
+        self._tiers = {}
+        self.routed = Counter()
+        self._lock = threading.Lock()
+
+    def _tier(self, name: str) -> dict:
+        return self._tiers.setdefault(name, {"requests": 0, "seconds": 0.0, "escalations": 0})
+
+    def record_route(self, reason: str):
+        """Count an utterance sent straight to the largest tier"""
+        with self._lock:
+            self.routed[reason] += 1
+
+    def record(self, name: str, seconds: float, escalated: bool = False):
+        """Record one answer of a tier, and whether it had to be escalated"""
+        with self._lock:
+            tier = self._tier(name)
+            tier["requests"] += 1
+            tier["seconds"] += seconds
+            tier["escalations"] += int(escalated)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "tiers": {
+                    name: {
+                        "requests": tier["requests"],
+                        "avg_seconds": tier["seconds"] / tier["requests"] if tier["requests"] else 0.0,
+                        "escalation_rate": tier["escalations"] / tier["requests"] if tier["requests"] else 0.0,
+                    }
+                    for name, tier in self._tiers.items()
+                },
+                "routed": dict(self.routed),
+            }
+
+
+tier_metrics = TierMetrics()
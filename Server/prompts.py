@@ -0,0 +1,195 @@
+"""
+Prompt assembly: a stable system prefix plus few-shot examples picked per utterance
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+from command_codec import encode_compact
+
+# Bump whenever CORE_PROMPT or the message layout changes so cache metrics are comparable
+PROMPT_VERSION = 2
+
+CORE_PROMPT = """You turn requests about a grocery list into commands for the grocery list software.
+Commands: AddItem, RemoveItem, CheckItem, UncheckItem.
+Answer only with a JSON array like [{"command": "AddItem", "value": "Milk"}], one object per item, no other text.
+Checking / concluding an item is CheckItem, unchecking / unconcluding is UncheckItem.
+If the request is not a grocery list command, answer [].
+"""
+
+# Variant for COMMAND_FORMAT=compact; decoded by command_codec
+COMPACT_PROMPT = """You turn requests about a grocery list into commands for the grocery list software.
+Answer with one line per item: an opcode, a space and the item name, no other text.
+Opcodes: A add, R remove, C check (concluded / bought), U uncheck (unconcluded).
+If the request is not a grocery list command, answer -
+"""
+
+# Sent with the retry of an answer the format guard aborted
+STRICT_REMINDER = "Answer with the JSON command array only. The first character of the answer must be [. Answer [] if there is nothing to do."
+STRICT_COMPACT_REMINDER = "Answer with command lines only, each one an opcode (A, R, C or U), a space and the item. Answer - if there is nothing to do."
+
+EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_examples.jsonl")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase words of a text"""
+    return re.findall(r"\w+", text.lower())
+
+
+class ExampleBank:
+    """
+    Inverted index over example utterances and the commands they map to.
+
+    Only the phrasing of an example is indexed, not the item names in its
+    command values, so "add milk" matches other AddItem phrasings rather than
+    any example mentioning milk. Examples are scored by the IDF of the shared
+    words over the square root of their length, restricted to the utterance's
+    language, and at most two are taken per intent.
+    """
+
+    def __init__(self, examples: list[dict]):
+        self.examples = [example for example in examples if "commands" in example]
+        self._index = defaultdict(set)
+        self._lengths = []
+        self._language_words = defaultdict(Counter)
+        for position, example in enumerate(self.examples):
+            values = {word for command in example["commands"] for word in tokenize(str(command.get("value", "")))}
+            words = set(tokenize(example["text"]))
+            phrasing = words - values
+            for word in phrasing:
+                self._index[word].add(position)
+            self._lengths.append(math.sqrt(len(phrasing) or 1))
+            for word in words:
+                self._language_words[example.get("lang", "en")][word] += 1
+        self._idf = {
+            word: math.log(1 + len(self.examples) / len(positions))
+            for word, positions in self._index.items()
+        }
+
+    @classmethod
+    def load(cls, path: str = EXAMPLES_PATH):
+        """Read examples from a JSON lines file"""
+        with open(path, encoding="utf-8") as file:
+            return cls([json.loads(line) for line in file if line.strip()])
+
+    def detect_language(self, words: list[str]) -> str:
+        """Pick the language whose examples share the most words with the utterance"""
+        scores = {
+            language: sum(1 for word in words if word in counts)
+            for language, counts in self._language_words.items()
+        }
+        return max(scores, key=lambda language: (scores[language], language == "en"), default="en")
+
+    def select(self, text: str, k: int = 3) -> list[dict]:
+        """Return the k examples most relevant to an utterance"""
+        words = tokenize(text)
+        language = self.detect_language(words)
+        scores = Counter()
+        for word in set(words):
+            for position in self._index.get(word, ()):
+                scores[position] += self._idf[word]
+
+        selected, per_intent = [], Counter()
+        ranked = sorted(scores, key=lambda position: (-scores[position] / self._lengths[position], position))
+        for position in ranked:
+            example = self.examples[position]
+            if example.get("lang", "en") != language or per_intent[example["intent"]] >= 2:
+                continue
+            selected.append(example)
+            per_intent[example["intent"]] += 1
+            if len(selected) == k:
+                break
+        return selected
+
+
+def format_examples(examples: list[dict], compact: bool = False) -> str:
+    """Render examples as request/answer pairs in the JSON or compact format"""
+    return "\n".join(
+        f"Request: {example['text']}\nAnswer:"
+        + (f"\n{encode_compact(example['commands'])}" if compact
+           else f" {json.dumps(example['commands'], ensure_ascii=False)}")
+        for example in examples
+    )
+
+
+def build_examples(text: str, k: int = 3, compact: bool = False) -> str | None:
+    """The k examples closest to the utterance, or None when nothing is relevant"""
+    examples = example_bank.select(text, k) if example_bank else []
+    if not examples:
+        return None
+    return f"Examples:\n{format_examples(examples, compact)}\n"
+
+
+def prefix_key(prefix: str) -> str:
+    """Short id of a prompt prefix, used as the provider cache key and in logs"""
+    return f"grocery-v{PROMPT_VERSION}-{hashlib.sha256(prefix.encode('utf-8')).hexdigest()[:12]}"
+
+
+def assemble_messages(prefix: str, messages: list[dict], volatile: list[str]) -> list[dict]:
+    """
+    Lay out a request so that consecutive turns share the longest possible prefix.
+
+    The static system prompt comes first and the conversation follows unchanged;
+    per-turn blocks (examples, list state) go right before the last user message,
+    so they never shift the bytes of earlier turns. The caller's list is not modified.
+    """
+    request = [{"role": "system", "content": prefix}, *messages]
+    blocks = [{"role": "system", "content": block} for block in volatile]
+    positions = [i for i, message in enumerate(request) if message.get("role") == "user"]
+    if not positions:
+        return request + blocks
+    return request[:positions[-1]] + blocks + request[positions[-1]:]
+
+
+class PromptMetrics:
+    """Running totals of prompt sizes sent to the LLM and of token usage reported back"""
+
+    def __init__(self):
+        self.requests = 0
+        self.system_chars = 0
+        self.total_chars = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, messages: list[dict]) -> dict:
+        """Record the size of one request and return it"""
+        system_chars = sum(len(m["content"]) for m in messages if m.get("role") == "system")
+        total_chars = sum(len(m.get("content") or "") for m in messages)
+        with self._lock:
+            self.requests += 1
+            self.system_chars += system_chars
+            self.total_chars += total_chars
+        # Roughly four characters per token for English and Portuguese text
+        return {"system_chars": system_chars, "total_chars": total_chars, "estimated_tokens": total_chars // 4}
+
+    def record_usage(self, prompt_tokens: int, cached_tokens: int | None, completion_tokens: int | None):
+        """Record the token counts a provider reported for one request"""
+        print(f"Token usage: prompt {prompt_tokens}, cached {cached_tokens}, completion {completion_tokens}")
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.cached_tokens += cached_tokens or 0
+            self.completion_tokens += completion_tokens or 0
+
+    def snapshot(self) -> dict:
+        """Return the average prompt size and the share of prompt tokens served from cache"""
+        with self._lock:
+            requests = self.requests or 1
+            return {
+                "requests": self.requests,
+                "avg_system_chars": self.system_chars / requests,
+                "avg_total_chars": self.total_chars / requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_ratio": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+            }
+
+
+example_bank = ExampleBank.load(os.getenv("PROMPT_EXAMPLES", EXAMPLES_PATH))
+prompt_metrics = PromptMetrics()
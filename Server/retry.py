@@ -0,0 +1,120 @@
+"""
+Retries of transient provider errors that happen before the first token
+
+Rate limits (429), server errors (5xx) and dropped connections are retried
+with exponential backoff and full jitter, or after the provider's Retry-After,
+as long as the request's retry budget allows it. Once a token has been
+streamed an error is raised as is, since the caller has already seen output.
+"""
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import httpx
+import openai
+
+TRANSIENT_STATUS = {408, 409, 425, 429}
+
+
+def is_transient(error: Exception) -> bool:
+    """Whether an error is worth retrying: rate limits, 5xx and connection failures"""
+    if isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError, openai.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status in TRANSIENT_STATUS or status >= 500)
+
+
+def retry_after(error: Exception) -> float | None:
+    """Seconds the provider asked us to wait in a Retry-After header, if any"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """How often and how long to retry one request"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.25, max_delay: float = 4.0,
+                 budget_seconds: float = 10.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_seconds = budget_seconds
+
+    def delay(self, retry: int, error: Exception) -> float:
+        """Wait before the given retry (1 for the first): Retry-After, else full jitter backoff"""
+        requested = retry_after(error)
+        if requested is not None:
+            return requested
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))
+
+
+class RetryMetrics:
+    """Counts of retried requests and of the ones that recovered or ran out of retries"""
+
+    def __init__(self):
+        self.retries = 0
+        self.recovered = 0
+        self.exhausted = 0
+        self.retry_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_retry(self, error: Exception, delay: float):
+        print(f"Retrying in {delay:.2f}s after: {error}")
+        with self._lock:
+            self.retries += 1
+            self.retry_seconds += delay
+
+    def record_recovered(self):
+        with self._lock:
+            self.recovered += 1
+
+    def record_exhausted(self, error: Exception):
+        print(f"Giving up after retries: {error}")
+        with self._lock:
+            self.exhausted += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "retries": self.retries,
+                "recovered": self.recovered,
+                "exhausted": self.exhausted,
+                "retry_seconds": self.retry_seconds,
+            }
+
+
+async def stream_with_retry(stream_chat, messages: list[dict], policy: RetryPolicy, metrics: RetryMetrics):
+    """Stream stream_chat(messages), retrying transient errors raised before the first chunk"""
+    started = time.monotonic()
+    retry = 0
+    while True:
+        streaming = False
+        try:
+            async for chunk in stream_chat(messages):
+                streaming = True
+                yield chunk
+            if retry:
+                metrics.record_recovered()
+            return
+        except Exception as e:
+            if streaming or not is_transient(e):
+                raise
+            retry += 1
+            delay = policy.delay(retry, e)
+            if retry >= policy.max_attempts or time.monotonic() - started + delay > policy.budget_seconds:
+                metrics.record_exhausted(e)
+                raise
+            metrics.record_retry(e, delay)
+        await asyncio.sleep(delay)
@@ -0,0 +1,49 @@
+"""
+Fast encoders for item list responses
+"""
+from datetime import datetime
+import orjson
+
+try:
+    import msgpack
+except ImportError:  # Optional: enables application/x-msgpack responses
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+MSGPACK_ACCEPT_TYPES = (MSGPACK_MEDIA_TYPE, "application/msgpack", "application/vnd.msgpack")
+
+
+def negotiate_media_type(accept: str | None) -> str:
+    """Use MessagePack only when the client asks for it and the encoder is installed"""
+    if msgpack is not None and accept:
+        if any(media_type in accept for media_type in MSGPACK_ACCEPT_TYPES):
+            return MSGPACK_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+def rows_to_items(rows) -> list[dict]:
+    """Map rows selected with ITEM_COLUMNS to the public item shape without ORM objects"""
+    return [
+        {
+            "id": item_id,
+            "description": description,
+            "checked": checked,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+        for item_id, description, checked, created_at, updated_at in rows
+    ]
+
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def encode_items(items: list[dict], media_type: str = JSON_MEDIA_TYPE) -> bytes:
+    """Encode items, datetimes included, straight to response bytes"""
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return msgpack.packb(items, default=_msgpack_default)
+    return orjson.dumps(items)
@@ -0,0 +1,135 @@
+"""
+SLO-driven degradation of the chat pipeline while LLM providers struggle
+
+Each provider's time to first token and errors are tracked over a rolling
+time window. While no provider meets the SLO (p95 time to first token and
+error rate), the service degrades one step at a time:
+
+  normal          everything goes to the LLM as usual
+  cache_first     the fast-path parser and intent cache answer whatever they can
+  fast_path_only  only messages the intent classifier calls complex reach the LLM
+  shed            nothing reaches the LLM; other chat is rejected
+
+It steps back down once a provider has been comfortably within the SLO
+(recover_ratio of each threshold) for recover_seconds.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+
+MODES = ("normal", "cache_first", "fast_path_only", "shed")
+NORMAL, CACHE_FIRST, FAST_PATH_ONLY, SHED = MODES
+SHED_MESSAGE = 'The assistant is overloaded right now. Simple commands like "add milk" still work.'
+
+
+def percentile(values: list[float], share: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+class SLOController:
+    """Rolling per-provider latency and error tracking that sets the degradation mode"""
+
+    def __init__(self, ttft_p95_seconds: float = 3.0, error_rate: float = 0.2, window_seconds: float = 60.0,
+                 min_samples: int = 5, step_seconds: float = 10.0, recover_seconds: float = 30.0,
+                 recover_ratio: float = 0.5):
+        self.ttft_p95_seconds = ttft_p95_seconds
+        self.error_rate = error_rate
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.step_seconds = step_seconds
+        self.recover_seconds = recover_seconds
+        self.recover_ratio = recover_ratio
+        self.level = 0
+        self.changed_at = float("-inf")
+        self.healthy_since = None
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    @property
+    def mode(self) -> str:
+        return MODES[self.level]
+
+    def _prune(self, now: float):
+        for samples in self._samples.values():
+            while samples and samples[0][0] < now - self.window_seconds:
+                samples.popleft()
+
+    def _stats(self, samples) -> dict | None:
+        if len(samples) < self.min_samples:
+            return None
+        return {
+            "p95_ttft_seconds": percentile([seconds for _, seconds, ok in samples if ok] or [0.0], 0.95),
+            "error_rate": sum(not ok for _, _, ok in samples) / len(samples),
+            "samples": len(samples),
+        }
+
+    def _within(self, stats: dict | None, ratio: float) -> bool:
+        """A provider without enough recent samples counts as healthy so the service can probe it again"""
+        return stats is None or (
+            stats["p95_ttft_seconds"] <= self.ttft_p95_seconds * ratio
+            and stats["error_rate"] <= self.error_rate * ratio
+        )
+
+    def _set_level(self, level: int, now: float):
+        print(f"Degradation mode: {self.mode} -> {MODES[level]}")
+        self.level = level
+        self.changed_at = now
+        self.healthy_since = None
+
+    def record(self, provider: str, ok: bool, seconds: float):
+        """Record one LLM call: whether it succeeded and its time to first token"""
+        with self._lock:
+            self._samples.setdefault(provider, deque()).append((time.monotonic(), seconds, ok))
+        self.evaluate()
+
+    def evaluate(self) -> str:
+        """Step the mode up or down according to the current provider statistics"""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            stats = [self._stats(samples) for samples in self._samples.values()] or [None]
+            if not any(self._within(provider, 1.0) for provider in stats):
+                self.healthy_since = None
+                if self.level < len(MODES) - 1 and now - self.changed_at >= self.step_seconds:
+                    self._set_level(self.level + 1, now)
+            elif self.level and any(self._within(provider, self.recover_ratio) for provider in stats):
+                if self.healthy_since is None:
+                    self.healthy_since = now
+                elif now - self.healthy_since >= self.recover_seconds:
+                    self._set_level(self.level - 1, now)
+            else:
+                self.healthy_since = None
+            return self.mode
+
+    def snapshot(self) -> dict:
+        self.evaluate()
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "providers": {provider: self._stats(samples) for provider, samples in self._samples.items()},
+            }
+
+
+def llm_allowed(mode: str, intent: str | None) -> bool:
+    """Whether a message that the fast path could not answer may go to the LLM in a mode"""
+    if mode == SHED:
+        return False
+    if mode == FAST_PATH_ONLY:
+        # Without a classifier nothing is recognized, so everything is treated as complex
+        return intent in (None, "complex")
+    return True
+
+
+slo_controller = SLOController(
+    ttft_p95_seconds=float(os.getenv("SLO_TTFT_P95_SECONDS", "3")),
+    error_rate=float(os.getenv("SLO_ERROR_RATE", "0.2")),
+    window_seconds=float(os.getenv("SLO_WINDOW_SECONDS", "60")),
+    min_samples=int(os.getenv("SLO_MIN_SAMPLES", "5")),
+    step_seconds=float(os.getenv("SLO_STEP_SECONDS", "10")),
+    recover_seconds=float(os.getenv("SLO_RECOVER_SECONDS", "30")),
+    recover_ratio=float(os.getenv("SLO_RECOVER_RATIO", "0.5")),
+)
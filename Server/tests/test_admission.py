@@ -0,0 +1,123 @@
+"""
+Tests for the LLM admission queue and priority classes
+"""
+import asyncio
+import pytest
+from admission import AdmissionQueue, classify
+
+
+class TestClassify:
+    """Test deriving the priority class of a request"""
+
+    @pytest.mark.parametrize("kwargs, expected", [
+        ({"text": "add milk"}, "interactive"),
+        ({"text": "plan groceries for a week of vegetarian dinners for the whole family"}, "conversational"),
+        ({"text": "add milk", "history": True}, "conversational"),
+        ({"text": "add milk", "history": True, "voice": True}, "interactive"),
+        ({"text": "plan groceries for a week of vegetarian dinners for the whole family", "requested": "interactive"}, "interactive"),
+        ({"text": "add milk", "requested": "urgent"}, "interactive"),
+        ({"text": None}, "interactive"),
+    ])
+    def test_classify(self, kwargs, expected):
+        """Test the flag, endpoint and length rules"""
+        # Act & Assert
+        assert classify(**kwargs) == expected
+
+
+async def admit_order(queue: AdmissionQueue, priorities: list[str]) -> list[str]:
+    """Fill the queue's only slot, queue the given requests and return the order they are admitted in"""
+    order = []
+    await queue.acquire("conversational")
+
+    async def request(index, priority):
+        async with queue.slot(priority):
+            order.append(f"{priority[0]}{index}")
+
+    tasks = [asyncio.create_task(request(index, priority)) for index, priority in enumerate(priorities)]
+    await asyncio.sleep(0)
+    queue.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+class TestAdmissionQueue:
+    """Test limiting and ordering LLM calls"""
+
+    @pytest.mark.asyncio
+    async def test_unlimited_never_waits(self):
+        """Test that without a limit every request is admitted at once"""
+        # Arrange
+        queue = AdmissionQueue(0)
+
+        # Act
+        for _ in range(5):
+            await asyncio.wait_for(queue.acquire("conversational"), 1)
+
+        # Assert
+        assert queue.active == 5
+
+    @pytest.mark.asyncio
+    async def test_strict_priority(self):
+        """Test that interactive requests always go before conversational ones"""
+        # Arrange
+        queue = AdmissionQueue(1, "strict")
+
+        # Act
+        order = await admit_order(queue, ["conversational", "conversational", "interactive", "interactive"])
+
+        # Assert
+        assert order == ["i2", "i3", "c0", "c1"]
+
+    @pytest.mark.asyncio
+    async def test_weighted_does_not_starve(self):
+        """Test that weighted round robin favours interactive requests but still admits conversational ones"""
+        # Arrange
+        queue = AdmissionQueue(1, "weighted")
+
+        # Act
+        order = await admit_order(queue, ["conversational"] * 2 + ["interactive"] * 8)
+
+        # Assert
+        assert order[:5] == ["i2", "i3", "c0", "i4", "i5"]
+        assert order.index("c1") < len(order) - 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        """Test that a request cancelled while waiting does not hold a slot"""
+        # Arrange
+        queue = AdmissionQueue(1)
+        await queue.acquire("interactive")
+        waiter = asyncio.create_task(queue.acquire("conversational"))
+        await asyncio.sleep(0)
+
+        # Act
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        queue.release()
+
+        # Assert
+        assert queue.active == 0
+        assert queue.snapshot()["classes"]["conversational"]["waiting"] == 0
+        await asyncio.wait_for(queue.acquire("interactive"), 1)
+
+    @pytest.mark.asyncio
+    async def test_snapshot_reports_waits(self):
+        """Test per-class admission counts and wait percentiles"""
+        # Arrange
+        queue = AdmissionQueue(1)
+
+        # Act
+        async with queue.slot("interactive"):
+            pass
+        snapshot = queue.snapshot()
+
+        # Assert
+        assert snapshot["classes"]["interactive"]["admitted"] == 1
+        assert snapshot["classes"]["interactive"]["p99_wait_seconds"] < 0.1
+        assert snapshot["active"] == 0
+
+    def test_unknown_policy(self):
+        """Test that a misspelled policy fails at startup"""
+        # Act & Assert
+        with pytest.raises(ValueError):
+            AdmissionQueue(1, "fifo")
@@ -0,0 +1,243 @@
+"""
+Tests for change versions, tombstones and delta sync queries
+"""
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+from Models import (
+    Base, Item, ItemTombstone, GroceryList, DEFAULT_LIST_ID, allocate_versions, current_version, get_changes,
+)
+from Models import database
+
+
+class TestVersionStamping:
+    """Test that writes are stamped with increasing versions"""
+
+    def test_new_items_get_increasing_versions(self, db_session):
+        """Test that every inserted item gets its own version"""
+        # Arrange & Act
+        first = Item(description="Milk")
+        second = Item(description="Bread")
+        db_session.add_all([first, second])
+        db_session.commit()
+
+        # Assert
+        assert sorted([first.version, second.version]) == [1, 2]
+        assert current_version(db_session) == 2
+
+    def test_update_bumps_version(self, db_session):
+        """Test that modifying an item moves it to the next version"""
+        # Arrange
+        item = Item(description="Milk")
+        db_session.add(item)
+        db_session.commit()
+
+        # Act
+        item.checked = True
+        db_session.commit()
+
+        # Assert
+        assert item.version == 2
+
+    def test_unmodified_item_keeps_version(self, db_session):
+        """Test that flushing without changes does not bump the version"""
+        # Arrange
+        item = Item(description="Milk")
+        db_session.add(item)
+        db_session.commit()
+
+        # Act
+        item.checked = item.checked
+        db_session.commit()
+
+        # Assert
+        assert current_version(db_session) == 1
+
+    def test_delete_writes_tombstone(self, db_session):
+        """Test that deleting an item records a tombstone with the next version"""
+        # Arrange
+        item = Item(description="Milk")
+        db_session.add(item)
+        db_session.commit()
+        item_id = item.id
+
+        # Act
+        db_session.delete(item)
+        db_session.commit()
+
+        # Assert
+        tombstone = db_session.query(ItemTombstone).one()
+        assert tombstone.item_id == item_id
+        assert tombstone.version == 2
+        assert current_version(db_session) == 2
+
+    def test_allocate_versions_reserves_a_range(self, db_session):
+        """Test that the list counter hands out consecutive versions and never repeats one"""
+        # Act
+        first = allocate_versions(db_session, DEFAULT_LIST_ID)
+        last = allocate_versions(db_session, DEFAULT_LIST_ID, 3)
+
+        # Assert
+        assert (first, last) == (1, 4)
+        assert current_version(db_session) == 4
+
+    def test_write_to_missing_item_does_not_consume_a_version(self, client, db_session):
+        """Test that a write matching no row gives its reserved version back"""
+        # Arrange
+        client.post("/items", json={"description": "Milk"})
+
+        # Act
+        client.patch("/items/999/checked", json={"checked": True})
+        client.delete("/items/999")
+        created = client.post("/items", json={"description": "Bread"}).json()
+
+        # Assert
+        assert db_session.query(Item).filter(Item.id == created["id"]).one().version == 2
+
+    def test_empty_database_version_is_zero(self, db_session):
+        """Test the starting cursor"""
+        assert current_version(db_session) == 0
+
+
+class TestGetChanges:
+    """Test the delta sync query"""
+
+    def test_changes_since_version(self, db_session):
+        """Test that only rows written after the cursor are returned"""
+        # Arrange
+        old = Item(description="Old")
+        db_session.add(old)
+        db_session.commit()
+        cursor = current_version(db_session)
+        new = Item(description="New")
+        db_session.add(new)
+        db_session.commit()
+
+        # Act
+        changes = get_changes(db_session, DEFAULT_LIST_ID, cursor)
+
+        # Assert
+        assert [item["description"] for item in changes["items"]] == ["New"]
+        assert changes["deleted"] == []
+        assert changes["version"] == cursor + 1
+
+    def test_changes_include_deletions(self, db_session):
+        """Test that deletions after the cursor are reported as ids"""
+        # Arrange
+        item = Item(description="Milk")
+        db_session.add(item)
+        db_session.commit()
+        item_id = item.id
+        cursor = current_version(db_session)
+
+        # Act
+        db_session.delete(item)
+        db_session.commit()
+        changes = get_changes(db_session, DEFAULT_LIST_ID, cursor)
+
+        # Assert
+        assert changes["items"] == []
+        assert changes["deleted"] == [item_id]
+
+    def test_no_changes_at_current_version(self, db_session):
+        """Test that a client at the head gets an empty delta"""
+        # Arrange
+        db_session.add(Item(description="Milk"))
+        db_session.commit()
+
+        # Act
+        changes = get_changes(db_session, DEFAULT_LIST_ID, current_version(db_session))
+
+        # Assert
+        assert changes["items"] == []
+        assert changes["deleted"] == []
+
+    def test_changes_since_timestamp(self, db_session):
+        """Test that a timestamp cursor far in the past returns everything"""
+        # Arrange
+        db_session.add(Item(description="Milk"))
+        db_session.commit()
+
+        # Act
+        changes = get_changes(db_session, DEFAULT_LIST_ID, datetime(2000, 1, 1))
+
+        # Assert
+        assert len(changes["items"]) == 1
+
+    def test_changes_are_scoped_by_list(self, db_session):
+        """Test that each list has its own versions and deltas"""
+        # Arrange
+        other = GroceryList(name="Other")
+        db_session.add(other)
+        db_session.commit()
+        db_session.add_all([Item(description="Milk"), Item(description="Rice", list_id=other.id)])
+        db_session.commit()
+
+        # Act
+        changes = get_changes(db_session, other.id, 0)
+
+        # Assert
+        assert [item["description"] for item in changes["items"]] == ["Rice"]
+        assert changes["version"] == 1
+        assert current_version(db_session, DEFAULT_LIST_ID) == 1
+
+
+class TestUpgradeSchema:
+    """Test upgrading databases created by earlier releases"""
+
+    def test_seeds_counter_from_existing_versions(self, tmp_path, monkeypatch):
+        """Test that lists.version starts at the highest version written and household lists get a token"""
+        # Arrange
+        engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+        Base.metadata.create_all(bind=engine)
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE lists DROP COLUMN version"))
+            connection.execute(text("DROP INDEX ix_lists_token"))
+            connection.execute(text("ALTER TABLE lists DROP COLUMN token"))
+            connection.execute(text("INSERT INTO lists (id, name) VALUES (1, 'Default'), (2, 'Other')"))
+            connection.execute(text("INSERT INTO items (list_id, description, checked, version) VALUES (1, 'Milk', 0, 3)"))
+            connection.execute(text("INSERT INTO item_tombstones (list_id, item_id, version) VALUES (1, 7, 5)"))
+        monkeypatch.setattr(database, "engine", engine)
+
+        # Act
+        database.upgrade_schema()
+        database.upgrade_schema()
+
+        # Assert
+        with engine.connect() as connection:
+            versions = connection.execute(text("SELECT id, version FROM lists ORDER BY id")).all()
+            tokens = connection.execute(text("SELECT token FROM lists ORDER BY id")).scalars().all()
+        assert [tuple(row) for row in versions] == [(1, 5), (2, 0)]
+        assert tokens[0] is None and len(tokens[1]) >= 40
+        engine.dispose()
+
+    def test_upgrades_the_first_release_schema(self, tmp_path, monkeypatch):
+        """Test that items of a database from before lists and versions end up in the default list"""
+        # Arrange
+        engine = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+        with engine.begin() as connection:
+            connection.execute(text(
+                "CREATE TABLE items (id INTEGER PRIMARY KEY, description VARCHAR(255) NOT NULL, checked BOOLEAN NOT NULL, "
+                "created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL)"
+            ))
+            connection.execute(text("INSERT INTO items (description, checked) VALUES ('Milk', 0)"))
+        monkeypatch.setattr(database, "engine", engine)
+        monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=engine))
+
+        # Act
+        database.init_db()
+        with database.SessionLocal() as db:
+            db.add(Item(description="Bread"))
+            db.commit()
+            items = db.query(Item).order_by(Item.id).all()
+            counter = db.get(GroceryList, DEFAULT_LIST_ID).version
+        indexes = {index["name"] for index in inspect(engine).get_indexes("items")}
+
+        # Assert
+        assert [(item.description, item.list_id, item.version) for item in items] == [
+            ("Milk", DEFAULT_LIST_ID, 0), ("Bread", DEFAULT_LIST_ID, 1),
+        ]
+        assert counter == 1
+        assert {"ix_items_list_checked_id", "ix_items_list_version", "ix_items_list_updated_at"} <= indexes
+        engine.dispose()
@@ -1,10 +1,17 @@
 """
 Tests for the chat API endpoint with SSE streaming
 """
+import asyncio
 import pytest
 import json
 from unittest.mock import AsyncMock, patch, MagicMock
-from Models import Item
+from Models import Item, DEFAULT_LIST_ID
+from events import item_events
+import intents
+import api
+from admission import AdmissionQueue
+from slo import SHED_MESSAGE, SLOController
+from conversations import conversation_store
 
 
 class TestChatEndpoint:
@@ -414,6 +421,248 @@ class TestChatEndpoint:
             items = db_session.query(Item).all()
             assert len(items) == 0
 
+    @pytest.mark.asyncio
+    async def test_chat_commands_invalidate_items_cache(self, client, db_session):
+        """Test that items changed through chat are visible on the next GET /items"""
+        # Arrange - warm the cache
+        assert client.get("/items").json() == []
+        payload = {"message": "Add milk"}
+
+        async def mock_llm_response(messages):
+            yield '[{"command": "AddItem", "value": "Milk"}]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            # Act
+            client.post("/chat", json=payload)
+
+        # Assert
+        items = client.get("/items").json()
+        assert [item["description"] for item in items] == ["Milk"]
+
+    @pytest.mark.asyncio
+    async def test_chat_commands_publish_change_events(self, client, db_session):
+        """Test that voice and chat commands are pushed to change feed subscribers"""
+        # Arrange
+        item = Item(description="Bread", checked=False)
+        db_session.add(item)
+        db_session.commit()
+        payload = {"message": "Add milk and check bread"}
+
+        async def mock_llm_response(messages):
+            yield '[{"command": "AddItem", "value": "Milk"}, '
+            yield '{"command": "CheckItem", "value": "Bread"}]'
+
+        subscriber = item_events.subscribe(DEFAULT_LIST_ID)
+        try:
+            with patch('llm.get_response', side_effect=mock_llm_response):
+                # Act
+                client.post("/chat", json=payload)
+            created = await asyncio.wait_for(subscriber.get(), 1)
+            updated = await asyncio.wait_for(subscriber.get(), 1)
+
+            # Assert
+            assert created["type"] == "created"
+            assert created["item"]["description"] == "Milk"
+            assert updated["type"] == "updated"
+            assert updated["item"]["description"] == "Bread"
+            assert updated["item"]["checked"] == True
+        finally:
+            item_events.unsubscribe(subscriber)
+
+    @pytest.mark.asyncio
+    async def test_chat_returns_conversation_id(self, client):
+        """Test that a single message starts a server-side conversation"""
+        # Arrange
+        async def mock_llm_response(messages):
+            yield '[]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            # Act
+            response = client.post("/chat", json={"message": "Hello"})
+
+        # Assert
+        assert len(response.headers["x-conversation-id"]) == 32
+
+    @pytest.mark.asyncio
+    async def test_chat_builds_history_from_conversation_id(self, client):
+        """Test that follow-up turns only send the new message"""
+        # Arrange
+        received = []
+
+        async def mock_llm_response(messages):
+            received.append(list(messages))
+            yield '[{"command": "AddItem", "value": "Milk"}]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            first = client.post("/chat", json={"message": "Add milk"})
+            conversation_id = first.headers["x-conversation-id"]
+
+            # Act
+            second = client.post("/chat", json={"conversation_id": conversation_id, "message": "And bread"})
+
+        # Assert
+        assert second.headers["x-conversation-id"] == conversation_id
+        assert received[1] == [
+            {"role": "user", "content": "Add milk"},
+            {"role": "assistant", "content": '[{"command": "AddItem", "value": "Milk"}]'},
+            {"role": "user", "content": "And bread"},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_chat_reloads_persisted_conversation(self, client, monkeypatch):
+        """Test that a conversation no longer in memory is reloaded from the database"""
+        # Arrange
+        monkeypatch.setattr(conversation_store, "persist", True)
+        received = []
+
+        async def mock_llm_response(messages):
+            received.append(list(messages))
+            yield '[]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            first = client.post("/chat", json={"message": "Add milk"})
+            conversation_store.clear()
+
+            # Act
+            client.post("/chat", json={"conversation_id": first.headers["x-conversation-id"], "message": "And bread"})
+
+        # Assert
+        assert received[1] == [
+            {"role": "user", "content": "Add milk"},
+            {"role": "assistant", "content": "[]"},
+            {"role": "user", "content": "And bread"},
+        ]
+
+    def test_chat_rejects_invalid_conversation_id(self, client):
+        """Test that a conversation id that is not a short string is rejected"""
+        # Act
+        number = client.post("/chat", json={"conversation_id": 123, "message": "Add milk"})
+        long = client.post("/chat", json={"conversation_id": "x" * 65, "message": "Add milk"})
+
+        # Assert
+        assert number.status_code == 400
+        assert long.status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_chat_messages_array_has_no_conversation(self, client):
+        """Test that clients sending full history keep the stateless behaviour"""
+        # Arrange
+        async def mock_llm_response(messages):
+            yield '[]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            # Act
+            response = client.post("/chat", json={"messages": [{"role": "user", "content": "Hi"}]})
+
+        # Assert
+        assert "x-conversation-id" not in response.headers
+
+    @pytest.mark.asyncio
+    async def test_chat_out_of_scope_skips_llm(self, client, monkeypatch):
+        """Test that the intent router answers out-of-scope messages itself"""
+        # Arrange
+        classifier = MagicMock()
+        classifier.predict.return_value = ("out_of_scope", 0.95)
+        monkeypatch.setattr(intents, "intent_classifier", classifier)
+        llm_response = MagicMock()
+
+        with patch('llm.get_response', llm_response):
+            # Act
+            response = client.post("/chat", json={"message": "Tell me a joke"})
+
+        # Assert
+        assert response.text == "[]"
+        llm_response.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_chat_adds_list_context_before_last_message(self, client, db_session, monkeypatch):
+        """Test that the current items are sent to the LLM when enabled"""
+        # Arrange
+        monkeypatch.setattr(api, "LIST_CONTEXT_TOKENS", 100)
+        db_session.add(Item(description="Whole milk", checked=False))
+        db_session.commit()
+        received = []
+
+        async def mock_llm_response(messages):
+            received.append(messages)
+            yield '[]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            # Act
+            client.post("/chat", json={"message": "Check the milk"})
+
+        # Assert
+        assert received[0][0]["role"] == "system"
+        assert "- Whole milk" in received[0][0]["content"]
+        assert received[0][1] == {"role": "user", "content": "Check the milk"}
+
+    @pytest.mark.asyncio
+    async def test_chat_requests_are_admitted_by_priority_class(self, client, monkeypatch):
+        """Test that short messages are interactive and full histories or the priority flag conversational"""
+        # Arrange
+        queue = AdmissionQueue(1)
+        monkeypatch.setattr(api, "admission_queue", queue)
+
+        async def mock_llm_response(messages):
+            yield '[]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            # Act
+            client.post("/chat", json={"message": "Add milk"})
+            client.post("/chat", json={"messages": [{"role": "user", "content": "Add milk"}]})
+            client.post("/chat", json={"message": "Add milk", "priority": "conversational"})
+
+        # Assert
+        classes = queue.snapshot()["classes"]
+        assert classes["interactive"]["admitted"] == 1
+        assert classes["conversational"]["admitted"] == 2
+        assert queue.active == 0
+
+    @pytest.mark.asyncio
+    async def test_chat_shed_mode_keeps_simple_commands(self, client, db_session, monkeypatch):
+        """Test that while shedding, fast-path commands still run and the rest is rejected without the LLM"""
+        # Arrange
+        controller = SLOController()
+        controller.level = 3
+        monkeypatch.setattr(api, "slo_controller", controller)
+        llm_response = MagicMock()
+
+        with patch('llm.get_response', llm_response):
+            # Act
+            simple = client.post("/chat", json={"message": "Add milk"})
+            other = client.post("/chat", json={"message": "What should I cook tonight?"})
+
+        # Assert
+        assert json.loads(simple.text)[0]["command"] == "AddItem"
+        assert db_session.query(Item).count() == 1
+        assert other.text == f"Error: {SHED_MESSAGE}"
+        llm_response.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_chat_fast_path_only_mode_keeps_llm_for_complex(self, client, monkeypatch):
+        """Test that in fast_path_only mode only messages classified as complex reach the LLM"""
+        # Arrange
+        controller = SLOController()
+        controller.level = 2
+        monkeypatch.setattr(api, "slo_controller", controller)
+        classifier = MagicMock()
+        monkeypatch.setattr(intents, "intent_classifier", classifier)
+
+        async def mock_llm_response(messages):
+            yield '[]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response) as llm_response:
+            # Act
+            classifier.predict.return_value = ("add_items", 0.9)
+            simple = client.post("/chat", json={"message": "I need something for the pasta"})
+            classifier.predict.return_value = ("complex", 0.9)
+            complex_ = client.post("/chat", json={"message": "Plan dinners for the week"})
+
+        # Assert
+        assert simple.text == f"Error: {SHED_MESSAGE}"
+        assert complex_.text == "[]"
+        assert llm_response.call_count == 1
+
     @pytest.mark.asyncio
     async def test_chat_with_llm_exception(self, client, db_session):
         """Test chat endpoint handling LLM exception"""
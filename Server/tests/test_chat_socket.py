@@ -0,0 +1,271 @@
+"""
+Tests for the WebSocket chat transport
+"""
+import asyncio
+import pytest
+from unittest.mock import MagicMock, patch
+from starlette.websockets import WebSocketDisconnect
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from Models import Base, GroceryList, Item, get_session_factory
+from api import app
+
+
+def receive_until(websocket, frame_type):
+    """Collect frames until one of frame_type arrives"""
+    frames = []
+    while True:
+        frame = websocket.receive_json()
+        frames.append(frame)
+        if frame["type"] == frame_type:
+            return frames
+
+
+class TestChatSocket:
+    """Test the /ws/chat endpoint"""
+
+    def test_session_frame_on_connect(self, client):
+        """Test that the server announces the conversation of the session"""
+        # Act
+        with client.websocket_connect("/ws/chat?conversation_id=abc") as websocket:
+            frame = websocket.receive_json()
+
+        # Assert
+        assert frame == {"type": "session", "conversation_id": "abc", "version": 0}
+
+    def test_chat_streams_tokens_and_result(self, client, db_session):
+        """Test that an utterance streams tokens and reports executed commands"""
+        # Arrange
+        async def mock_llm_response(messages):
+            yield '[{"command": "AddItem", '
+            yield '"value": "Milk"}]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            with client.websocket_connect("/ws/chat") as websocket:
+                websocket.receive_json()
+
+                # Act
+                websocket.send_json({"type": "chat", "id": "r1", "message": "Add milk"})
+                frames = receive_until(websocket, "result")
+
+        # Assert
+        tokens = [frame["text"] for frame in frames if frame["type"] == "token"]
+        assert "".join(tokens) == '[{"command": "AddItem", "value": "Milk"}]'
+        result = frames[-1]
+        assert result["id"] == "r1"
+        assert result["commands"][0]["status"] == "ok"
+        assert result["commands"][0]["item"]["description"] == "Milk"
+        assert db_session.query(Item).one().description == "Milk"
+
+    def test_chat_without_streaming_sends_single_frame(self, client):
+        """Test that stream=false only sends the result frame"""
+        # Arrange
+        async def mock_llm_response(messages):
+            yield '[{"command": "RemoveItem", '
+            yield '"value": "Eggs"}]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            with client.websocket_connect("/ws/chat") as websocket:
+                websocket.receive_json()
+
+                # Act
+                websocket.send_json({"type": "chat", "id": "r1", "message": "Remove eggs", "stream": False})
+                frame = websocket.receive_json()
+
+        # Assert
+        assert frame["type"] == "result"
+        assert frame["commands"] == [{"command": "RemoveItem", "value": "Eggs", "status": "not_found"}]
+
+    def test_cancel_in_flight_utterance(self, client, db_session):
+        """Test that a cancelled utterance never executes its commands"""
+        # Arrange
+        async def mock_llm_response(messages):
+            yield '[{"command": "AddItem", '
+            await asyncio.sleep(10)
+            yield '"value": "Milk"}]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            with client.websocket_connect("/ws/chat") as websocket:
+                websocket.receive_json()
+                websocket.send_json({"type": "chat", "id": "r1", "message": "Add milk"})
+                websocket.receive_json()
+
+                # Act
+                websocket.send_json({"type": "cancel", "id": "r1"})
+                frame = websocket.receive_json()
+
+        # Assert
+        assert frame == {"type": "cancelled", "id": "r1"}
+        assert db_session.query(Item).count() == 0
+
+    def test_history_is_kept_per_session(self, client):
+        """Test that later utterances see the earlier turns of the session"""
+        # Arrange
+        received = []
+
+        async def mock_llm_response(messages):
+            received.append(list(messages))
+            yield '[]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            with client.websocket_connect("/ws/chat") as websocket:
+                websocket.receive_json()
+
+                # Act
+                websocket.send_json({"type": "chat", "id": "r1", "message": "Add milk", "stream": False})
+                websocket.receive_json()
+                websocket.send_json({"type": "chat", "id": "r2", "message": "And bread", "stream": False})
+                websocket.receive_json()
+
+        # Assert
+        assert received[1] == [
+            {"role": "user", "content": "Add milk"},
+            {"role": "assistant", "content": "[]"},
+            {"role": "user", "content": "And bread"},
+        ]
+
+    def test_final_matching_speculation_skips_llm(self, client, db_session):
+        """Test that a final transcript equal to the last partial commits instantly"""
+        # Arrange
+        llm_response = MagicMock()
+
+        with patch('llm.get_response', llm_response):
+            with client.websocket_connect("/ws/chat") as websocket:
+                websocket.receive_json()
+                websocket.send_json({"type": "partial", "id": "r1", "text": "add mi"})
+                websocket.receive_json()
+                websocket.send_json({"type": "partial", "id": "r1", "text": "add milk"})
+                speculation = websocket.receive_json()
+
+                # Act
+                websocket.send_json({"type": "chat", "id": "r1", "message": "Add milk."})
+                frames = receive_until(websocket, "result")
+
+        # Assert
+        assert speculation["type"] == "speculation"
+        assert speculation["commands"] == [{"command": "AddItem", "value": "Milk"}]
+        assert frames[-1]["speculative"] is True
+        assert db_session.query(Item).one().description == "Milk"
+        llm_response.assert_not_called()
+
+    def test_speculation_on_missing_item_uses_llm(self, client, db_session):
+        """Test that a speculation whose item was not found is left to the LLM"""
+        # Arrange
+        db_session.add(Item(description="Bread", checked=False))
+        db_session.commit()
+
+        async def mock_llm_response(messages):
+            yield '[{"command": "CheckItem", "value": "Bread"}]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response) as llm_response:
+            with client.websocket_connect("/ws/chat") as websocket:
+                websocket.receive_json()
+                websocket.send_json({"type": "partial", "id": "r1", "text": "check loaf"})
+                websocket.receive_json()
+
+                # Act
+                websocket.send_json({"type": "chat", "id": "r1", "message": "check loaf", "stream": False})
+                frames = receive_until(websocket, "result")
+
+        # Assert
+        assert "speculative" not in frames[-1]
+        assert frames[-1]["commands"][0]["status"] == "ok"
+        assert llm_response.call_count == 1
+
+    def test_final_differing_from_speculation_uses_llm(self, client, db_session):
+        """Test that a speculation is discarded when the transcript changes"""
+        # Arrange
+        async def mock_llm_response(messages):
+            yield '[{"command": "AddItem", "value": "Milkshake"}]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            with client.websocket_connect("/ws/chat") as websocket:
+                websocket.receive_json()
+                websocket.send_json({"type": "partial", "id": "r1", "text": "add milk"})
+                websocket.receive_json()
+
+                # Act
+                websocket.send_json({"type": "chat", "id": "r1", "message": "add milkshake mix", "stream": False})
+                frames = receive_until(websocket, "result")
+
+        # Assert
+        assert "speculative" not in frames[-1]
+        assert db_session.query(Item).one().description == "Milkshake"
+
+    def test_pushes_changes_from_other_clients(self, client):
+        """Test that list updates made elsewhere are sent to the session"""
+        # Arrange
+        with client.websocket_connect("/ws/chat") as websocket:
+            websocket.receive_json()
+
+            # Act
+            client.post("/items", json={"description": "Bread"})
+            frame = websocket.receive_json()
+
+        # Assert
+        assert frame["type"] == "change"
+        assert frame["event"] == "created"
+        assert frame["item"]["description"] == "Bread"
+
+    def test_idle_session_holds_no_database_connection(self, client, tmp_path):
+        """Test that open sockets return their pooled connections between frames"""
+        # Arrange
+        engine = create_engine(f"sqlite:///{tmp_path / 'socket.db'}")
+        Base.metadata.create_all(bind=engine)
+        sessions = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        with sessions() as session:
+            session.add(GroceryList(name="Default"))
+            session.commit()
+        app.dependency_overrides[get_session_factory] = lambda: sessions
+
+        async def mock_llm_response(messages):
+            yield '[{"command": "AddItem", "value": "Milk"}]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            with client.websocket_connect("/ws/chat") as first, client.websocket_connect("/ws/chat") as second:
+                first.receive_json()
+                second.receive_json()
+
+                # Act
+                first.send_json({"type": "partial", "id": "r1", "text": "Add mil"})
+                first.send_json({"type": "chat", "id": "r1", "message": "Add milk"})
+                receive_until(first, "result")
+
+                # Assert
+                assert engine.pool.checkedout() == 0
+        with sessions() as session:
+            assert session.query(Item).one().description == "Milk"
+        engine.dispose()
+
+    def test_unknown_frame_type(self, client):
+        """Test that unsupported frames are answered with an error"""
+        # Act
+        with client.websocket_connect("/ws/chat") as websocket:
+            websocket.receive_json()
+            websocket.send_json({"type": "ping", "id": "r1"})
+            frame = websocket.receive_json()
+
+        # Assert
+        assert frame["type"] == "error"
+        assert frame["id"] == "r1"
+
+    def test_list_token_required(self, client, db_session):
+        """Test that a household list only accepts sockets that send its token"""
+        # Arrange
+        grocery_list = GroceryList(name="Smiths", token="smiths-token")
+        db_session.add(grocery_list)
+        db_session.commit()
+
+        # Act & Assert
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect(f"/ws/chat?list_id={grocery_list.id}") as websocket:
+                websocket.receive_json()
+        with client.websocket_connect(f"/ws/chat?list_id={grocery_list.id}&token=smiths-token") as websocket:
+            assert websocket.receive_json()["type"] == "session"
+
+    def test_unknown_list_closes_socket(self, client):
+        """Test that an unknown list_id is rejected"""
+        # Act & Assert
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect("/ws/chat?list_id=999") as websocket:
+                websocket.receive_json()
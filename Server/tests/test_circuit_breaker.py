@@ -0,0 +1,102 @@
+"""
+Tests for the per-provider circuit breaker
+"""
+from unittest.mock import patch
+import circuit_breaker
+from circuit_breaker import CircuitBreaker
+
+
+def make_breaker(**kwargs):
+    options = {"error_rate": 0.5, "min_requests": 4, "window": 10, "slow_seconds": 5.0, "open_seconds": 30.0}
+    options.update(kwargs)
+    return CircuitBreaker("ollama:llama2", **options)
+
+
+class TestCircuitBreaker:
+    """Test the closed / open / half-open transitions"""
+
+    def test_stays_closed_below_min_requests(self):
+        """Test that a few failures do not open the breaker on their own"""
+        # Arrange
+        breaker = make_breaker()
+
+        # Act
+        for _ in range(3):
+            breaker.record(False, 0.1)
+
+        # Assert
+        assert breaker.state == "closed"
+        assert breaker.allow() is True
+
+    def test_opens_on_error_rate(self):
+        """Test that the breaker opens and refuses calls once the error rate is reached"""
+        # Arrange
+        breaker = make_breaker()
+
+        # Act
+        for ok in (True, False, True, False):
+            breaker.record(ok, 0.1)
+
+        # Assert
+        assert breaker.state == "open"
+        assert breaker.allow() is False
+
+    def test_slow_calls_count_as_failures(self):
+        """Test that calls slower than slow_seconds open the breaker"""
+        # Arrange
+        breaker = make_breaker()
+
+        # Act
+        for _ in range(4):
+            breaker.record(True, 6.0)
+
+        # Assert
+        assert breaker.state == "open"
+
+    def test_half_open_probe_closes(self):
+        """Test that after open_seconds one probe is allowed and its success closes the breaker"""
+        # Arrange
+        breaker = make_breaker()
+        for _ in range(4):
+            breaker.record(False, 0.1)
+
+        # Act
+        with patch.object(circuit_breaker.time, "monotonic", return_value=breaker.opened_at + 31):
+            first = breaker.allow()
+            second = breaker.allow()
+        breaker.record(True, 0.1)
+
+        # Assert
+        assert (first, second) == (True, False)
+        assert breaker.state == "closed"
+        assert breaker.snapshot()["calls"] == 0
+
+    def test_half_open_probe_failure_reopens(self):
+        """Test that a failed probe opens the breaker again"""
+        # Arrange
+        breaker = make_breaker()
+        for _ in range(4):
+            breaker.record(False, 0.1)
+        with patch.object(circuit_breaker.time, "monotonic", return_value=breaker.opened_at + 31):
+            breaker.allow()
+
+        # Act
+        breaker.record(False, 0.1)
+
+        # Assert
+        assert breaker.state == "open"
+        assert breaker.allow() is False
+        assert breaker.snapshot()["transitions"] == 3
+
+    def test_cancel_frees_probe(self):
+        """Test that a probe without outcome lets the next call probe"""
+        # Arrange
+        breaker = make_breaker()
+        for _ in range(4):
+            breaker.record(False, 0.1)
+
+        # Act & Assert
+        with patch.object(circuit_breaker.time, "monotonic", return_value=breaker.opened_at + 31):
+            assert breaker.allow() is True
+            breaker.cancel()
+            assert breaker.allow() is True
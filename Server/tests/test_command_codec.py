@@ -0,0 +1,123 @@
+"""
+Tests for the compact command wire encoding
+"""
+import json
+import pytest
+from command_codec import CompactDecoder, compact_history, compact_to_json, decode_line, encode_compact
+
+MILK = {"command": "AddItem", "value": "Milk"}
+BREAD = {"command": "CheckItem", "value": "Bread"}
+
+
+class TestEncoding:
+    """Test encoding and decoding single lines"""
+
+    def test_encode_compact(self):
+        """Test one line per command"""
+        # Act & Assert
+        assert encode_compact([MILK, BREAD]) == "A Milk\nC Bread"
+
+    def test_encode_nothing(self):
+        """Test that no commands encode to the empty marker"""
+        # Act & Assert
+        assert encode_compact([]) == "-"
+
+    def test_is_much_shorter_than_json(self):
+        """Test that a command costs a fraction of its pretty-printed JSON"""
+        # Arrange
+        pretty = json.dumps([MILK], indent=4)
+
+        # Act & Assert
+        assert len(pretty) >= 4 * len(encode_compact([MILK]))
+
+    @pytest.mark.parametrize("line, expected", [
+        ("A Milk", MILK),
+        ("  U Coffee beans ", {"command": "UncheckItem", "value": "Coffee beans"}),
+        ("-", None),
+        ("", None),
+        ("A ", None),
+        ("X Milk", None),
+    ])
+    def test_decode_line(self, line, expected):
+        """Test valid and ignored lines"""
+        # Act & Assert
+        assert decode_line(line) == expected
+
+
+class TestCompactDecoder:
+    """Test the streaming decoder"""
+
+    def test_emits_commands_as_lines_complete(self):
+        """Test that commands split across chunks are emitted once their line ends"""
+        # Arrange
+        decoder = CompactDecoder()
+
+        # Act
+        first = decoder.feed("A Mi")
+        second = decoder.feed("lk\nC Bread")
+        last = decoder.finish()
+
+        # Assert
+        assert first == []
+        assert second == [MILK]
+        assert last == [BREAD]
+
+    def test_empty_answer(self):
+        """Test that "-" decodes to no commands"""
+        # Arrange
+        decoder = CompactDecoder()
+
+        # Act & Assert
+        assert decoder.feed("-") == []
+        assert decoder.finish() == []
+
+    def test_falls_back_to_json(self):
+        """Test that a model answering in JSON anyway is still understood"""
+        # Arrange
+        decoder = CompactDecoder()
+
+        # Act
+        decoder.feed('```json\n[{"command": "AddItem", ')
+        decoder.feed('"value": "Milk"}]\n```')
+
+        # Assert
+        assert decoder.finish() == [MILK]
+
+
+class TestCompactHistory:
+    """Test re-encoding earlier answers"""
+
+    def test_assistant_json_answers_are_converted(self):
+        """Test that only assistant command arrays change"""
+        # Arrange
+        messages = [
+            {"role": "user", "content": "add milk"},
+            {"role": "assistant", "content": json.dumps([MILK])},
+            {"role": "assistant", "content": "not json"},
+        ]
+
+        # Act
+        converted = compact_history(messages)
+
+        # Assert
+        assert converted == [messages[0], {"role": "assistant", "content": "A Milk"}, messages[2]]
+        assert messages[1]["content"] == json.dumps([MILK])
+
+
+class TestCompactToJson:
+    """Test re-emitting a compact stream as JSON"""
+
+    @pytest.mark.asyncio
+    async def test_stream_becomes_json_array(self):
+        """Test that callers receive the usual JSON command array"""
+        # Arrange
+        async def stream():
+            yield "A Milk\nC "
+            yield "Bread"
+
+        # Act
+        chunks = [chunk async for chunk in compact_to_json(stream())]
+
+        # Assert
+        assert json.loads("".join(chunks)) == [MILK, BREAD]
+        assert chunks[1] == json.dumps(MILK)
@@ -0,0 +1,115 @@
+"""
+Tests for the server-side conversation store
+"""
+import pytest
+from conversations import ConversationStore
+from Models import ConversationMessage
+
+
+def user(content):
+    return {"role": "user", "content": content}
+
+
+class TestConversationStore:
+    """Test the ConversationStore class"""
+
+    def test_history_of_unknown_conversation_is_empty(self):
+        """Test that a new conversation has no turns"""
+        # Arrange
+        store = ConversationStore()
+
+        # Act & Assert
+        assert store.history("missing") == []
+
+    def test_append_and_history(self):
+        """Test that turns are returned in order"""
+        # Arrange
+        store = ConversationStore()
+
+        # Act
+        store.append("c1", user("Add milk"))
+        store.append("c1", {"role": "assistant", "content": "[]"})
+
+        # Assert
+        assert store.history("c1") == [user("Add milk"), {"role": "assistant", "content": "[]"}]
+
+    def test_history_returns_a_copy(self):
+        """Test that callers cannot mutate the stored window"""
+        # Arrange
+        store = ConversationStore()
+        store.append("c1", user("Add milk"))
+
+        # Act
+        store.history("c1").insert(0, {"role": "system", "content": "prompt"})
+
+        # Assert
+        assert store.history("c1") == [user("Add milk")]
+
+    def test_window_compacts_old_turns(self):
+        """Test that only the last window messages are kept"""
+        # Arrange
+        store = ConversationStore(window=2)
+
+        # Act
+        for content in ("a", "b", "c"):
+            store.append("c1", user(content))
+
+        # Assert
+        assert store.history("c1") == [user("b"), user("c")]
+        assert store.size_bytes == 2
+
+    def test_byte_budget_evicts_least_recently_used(self):
+        """Test that the store stays within max_bytes"""
+        # Arrange
+        store = ConversationStore(max_bytes=10)
+        store.append("c1", user("12345"))
+        store.append("c2", user("12345"))
+        store.history("c1")
+
+        # Act
+        store.append("c3", user("12345"))
+
+        # Assert
+        assert len(store) == 2
+        assert store.history("c2") == []
+        assert store.size_bytes == 10
+
+    def test_persisted_conversation_reloads_after_eviction(self, db_session):
+        """Test that a persistent store falls back to the database"""
+        # Arrange
+        store = ConversationStore(persist=True)
+        store.append("c1", user("Add milk"), db_session)
+        store.clear()
+
+        # Act
+        history = store.history("c1", db_session)
+
+        # Assert
+        assert history == [user("Add milk")]
+        assert db_session.query(ConversationMessage).count() == 1
+
+    def test_append_after_eviction_keeps_persisted_turns(self, db_session):
+        """Test that appending to an evicted conversation reloads it before adding the turn"""
+        # Arrange
+        store = ConversationStore(persist=True)
+        store.append("c1", user("Add milk"), db_session)
+        store.clear()
+
+        # Act
+        store.append("c1", user("And bread"), db_session)
+        history = store.history("c1", db_session)
+
+        # Assert
+        assert history == [user("Add milk"), user("And bread")]
+        assert db_session.query(ConversationMessage).count() == 2
+
+    def test_memory_only_store_does_not_write_rows(self, db_session):
+        """Test that persistence is opt-in"""
+        # Arrange
+        store = ConversationStore()
+
+        # Act
+        store.append("c1", user("Add milk"), db_session)
+
+        # Assert
+        assert db_session.query(ConversationMessage).count() == 0
@@ -0,0 +1,205 @@
+"""
+Tests for the live item change feed
+"""
+import asyncio
+import json
+import threading
+import pytest
+from events import EventHub, format_sse, sse_stream
+
+
+class TestEventHub:
+    """Test the in-process publish/subscribe hub"""
+
+    @pytest.mark.asyncio
+    async def test_publish_delivers_to_subscriber(self):
+        """Test that a subscriber receives published events"""
+        # Arrange
+        hub = EventHub()
+        subscriber = hub.subscribe(1)
+
+        # Act
+        hub.publish(1, "created", {"id": 1, "description": "Milk"}, 1)
+        event = await asyncio.wait_for(subscriber.get(), 1)
+
+        # Assert
+        assert event == {"type": "created", "version": 1, "item": {"id": 1, "description": "Milk"}}
+
+    @pytest.mark.asyncio
+    async def test_publish_batch_is_one_event(self):
+        """Test that the changes of a bulk write arrive as a single event carrying the last version"""
+        # Arrange
+        hub = EventHub(max_queue=1)
+        subscriber = hub.subscribe(1)
+        changes = [{"type": "deleted", "version": 7, "item": {"id": item_id}} for item_id in range(150)]
+
+        # Act
+        hub.publish_batch(1, changes)
+        event = await asyncio.wait_for(subscriber.get(), 1)
+
+        # Assert
+        assert event == {"type": "batch", "version": 7, "changes": changes}
+        assert not subscriber.evicted
+        assert hub.version(1) == 7
+
+    @pytest.mark.asyncio
+    async def test_version_tracks_latest_per_list(self):
+        """Test that each list remembers the highest version published"""
+        # Arrange
+        hub = EventHub()
+
+        # Act
+        hub.publish(1, "created", {"id": 1}, 5)
+        hub.publish(1, "deleted", {"id": 1}, 4)
+        hub.publish(2, "created", {"id": 2}, 9)
+
+        # Assert
+        assert hub.version(1) == 5
+        assert hub.version(2) == 9
+
+    @pytest.mark.asyncio
+    async def test_subscribers_only_receive_their_list(self):
+        """Test that events are scoped by list"""
+        # Arrange
+        hub = EventHub()
+        subscriber = hub.subscribe(1)
+
+        # Act
+        hub.publish(2, "created", {"id": 2}, 1)
+        await asyncio.sleep(0)
+
+        # Assert
+        assert subscriber.queue.empty()
+
+    @pytest.mark.asyncio
+    async def test_publish_from_another_thread(self):
+        """Test that sync endpoints running in the threadpool can publish"""
+        # Arrange
+        hub = EventHub()
+        subscriber = hub.subscribe(1)
+
+        # Act
+        thread = threading.Thread(target=hub.publish, args=(1, "updated", {"id": 1}, 1))
+        thread.start()
+        thread.join()
+        event = await asyncio.wait_for(subscriber.get(), 1)
+
+        # Assert
+        assert event["type"] == "updated"
+
+    @pytest.mark.asyncio
+    async def test_slow_subscriber_is_evicted(self):
+        """Test that a subscriber whose queue overflows is dropped"""
+        # Arrange
+        hub = EventHub(max_queue=2)
+        slow = hub.subscribe(1)
+        fast = hub.subscribe(1)
+
+        # Act
+        for item_id in range(3):
+            hub.publish(1, "created", {"id": item_id}, item_id + 1)
+            await asyncio.sleep(0)
+            if not fast.queue.empty():
+                await fast.get()
+
+        # Assert
+        assert slow.evicted
+        assert await slow.get() is None
+        assert hub.subscriber_count(1) == 1
+
+    @pytest.mark.asyncio
+    async def test_unsubscribe(self):
+        """Test that unsubscribed consumers no longer count"""
+        # Arrange
+        hub = EventHub()
+        subscriber = hub.subscribe(1)
+
+        # Act
+        hub.unsubscribe(subscriber)
+        hub.unsubscribe(subscriber)
+
+        # Assert
+        assert hub.subscriber_count(1) == 0
+
+
+class TestSseStream:
+    """Test the Server-Sent Events encoding of the feed"""
+
+    def test_format_sse(self):
+        """Test the frame layout"""
+        # Act
+        frame = format_sse("created", {"version": 3}, 3)
+
+        # Assert
+        assert frame == 'event: created\nid: 3\ndata: {"version": 3}\n\n'
+
+    @pytest.mark.asyncio
+    async def test_stream_starts_with_snapshot_then_events(self):
+        """Test that the stream sends the snapshot and then live events"""
+        # Arrange
+        hub = EventHub()
+        subscriber = hub.subscribe(1)
+        stream = sse_stream(subscriber, {"version": 0, "items": []})
+
+        # Act
+        snapshot = await stream.__anext__()
+        hub.publish(1, "created", {"id": 1}, 1)
+        created = await asyncio.wait_for(stream.__anext__(), 1)
+        await stream.aclose()
+
+        # Assert
+        assert snapshot.startswith("event: snapshot\n")
+        assert created.startswith("event: created\nid: 1\n")
+        data = json.loads(created.split("data: ")[1])
+        assert data == {"version": 1, "item": {"id": 1}}
+        assert hub.subscriber_count(1) == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_sends_keepalive(self):
+        """Test that idle streams emit comment frames"""
+        # Arrange
+        hub = EventHub()
+        stream = sse_stream(hub.subscribe(1), {"version": 0, "items": []}, keepalive=0.01)
+
+        # Act
+        await stream.__anext__()
+        frame = await stream.__anext__()
+        await stream.aclose()
+
+        # Assert
+        assert frame == ": keep-alive\n\n"
+
+    @pytest.mark.asyncio
+    async def test_stream_sends_batch_frame(self):
+        """Test that a batch event becomes one frame listing its changes"""
+        # Arrange
+        hub = EventHub()
+        stream = sse_stream(hub.subscribe(1), {"version": 0, "items": []})
+        await stream.__anext__()
+        changes = [{"type": "created", "version": 1, "item": {"id": 1}}, {"type": "created", "version": 2, "item": {"id": 2}}]
+
+        # Act
+        hub.publish_batch(1, changes)
+        frame = await asyncio.wait_for(stream.__anext__(), 1)
+        await stream.aclose()
+
+        # Assert
+        assert frame == format_sse("batch", {"version": 2, "changes": changes}, 2)
+
+    @pytest.mark.asyncio
+    async def test_stream_resets_evicted_subscriber(self):
+        """Test that an evicted subscriber is told to reload and the stream ends"""
+        # Arrange
+        hub = EventHub(max_queue=1)
+        stream = sse_stream(hub.subscribe(1), {"version": 0, "items": []})
+        await stream.__anext__()
+
+        # Act
+        hub.publish(1, "created", {"id": 1}, 1)
+        hub.publish(1, "created", {"id": 2}, 2)
+        await asyncio.sleep(0)
+        frames = [frame async for frame in stream]
+
+        # Assert
+        assert len(frames) == 1
+        assert frames[0].startswith("event: reset\n")
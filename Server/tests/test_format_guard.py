@@ -0,0 +1,122 @@
+"""
+Tests for the early format check of streamed LLM answers
+"""
+import pytest
+from format_guard import GuardMetrics, OffFormatError, check, verdict
+
+
+async def stream_of(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class TestVerdict:
+    """Test deciding from the start of an answer"""
+
+    @pytest.mark.parametrize("text, expected", [
+        ("[", True),
+        ('  \n[{"command"', True),
+        ("```json\n[", True),
+        ("```", None),
+        ("```js", None),
+        ("", None),
+        ("   ", None),
+        ("Sure", False),
+        ('{"command": "AddItem"}', False),
+        ("```python", False),
+    ])
+    def test_json(self, text, expected):
+        """Test that JSON answers must open with ["""
+        # Act & Assert
+        assert verdict(text) is expected
+
+    @pytest.mark.parametrize("text, expected", [
+        ("A Milk", True),
+        ("-", None),
+        ("-\n", True),
+        ("C", None),
+        ("[", True),
+        ("Are you", False),
+        ("Sure", False),
+    ])
+    def test_compact(self, text, expected):
+        """Test that compact answers must open with an opcode line, "-" or JSON"""
+        # Act & Assert
+        assert verdict(text, compact=True) is expected
+
+
+class TestCheck:
+    """Test holding back and aborting streams"""
+
+    @pytest.mark.asyncio
+    async def test_passes_valid_stream(self):
+        """Test that a valid answer comes through unchanged"""
+        # Act
+        result = [chunk async for chunk in check(stream_of(" ", "[", '{"command": "AddItem"}', "]"))]
+
+        # Assert
+        assert "".join(result) == ' [{"command": "AddItem"}]'
+
+    @pytest.mark.asyncio
+    async def test_aborts_prose_and_closes_stream(self):
+        """Test that prose is cut off after the first chunk and the provider stream is closed"""
+        # Arrange
+        consumed = []
+
+        async def provider():
+            try:
+                for chunk in ("Sure", "! Here", " is your list"):
+                    consumed.append(chunk)
+                    yield chunk
+            finally:
+                consumed.append("closed")
+
+        # Act
+        with pytest.raises(OffFormatError) as error:
+            async for _ in check(provider()):
+                pass
+
+        # Assert
+        assert error.value.text == "Sure"
+        assert consumed == ["Sure", "closed"]
+
+    @pytest.mark.asyncio
+    async def test_aborts_undecided_stream_at_limit(self):
+        """Test that an answer still undecided after max_chars is aborted"""
+        # Act
+        with pytest.raises(OffFormatError):
+            async for _ in check(stream_of("```", "```", "```"), max_chars=8):
+                pass
+
+    @pytest.mark.asyncio
+    async def test_flushes_short_undecided_stream(self):
+        """Test that an answer ending before a decision is passed on as is"""
+        # Act
+        result = [chunk async for chunk in check(stream_of("-"), compact=True)]
+
+        # Assert
+        assert result == ["-"]
+
+
+class TestGuardMetrics:
+    """Test the cost accounting of aborted answers"""
+
+    def test_records_aborts(self):
+        """Test that aborts add up the wasted characters and time"""
+        # Arrange
+        metrics = GuardMetrics()
+
+        # Act
+        metrics.record_check()
+        metrics.record_abort("Sure", 0.25, retry=True)
+        metrics.record_fallback()
+
+        # Assert
+        assert metrics.snapshot() == {
+            "checked": 1,
+            "aborted": 1,
+            "retried": 1,
+            "fallbacks": 1,
+            "wasted_chars": 4,
+            "wasted_seconds": 0.25,
+        }
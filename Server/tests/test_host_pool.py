@@ -0,0 +1,137 @@
+"""
+Tests for balancing requests over several inference hosts
+"""
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from host_pool import Host, HostPool, parse_hosts
+
+
+def make_pool(count=3, **kwargs):
+    return HostPool([Host(f"http://gpu{i}", MagicMock()) for i in range(count)], **kwargs)
+
+
+class TestParseHosts:
+    """Test reading the host list"""
+
+    def test_parse_hosts(self):
+        """Test Ollama and OpenAI-compatible hosts in one list"""
+        # Act
+        hosts = parse_hosts("http://gpu1:11434, openai+http://gpu2:8080/v1,")
+
+        # Assert
+        assert hosts == [("ollama", "http://gpu1:11434"), ("openai", "http://gpu2:8080/v1")]
+
+    def test_empty(self):
+        """Test that an unset variable means no pool"""
+        # Act & Assert
+        assert parse_hosts("") == []
+
+
+class TestHostPool:
+    """Test least-outstanding-requests selection and ejection"""
+
+    def test_requires_hosts(self):
+        """Test that a pool needs at least one host"""
+        # Act & Assert
+        with pytest.raises(ValueError):
+            HostPool([])
+
+    def test_picks_least_outstanding(self):
+        """Test that the host with the fewest requests in flight is picked"""
+        # Arrange
+        pool = make_pool()
+        first = pool.acquire()
+        second = pool.acquire()
+        third = pool.acquire()
+        pool.release(second)
+
+        # Act
+        host = pool.acquire()
+
+        # Assert
+        assert len({first.url, second.url, third.url}) == 3
+        assert host is second
+
+    def test_idle_hosts_share_load(self):
+        """Test that sequential requests rotate over idle hosts"""
+        # Arrange
+        pool = make_pool()
+        urls = []
+
+        # Act
+        for _ in range(6):
+            host = pool.acquire()
+            urls.append(host.url)
+            pool.release(host)
+
+        # Assert
+        assert urls == ["http://gpu0", "http://gpu1", "http://gpu2"] * 2
+
+    def test_ejects_failing_host(self):
+        """Test that a host failing max_failures times in a row gets no more requests"""
+        # Arrange
+        pool = make_pool(2, max_failures=2)
+        bad = pool.hosts[0]
+        for _ in range(2):
+            pool.record(bad, False)
+
+        # Act
+        picked = {pool.acquire().url for _ in range(4)}
+
+        # Assert
+        assert picked == {"http://gpu1"}
+        assert pool.snapshot()[0]["ejected"] is True
+
+    def test_success_resets_failures(self):
+        """Test that failures must be consecutive to eject"""
+        # Arrange
+        pool = make_pool(1, max_failures=2)
+        host = pool.hosts[0]
+
+        # Act
+        pool.record(host, False)
+        pool.record(host, True)
+        pool.record(host, False)
+
+        # Assert
+        assert host.failures == 1
+        assert pool.snapshot()[0]["ejected"] is False
+
+    def test_all_ejected_still_serves(self):
+        """Test that with every host ejected the one ejected first is tried"""
+        # Arrange
+        pool = make_pool(2, max_failures=1)
+        pool.record(pool.hosts[1], False)
+        pool.record(pool.hosts[0], False)
+
+        # Act & Assert
+        assert pool.acquire() is pool.hosts[1]
+
+    def test_release_without_outcome(self):
+        """Test that a request abandoned by the caller does not count for or against the host"""
+        # Arrange
+        pool = make_pool(1)
+        host = pool.acquire()
+        host.failures = 1
+
+        # Act
+        pool.release(host, None)
+
+        # Assert
+        assert host.in_flight == 0
+        assert host.failures == 1
+
+    @pytest.mark.asyncio
+    async def test_health_check_restores_host(self):
+        """Test that a host answering the health check is taken back"""
+        # Arrange
+        pool = make_pool(2, max_failures=1)
+        pool.hosts[0].client.ping = AsyncMock()
+        pool.hosts[1].client.ping = AsyncMock(side_effect=ConnectionError("refused"))
+        pool.record(pool.hosts[0], False)
+
+        # Act
+        await pool.check_health()
+
+        # Assert
+        assert [host["ejected"] for host in pool.snapshot()] == [False, True]
@@ -0,0 +1,109 @@
+"""
+Tests for the hashed n-gram intent classifier
+"""
+import os
+import pytest
+from intent_classifier import IntentClassifier, evaluate, features, label_commands, read_examples
+
+np = pytest.importorskip("numpy")
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), "..", "intent_examples.jsonl")
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    """Train a classifier on the bundled examples"""
+    texts, intents = read_examples(EXAMPLES)
+    return IntentClassifier.train(texts, intents)
+
+
+class TestFeatures:
+    """Test the hashed feature vectors"""
+
+    def test_features_are_normalized(self):
+        """Test that vectors have unit length"""
+        # Act
+        vector = features("add milk", 1024)
+
+        # Assert
+        assert vector.shape == (1024,)
+        assert np.isclose(np.linalg.norm(vector), 1.0)
+
+    def test_features_are_deterministic(self):
+        """Test that hashing does not depend on the process"""
+        # Act & Assert
+        assert np.array_equal(features("Add Milk", 1024), features("add milk", 1024))
+
+    def test_empty_text(self):
+        """Test that an empty utterance is the zero vector"""
+        # Act & Assert
+        assert not features("", 1024).any()
+
+
+class TestLabelCommands:
+    """Test deriving intent labels from LLM answers"""
+
+    @pytest.mark.parametrize("commands, expected", [
+        ([], "out_of_scope"),
+        ([{"command": "AddItem", "value": "Milk"}, {"command": "AddItem", "value": "Eggs"}], "add"),
+        ([{"command": "AddItem", "value": "Milk"}, {"command": "CheckItem", "value": "Eggs"}], "complex"),
+        ([{"command": "Unknown", "value": "Milk"}], "complex"),
+    ])
+    def test_label_commands(self, commands, expected):
+        """Test each kind of answer"""
+        # Act & Assert
+        assert label_commands(commands) == expected
+
+
+class TestIntentClassifier:
+    """Test training, prediction and the model file"""
+
+    def test_fits_training_examples(self, classifier):
+        """Test that the bundled examples are learned"""
+        # Arrange
+        texts, intents = read_examples(EXAMPLES)
+
+        # Act
+        report = evaluate(classifier, texts, intents)
+
+        # Assert
+        assert report["accuracy"] > 0.95
+        assert report["labels"]["out_of_scope"]["support"] > 0
+
+    @pytest.mark.parametrize("text, expected", [
+        ("please add olive oil", "add"),
+        ("remove the bananas from the list", "remove"),
+        ("tell me a joke please", "out_of_scope"),
+    ])
+    def test_predicts_unseen_utterances(self, classifier, text, expected):
+        """Test that similar utterances get the same intent"""
+        # Act
+        intent, confidence = classifier.predict(text)
+
+        # Assert
+        assert intent == expected
+        assert 0 < confidence <= 1
+
+    def test_save_and_load(self, classifier, tmp_path):
+        """Test that a saved model predicts the same"""
+        # Arrange
+        path = str(tmp_path / "intent.npz")
+        classifier.save(path)
+
+        # Act
+        loaded = IntentClassifier.load(path)
+
+        # Assert
+        assert loaded.labels == classifier.labels
+        assert loaded.predict("add milk") == classifier.predict("add milk")
+
+    def test_load_rejects_other_versions(self, classifier, tmp_path):
+        """Test that an incompatible model file is refused"""
+        # Arrange
+        path = str(tmp_path / "intent.npz")
+        np.savez(path, version=np.array(99), labels=np.array(classifier.labels),
+                 weights=classifier.weights, bias=classifier.bias)
+
+        # Act & Assert
+        with pytest.raises(ValueError):
+            IntentClassifier.load(path)
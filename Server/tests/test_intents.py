@@ -0,0 +1,198 @@
+"""
+Tests for fast intent resolution of voice transcripts
+"""
+import pytest
+from unittest.mock import MagicMock
+import intents
+from intents import IntentCache, normalize, parse_command, route, speculate
+from Models import Item, DEFAULT_LIST_ID
+
+
+class TestParseCommand:
+    """Test the fast-path command parser"""
+
+    @pytest.mark.parametrize("text, expected", [
+        ("Add milk", [{"command": "AddItem", "value": "Milk"}]),
+        ("please add milk to the list.", [{"command": "AddItem", "value": "Milk"}]),
+        ("Add milk, eggs, and bread", [
+            {"command": "AddItem", "value": "Milk"},
+            {"command": "AddItem", "value": "Eggs"},
+            {"command": "AddItem", "value": "Bread"},
+        ]),
+        ("remove eggs from my shopping list", [{"command": "RemoveItem", "value": "Eggs"}]),
+        ("Check item bread", [{"command": "CheckItem", "value": "Bread"}]),
+        ("unconclude coffee beans", [{"command": "UncheckItem", "value": "Coffee beans"}]),
+        ("check off milk", [{"command": "CheckItem", "value": "Milk"}]),
+        ("Tick off the eggs", [{"command": "CheckItem", "value": "Eggs"}]),
+        ("check the bread off", [{"command": "CheckItem", "value": "Bread"}]),
+        ("remove the bread", [{"command": "RemoveItem", "value": "Bread"}]),
+        ("add some apples, a lemon", [
+            {"command": "AddItem", "value": "Apples"},
+            {"command": "AddItem", "value": "Lemon"},
+        ]),
+    ])
+    def test_parses_simple_commands(self, text, expected):
+        """Test the utterances the parser resolves on its own"""
+        # Act & Assert
+        assert parse_command(text) == expected
+
+    @pytest.mark.parametrize("text", [
+        "What should I cook tonight?",
+        "Add milk and check bread",
+        "add mac and cheese",
+        "add milk, eggs and bread",
+        "add the",
+        "remove it",
+        "add",
+    ])
+    def test_leaves_other_utterances_to_the_llm(self, text):
+        """Test that anything ambiguous returns None"""
+        # Act & Assert
+        assert parse_command(text) is None
+
+    def test_normalize(self):
+        """Test that casing, punctuation and spacing do not matter"""
+        # Act & Assert
+        assert normalize("  Add   Milk ,eggs! ") == "add milk, eggs"
+
+
+class TestIntentCache:
+    """Test the IntentCache class"""
+
+    def test_set_and_get_by_normalized_text(self):
+        """Test that a cached transcript matches regardless of formatting"""
+        # Arrange
+        cache = IntentCache()
+        commands = [{"command": "AddItem", "value": "Milk"}]
+
+        # Act
+        cache.set("I need milk", commands)
+
+        # Assert
+        assert cache.get("i need MILK.") == commands
+
+    def test_context_dependent_answers_are_not_cached(self):
+        """Test that commands whose value is not in the transcript are skipped"""
+        # Arrange
+        cache = IntentCache()
+
+        # Act
+        cache.set("and that one too", [{"command": "AddItem", "value": "Bread"}])
+        cache.set("hello", [])
+
+        # Assert
+        assert len(cache) == 0
+
+    def test_evicts_least_recently_used(self):
+        """Test that the cache stays within max_entries"""
+        # Arrange
+        cache = IntentCache(max_entries=1)
+        cache.set("need milk", [{"command": "AddItem", "value": "Milk"}])
+
+        # Act
+        cache.set("need eggs", [{"command": "AddItem", "value": "Eggs"}])
+
+        # Assert
+        assert cache.get("need milk") is None
+        assert cache.get("need eggs") is not None
+
+
+def classifier(intent, confidence):
+    mock = MagicMock()
+    mock.predict.return_value = (intent, confidence)
+    return mock
+
+
+class TestRoute:
+    """Test routing utterances around the LLM"""
+
+    def test_without_model_everything_goes_to_the_llm(self, monkeypatch):
+        """Test that routing is off when no model is configured"""
+        # Arrange
+        monkeypatch.setattr(intents, "intent_classifier", None)
+
+        # Act & Assert
+        assert route("add milk") is None
+
+    def test_out_of_scope_is_answered_immediately(self, monkeypatch):
+        """Test that confident out-of-scope utterances get no commands"""
+        # Arrange
+        monkeypatch.setattr(intents, "intent_classifier", classifier("out_of_scope", 0.9))
+
+        # Act & Assert
+        assert route("tell me a joke") == []
+
+    def test_simple_intent_uses_fast_path(self, monkeypatch):
+        """Test that a confident simple intent is parsed without the LLM"""
+        # Arrange
+        monkeypatch.setattr(intents, "intent_classifier", classifier("add", 0.9))
+
+        # Act & Assert
+        assert route("add milk") == [{"command": "AddItem", "value": "Milk"}]
+
+    @pytest.mark.parametrize("intent, confidence, text", [
+        ("complex", 0.99, "add milk and check bread"),
+        ("out_of_scope", 0.3, "tell me a joke"),
+        ("add", 0.9, "we are out of milk"),
+        ("remove", 0.9, "add milk"),
+    ])
+    def test_falls_back_to_the_llm(self, monkeypatch, intent, confidence, text):
+        """Test that complex, unsure or unparsed utterances go to the LLM"""
+        # Arrange
+        monkeypatch.setattr(intents, "intent_classifier", classifier(intent, confidence))
+
+        # Act & Assert
+        assert route(text) is None
+
+
+class TestSpeculate:
+    """Test speculative resolution of partial transcripts"""
+
+    def test_prefetches_candidate_items(self, db_session):
+        """Test that commands on existing items resolve their ids up front"""
+        # Arrange
+        item = Item(description="Whole milk", checked=False)
+        db_session.add(item)
+        db_session.commit()
+
+        # Act
+        speculation = speculate(db_session, DEFAULT_LIST_ID, "Check milk")
+
+        # Assert
+        assert speculation["text"] == "check milk"
+        assert speculation["commands"] == [{"command": "CheckItem", "value": "Milk"}]
+        assert speculation["candidates"] == {"Milk": item.id}
+        assert speculation["resolved"]
+
+    def test_exact_match_wins(self, db_session):
+        """Test that the item named exactly like the value is picked over one that only contains it"""
+        # Arrange
+        almond = Item(description="Almond milk")
+        milk = Item(description="milk")
+        db_session.add_all([almond, milk])
+        db_session.commit()
+
+        # Act
+        speculation = speculate(db_session, DEFAULT_LIST_ID, "Check milk")
+
+        # Assert
+        assert speculation["candidates"] == {"Milk": milk.id}
+
+    def test_missing_item_is_not_resolved(self, db_session):
+        """Test that a command on an item that is not on the list cannot be committed speculatively"""
+        # Act
+        speculation = speculate(db_session, DEFAULT_LIST_ID, "Check milk")
+
+        # Assert
+        assert speculation["candidates"] == {"Milk": None}
+        assert not speculation["resolved"]
+
+    def test_unresolved_partial(self, db_session):
+        """Test that a partial the fast path cannot handle has no commands"""
+        # Act
+        speculation = speculate(db_session, DEFAULT_LIST_ID, "I think we")
+
+        # Assert
+        assert speculation["commands"] is None
+        assert speculation["candidates"] == {}
+        assert not speculation["resolved"]
@@ -1,8 +1,13 @@
 """
 Tests for the items API endpoints
 """
+import asyncio
 import pytest
-from Models import Item
+from sqlalchemy import event
+from Models import Item, DEFAULT_LIST_ID
+from events import item_events
+from slo import SLOController
+import api
 
 
 class TestHealthEndpoint:
@@ -12,7 +17,33 @@ class TestHealthEndpoint:
         """Test GET /health returns status"""
         response = client.get("/health")
         assert response.status_code == 200
-        assert response.json() == {"message": "Grocery List API is running"}
+        assert response.json() == {"message": "Grocery List API is running", "mode": "normal"}
+
+    def test_health_endpoint_reports_degraded_mode(self, client, monkeypatch):
+        """Test GET /health reports the current degradation mode"""
+        # Arrange
+        controller = SLOController(step_seconds=60)
+        for _ in range(5):
+            controller.record("ollama:llama2", False, 0.1)
+        monkeypatch.setattr(api, "slo_controller", controller)
+
+        # Act
+        response = client.get("/health")
+
+        # Assert
+        assert response.json()["mode"] == "cache_first"
+
+
+class TestLLMStatusEndpoint:
+    """Test the LLM status endpoint"""
+
+    def test_llm_status(self, client):
+        """Test GET /llm/status reports the breaker of the configured provider"""
+        response = client.get("/llm/status")
+        assert response.status_code == 200
+        assert response.json()["providers"][0]["name"] == "ollama:llama2"
+        assert response.json()["providers"][0]["state"] == "closed"
+        assert "cached_ratio" in response.json()["prompt"]
 
 
 class TestGetItems:
@@ -60,6 +91,232 @@ class TestGetItems:
         assert "created_at" in item_data
         assert "updated_at" in item_data
 
+    def test_get_items_as_msgpack(self, client, db_session):
+        """Test that GET /items honours a MessagePack Accept header"""
+        # Arrange
+        msgpack = pytest.importorskip("msgpack")
+        db_session.add(Item(description="Apples", checked=False))
+        db_session.commit()
+
+        # Act
+        response = client.get("/items", headers={"Accept": "application/x-msgpack"})
+
+        # Assert
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-msgpack"
+        assert "Accept" in response.headers["vary"]
+        items = msgpack.unpackb(response.content)
+        assert items[0]["description"] == "Apples"
+        assert client.get("/items").json() == items
+
+    def test_get_items_served_from_cache(self, client, db_session):
+        """Test that a second read is served from the cache without querying"""
+        # Arrange
+        db_session.add(Item(description="Apples", checked=False))
+        db_session.commit()
+        first = client.get("/items")
+
+        # Act - a row written behind the API's back is not visible until invalidation
+        db_session.add(Item(description="Hidden", checked=False))
+        db_session.commit()
+        second = client.get("/items")
+
+        # Assert
+        assert second.status_code == 200
+        assert second.content == first.content
+        assert len(second.json()) == 1
+
+    def test_create_item_invalidates_cache(self, client):
+        """Test that POST /items is visible on the next read"""
+        # Arrange
+        assert client.get("/items").json() == []
+
+        # Act
+        client.post("/items", json={"description": "Milk"})
+
+        # Assert
+        items = client.get("/items").json()
+        assert [item["description"] for item in items] == ["Milk"]
+
+    def test_delete_item_invalidates_cache(self, client):
+        """Test that DELETE /items/{id} is visible on the next read"""
+        # Arrange
+        item_id = client.post("/items", json={"description": "Milk"}).json()["id"]
+        assert len(client.get("/items").json()) == 1
+
+        # Act
+        client.delete(f"/items/{item_id}")
+
+        # Assert
+        assert client.get("/items").json() == []
+
+    def test_mark_item_invalidates_cache(self, client):
+        """Test that PATCH /items/{id}/checked is visible on the next read"""
+        # Arrange
+        item_id = client.post("/items", json={"description": "Milk"}).json()["id"]
+        assert client.get("/items").json()[0]["checked"] == False
+
+        # Act
+        client.patch(f"/items/{item_id}/checked", json={"checked": True})
+
+        # Assert
+        assert client.get("/items").json()[0]["checked"] == True
+
+
+
+class TestItemChangeEvents:
+    """Test that item mutations are pushed to the change feed"""
+
+    @pytest.mark.asyncio
+    async def test_create_item_publishes_created(self, client):
+        """Test that POST /items publishes a created event"""
+        # Arrange
+        subscriber = item_events.subscribe(DEFAULT_LIST_ID)
+
+        try:
+            # Act
+            item_id = client.post("/items", json={"description": "Milk"}).json()["id"]
+            event = await asyncio.wait_for(subscriber.get(), 1)
+
+            # Assert
+            assert event["type"] == "created"
+            assert event["item"]["id"] == item_id
+            assert event["item"]["description"] == "Milk"
+        finally:
+            item_events.unsubscribe(subscriber)
+
+    @pytest.mark.asyncio
+    async def test_mark_and_delete_publish_events(self, client):
+        """Test that PATCH and DELETE publish updated and deleted events in order"""
+        # Arrange
+        item_id = client.post("/items", json={"description": "Milk"}).json()["id"]
+        subscriber = item_events.subscribe(DEFAULT_LIST_ID)
+
+        try:
+            # Act
+            client.patch(f"/items/{item_id}/checked", json={"checked": True})
+            client.delete(f"/items/{item_id}")
+            updated = await asyncio.wait_for(subscriber.get(), 1)
+            deleted = await asyncio.wait_for(subscriber.get(), 1)
+
+            # Assert
+            assert updated["type"] == "updated"
+            assert updated["item"]["checked"] == True
+            assert deleted == {"type": "deleted", "version": updated["version"] + 1, "item": {"id": item_id}}
+        finally:
+            item_events.unsubscribe(subscriber)
+
+
+
+class TestStreamItems:
+    """Test the GET /items/stream Server-Sent Events endpoint"""
+
+    @pytest.mark.asyncio
+    async def test_stream_sends_snapshot_then_changes(self, client, db_session):
+        """Test that the stream starts with the current items and then pushes changes"""
+        # Arrange
+        client.post("/items", json={"description": "Milk"})
+
+        # Act: the stream never ends, so its body is read frame by frame
+        response = await api.stream_items(list_id=DEFAULT_LIST_ID, db=db_session)
+        stream = response.body_iterator
+        try:
+            snapshot = await stream.__anext__()
+            client.post("/items", json={"description": "Bread"})
+            created = await asyncio.wait_for(stream.__anext__(), 1)
+        finally:
+            await stream.aclose()
+
+        # Assert
+        assert response.media_type == "text/event-stream"
+        assert response.headers["cache-control"] == "no-cache"
+        assert snapshot.startswith("event: snapshot\n")
+        assert '"description": "Milk"' in snapshot
+        assert created.startswith("event: created\n")
+        assert '"description": "Bread"' in created
+
+    def test_stream_unknown_list(self, client):
+        """Test that streaming a missing list returns 404"""
+        # Act
+        response = client.get("/items/stream", params={"list_id": 999})
+
+        # Assert
+        assert response.status_code == 404
+
+
+class TestGetItemChanges:
+    """Test the GET /items/changes delta sync endpoint"""
+
+    def test_changes_since_zero_returns_everything(self, client):
+        """Test that a fresh client receives every item"""
+        # Arrange
+        client.post("/items", json={"description": "Milk"})
+        client.post("/items", json={"description": "Bread"})
+
+        # Act
+        response = client.get("/items/changes", params={"since": 0})
+
+        # Assert
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["description"] for item in data["items"]] == ["Milk", "Bread"]
+        assert data["deleted"] == []
+        assert data["version"] == 2
+
+    def test_changes_since_version(self, client):
+        """Test that only changes after the cursor are returned, deletions included"""
+        # Arrange
+        milk_id = client.post("/items", json={"description": "Milk"}).json()["id"]
+        bread_id = client.post("/items", json={"description": "Bread"}).json()["id"]
+        cursor = client.get("/items/changes").json()["version"]
+
+        # Act
+        client.patch(f"/items/{bread_id}/checked", json={"checked": True})
+        client.delete(f"/items/{milk_id}")
+        data = client.get("/items/changes", params={"since": cursor}).json()
+
+        # Assert
+        assert [item["id"] for item in data["items"]] == [bread_id]
+        assert data["items"][0]["checked"] == True
+        assert data["deleted"] == [milk_id]
+        assert data["version"] == cursor + 2
+
+    def test_changes_since_timestamp(self, client):
+        """Test that an ISO timestamp cursor is accepted"""
+        # Arrange
+        client.post("/items", json={"description": "Milk"})
+
+        # Act
+        response = client.get("/items/changes", params={"since": "2000-01-01T00:00:00"})
+
+        # Assert
+        assert response.status_code == 200
+        assert len(response.json()["items"]) == 1
+
+    def test_changes_with_invalid_cursor(self, client):
+        """Test that an unparseable cursor is rejected"""
+        # Act
+        response = client.get("/items/changes", params={"since": "yesterday"})
+
+        # Assert
+        assert response.status_code == 422
+
+    @pytest.mark.asyncio
+    async def test_events_carry_change_versions(self, client):
+        """Test that change feed events use the same versions as delta sync"""
+        # Arrange
+        subscriber = item_events.subscribe(DEFAULT_LIST_ID)
+
+        try:
+            # Act
+            client.post("/items", json={"description": "Milk"})
+            event = await asyncio.wait_for(subscriber.get(), 1)
+
+            # Assert
+            assert event["version"] == client.get("/items/changes").json()["version"]
+        finally:
+            item_events.unsubscribe(subscriber)
+
 
 class TestCreateItem:
     """Test the POST /items endpoint"""
@@ -203,6 +460,24 @@ class TestUpdateItemCheckedStatus:
         data = response.json()
         assert data["checked"] == False
 
+    def test_update_non_existing_item(self, client):
+        """Test updating a missing item returns 404"""
+        response = client.patch("/items/999/checked", json={"checked": True})
+
+        assert response.status_code == 404
+        assert response.json() == {"detail": "Item not found"}
+
+    def test_update_item_returns_new_updated_at(self, client, db_session):
+        """Test that the response carries the server-side timestamps"""
+        item_id = client.post("/items", json={"description": "Milk"}).json()["id"]
+
+        data = client.patch(f"/items/{item_id}/checked", json={"checked": True}).json()
+
+        assert data["id"] == item_id
+        assert data["description"] == "Milk"
+        assert data["created_at"] is not None
+        assert data["updated_at"] is not None
+
     def test_update_item_with_invalid_id(self, client):
         """Test updating with invalid item ID format"""
         payload = {"checked": True}
@@ -222,3 +497,227 @@ class TestUpdateItemCheckedStatus:
         response = client.patch(f"/items/{item.id}/checked", json=payload)
 
         assert response.status_code == 422  # Validation error
+
+
+class TestBatchCreateItems:
+    """Test the POST /items/batch endpoint"""
+
+    def test_create_items_batch(self, client, db_session):
+        """Test creating several items in one request"""
+        # Arrange
+        payload = {"items": [{"description": "Flour"}, {"description": "Sugar", "checked": True}]}
+
+        # Act
+        response = client.post("/items/batch", json=payload)
+
+        # Assert
+        assert response.status_code == 200
+        data = response.json()
+        assert [item["description"] for item in data["results"]] == ["Flour", "Sugar"]
+        assert [item["checked"] for item in data["results"]] == [False, True]
+        assert all("id" in item and "created_at" in item for item in data["results"])
+        assert db_session.query(Item).count() == 2
+
+    def test_create_items_batch_assigns_versions(self, client):
+        """Test that batch inserts are visible to delta sync"""
+        # Act
+        data = client.post("/items/batch", json={"items": [{"description": "A"}, {"description": "B"}]}).json()
+
+        # Assert
+        assert data["version"] == 2
+        assert len(client.get("/items/changes", params={"since": 1}).json()["items"]) == 1
+
+    def test_create_items_batch_empty(self, client):
+        """Test that an empty batch is rejected"""
+        response = client.post("/items/batch", json={"items": []})
+        assert response.status_code == 422
+
+    def test_create_items_batch_validates_each_item(self, client, db_session):
+        """Test that one invalid item rejects the whole batch"""
+        response = client.post("/items/batch", json={"items": [{"description": "Ok"}, {"description": ""}]})
+
+        assert response.status_code == 422
+        assert db_session.query(Item).count() == 0
+
+
+class TestBatchMarkItems:
+    """Test the PATCH /items/checked endpoint"""
+
+    def test_mark_items_by_ids(self, client, db_session):
+        """Test checking a set of items and reporting per-id results"""
+        # Arrange
+        items = [Item(description="A"), Item(description="B"), Item(description="C", checked=True)]
+        db_session.add_all(items)
+        db_session.commit()
+        a, b, c = (item.id for item in items)
+
+        # Act
+        response = client.patch("/items/checked", json={"checked": True, "ids": [a, c, 999]})
+
+        # Assert
+        assert response.status_code == 200
+        assert response.json()["results"] == [
+            {"id": a, "status": "updated"},
+            {"id": c, "status": "unchanged"},
+            {"id": 999, "status": "not_found"},
+        ]
+        db_session.expire_all()
+        assert {item.description: item.checked for item in db_session.query(Item)} == {
+            "A": True, "B": False, "C": True,
+        }
+
+    def test_uncheck_all(self, client, db_session):
+        """Test unchecking every item when no ids are given"""
+        # Arrange
+        db_session.add_all([Item(description="A", checked=True), Item(description="B", checked=True)])
+        db_session.commit()
+
+        # Act
+        response = client.patch("/items/checked", json={"checked": False})
+
+        # Assert
+        assert response.status_code == 200
+        assert len(response.json()["results"]) == 2
+        db_session.expire_all()
+        assert db_session.query(Item).filter(Item.checked == True).count() == 0
+
+    def test_mark_items_invalidates_cache(self, client):
+        """Test that batch updates are visible on the next read"""
+        # Arrange
+        client.post("/items", json={"description": "Milk"})
+        assert client.get("/items").json()[0]["checked"] == False
+
+        # Act
+        client.patch("/items/checked", json={"checked": True})
+
+        # Assert
+        assert client.get("/items").json()[0]["checked"] == True
+
+    def test_mark_items_reported_by_delta_sync(self, client):
+        """Test that batch updates bump the change version"""
+        # Arrange
+        client.post("/items", json={"description": "Milk"})
+        cursor = client.get("/items/changes").json()["version"]
+
+        # Act
+        version = client.patch("/items/checked", json={"checked": True}).json()["version"]
+
+        # Assert
+        assert version == cursor + 1
+        changes = client.get("/items/changes", params={"since": cursor}).json()
+        assert changes["items"][0]["checked"] == True
+
+    def test_mark_items_without_checked(self, client):
+        """Test that the checked field is required"""
+        response = client.patch("/items/checked", json={"ids": [1]})
+        assert response.status_code == 422
+
+
+class TestBatchDeleteItems:
+    """Test the DELETE /items endpoint"""
+
+    def test_clear_checked_items(self, client, db_session):
+        """Test deleting every checked item at once"""
+        # Arrange
+        items = [Item(description="A", checked=True), Item(description="B"), Item(description="C", checked=True)]
+        db_session.add_all(items)
+        db_session.commit()
+        a, _, c = (item.id for item in items)
+
+        # Act
+        response = client.delete("/items", params={"checked": True})
+
+        # Assert
+        assert response.status_code == 200
+        assert response.json()["results"] == [
+            {"id": a, "status": "deleted"},
+            {"id": c, "status": "deleted"},
+        ]
+        assert [item.description for item in db_session.query(Item)] == ["B"]
+
+    def test_clear_checked_reported_by_delta_sync(self, client, db_session):
+        """Test that bulk deletions leave tombstones"""
+        # Arrange
+        item = Item(description="A", checked=True)
+        db_session.add(item)
+        db_session.commit()
+        item_id = item.id
+        cursor = client.get("/items/changes").json()["version"]
+
+        # Act
+        client.delete("/items", params={"checked": True})
+
+        # Assert
+        assert client.get("/items/changes", params={"since": cursor}).json()["deleted"] == [item_id]
+
+    @pytest.mark.asyncio
+    async def test_clear_checked_publishes_one_batch_event(self, client, db_session):
+        """Test that clearing more items than a subscriber queue holds keeps subscribers connected"""
+        # Arrange
+        db_session.add_all([Item(description=f"Item {i}", checked=True) for i in range(150)])
+        db_session.commit()
+        subscriber = item_events.subscribe(DEFAULT_LIST_ID)
+
+        try:
+            # Act
+            response = client.delete("/items", params={"checked": True})
+            event = await asyncio.wait_for(subscriber.get(), 1)
+            await asyncio.sleep(0)
+
+            # Assert
+            assert event["type"] == "batch"
+            assert event["version"] == response.json()["version"]
+            assert len(event["changes"]) == 150
+            assert event["changes"][0]["type"] == "deleted"
+            assert not subscriber.evicted
+            assert subscriber.queue.empty()
+        finally:
+            item_events.unsubscribe(subscriber)
+
+    def test_clear_checked_with_nothing_to_delete(self, client):
+        """Test that an empty delete reports no results"""
+        response = client.delete("/items", params={"checked": True})
+
+        assert response.status_code == 200
+        assert response.json()["results"] == []
+
+    def test_delete_items_requires_filter(self, client):
+        """Test that DELETE /items never clears the list without a filter"""
+        response = client.delete("/items")
+        assert response.status_code == 422
+
+
+class TestSingleRoundTripWrites:
+    """Test that single-item writes reserve a version and do not read the row back"""
+
+    @pytest.fixture
+    def statements(self, db_engine):
+        """Collect the SQL statements sent to the test database"""
+        executed = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            if not statement.startswith(("SAVEPOINT", "RELEASE", "ROLLBACK")):
+                executed.append(statement.split()[0].upper())
+
+        event.listen(db_engine, "before_cursor_execute", record)
+        yield executed
+        event.remove(db_engine, "before_cursor_execute", record)
+
+    def test_create_item_is_one_write(self, client, statements):
+        """Test that POST /items reserves a version and issues a single INSERT ... RETURNING"""
+        # The first request of a test looks the list up once
+        client.get("/items")
+        statements.clear()
+
+        client.post("/items", json={"description": "Milk"})
+
+        assert statements == ["UPDATE", "INSERT"]
+
+    def test_mark_item_is_one_write(self, client, statements):
+        """Test that PATCH /items/{id}/checked reserves a version and issues a single UPDATE ... RETURNING"""
+        item_id = client.post("/items", json={"description": "Milk"}).json()["id"]
+        statements.clear()
+
+        client.patch(f"/items/{item_id}/checked", json={"checked": True})
+
+        assert statements == ["UPDATE", "UPDATE"]
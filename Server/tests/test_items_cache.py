@@ -0,0 +1,114 @@
+"""
+Tests for the in-process items response cache
+"""
+import pytest
+from items_cache import ItemsCache
+
+
+class TestItemsCache:
+    """Test the ItemsCache class"""
+
+    def test_get_returns_none_on_miss(self):
+        """Test that an empty cache misses"""
+        # Arrange
+        cache = ItemsCache()
+
+        # Act & Assert
+        assert cache.get("default") is None
+
+    def test_set_and_get(self):
+        """Test that a stored body is returned on the next get"""
+        # Arrange
+        cache = ItemsCache()
+        generation = cache.generation("default")
+
+        # Act
+        cache.set("default", b"[]", generation)
+
+        # Assert
+        assert cache.get("default") == b"[]"
+
+    def test_invalidate_drops_entry(self):
+        """Test that invalidate removes the cached body"""
+        # Arrange
+        cache = ItemsCache()
+        cache.set("default", b"[]", cache.generation("default"))
+
+        # Act
+        cache.invalidate("default")
+
+        # Assert
+        assert cache.get("default") is None
+
+    def test_set_with_stale_generation_is_ignored(self):
+        """Test that a body built before an invalidation is not stored"""
+        # Arrange
+        cache = ItemsCache()
+        generation = cache.generation("default")
+        cache.invalidate("default")
+
+        # Act
+        cache.set("default", b"[stale]", generation)
+
+        # Assert
+        assert cache.get("default") is None
+
+    def test_keys_are_independent(self):
+        """Test that invalidating one list keeps the others cached"""
+        # Arrange
+        cache = ItemsCache()
+        cache.set(1, b"[1]", cache.generation(1))
+        cache.set(2, b"[2]", cache.generation(2))
+
+        # Act
+        cache.invalidate(1)
+
+        # Assert
+        assert cache.get(1) is None
+        assert cache.get(2) == b"[2]"
+
+    def test_evicts_least_recently_used(self):
+        """Test that the cache stays within max_lists"""
+        # Arrange
+        cache = ItemsCache(max_lists=2)
+        cache.set(1, b"[1]", cache.generation(1))
+        cache.set(2, b"[2]", cache.generation(2))
+        cache.get(1)
+
+        # Act
+        cache.set(3, b"[3]", cache.generation(3))
+
+        # Assert
+        assert len(cache) == 2
+        assert cache.get(1) == b"[1]"
+        assert cache.get(2) is None
+        assert cache.get(3) == b"[3]"
+
+    def test_clear_drops_everything(self):
+        """Test that clear empties the cache and outdates pending generations"""
+        # Arrange
+        cache = ItemsCache()
+        generation = cache.generation(1)
+        cache.set(1, b"[1]", generation)
+
+        # Act
+        cache.clear()
+        cache.set(1, b"[stale]", generation)
+
+        # Assert
+        assert len(cache) == 0
+        assert cache.get(1) is None
+
+    def test_media_types_are_cached_separately(self):
+        """Test that each encoding of a list has its own body and shares invalidation"""
+        # Arrange
+        cache = ItemsCache()
+        generation = cache.generation(1)
+        cache.set(1, b"[]", generation)
+        cache.set(1, b"\x90", generation, "application/x-msgpack")
+
+        # Act & Assert
+        assert cache.get(1) == b"[]"
+        assert cache.get(1, "application/x-msgpack") == b"\x90"
+        cache.invalidate(1)
+        assert cache.get(1, "application/x-msgpack") is None
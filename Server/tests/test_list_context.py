@@ -0,0 +1,74 @@
+"""
+Tests for the list state block added to LLM prompts
+"""
+import pytest
+from list_context import HEADER, build_list_context, rank_items
+
+
+def item(id, description, checked=False, updated_at="2026-01-01T00:00:00"):
+    return {"id": id, "description": description, "checked": checked, "updated_at": updated_at}
+
+
+class TestRankItems:
+    """Test ordering items by relevance"""
+
+    def test_similar_items_come_first(self):
+        """Test that items named in the utterance outrank the rest"""
+        # Arrange
+        items = [item(1, "Bread"), item(2, "Whole milk"), item(3, "Eggs")]
+
+        # Act
+        ranked = rank_items(items, "check the milk")
+
+        # Assert
+        assert ranked[0]["description"] == "Whole milk"
+
+    def test_recent_items_break_ties(self):
+        """Test that unrelated items are ordered by most recent update"""
+        # Arrange
+        items = [
+            item(1, "Bread", updated_at="2026-01-01T00:00:00"),
+            item(2, "Eggs", updated_at="2026-01-03T00:00:00"),
+            item(3, "Rice", updated_at="2026-01-02T00:00:00"),
+        ]
+
+        # Act
+        ranked = rank_items(items, "hello")
+
+        # Assert
+        assert [entry["id"] for entry in ranked] == [2, 3, 1]
+
+
+class TestBuildListContext:
+    """Test the budgeted context block"""
+
+    def test_renders_items_and_checked_state(self):
+        """Test the block layout"""
+        # Act
+        context = build_list_context([item(1, "Milk", checked=True), item(2, "Eggs")], "milk", 100)
+
+        # Assert
+        assert context == HEADER + "- [x] Milk\n- Eggs\n"
+
+    def test_budget_caps_large_lists(self):
+        """Test that a big list does not blow up the prompt"""
+        # Arrange
+        items = [item(i, f"Item number {i}") for i in range(5000)]
+        items.append(item(5000, "Whole milk", updated_at="2020-01-01T00:00:00"))
+
+        # Act
+        context = build_list_context(items, "check the milk", 50)
+
+        # Assert
+        assert len(context) <= 50 * 4
+        assert context.startswith(HEADER + "- Whole milk\n")
+
+    def test_empty_list(self):
+        """Test that an empty list adds nothing"""
+        # Act & Assert
+        assert build_list_context([], "add milk", 100) is None
+
+    def test_budget_too_small(self):
+        """Test that a budget smaller than the header adds nothing"""
+        # Act & Assert
+        assert build_list_context([item(1, "Milk")], "milk", 5) is None
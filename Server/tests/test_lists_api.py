@@ -0,0 +1,158 @@
+"""
+Tests for grocery lists and list scoping of the item endpoints
+"""
+import pytest
+from unittest.mock import patch
+from Models import Item, GroceryList, DEFAULT_LIST_ID
+
+OTHER_TOKEN = {"X-List-Token": "other-household-token"}
+
+
+@pytest.fixture
+def other_list(db_session):
+    """A second household's list"""
+    grocery_list = GroceryList(name="Other household", token=OTHER_TOKEN["X-List-Token"])
+    db_session.add(grocery_list)
+    db_session.commit()
+    return grocery_list.id
+
+
+class TestListsEndpoints:
+    """Test the /lists endpoints"""
+
+    def test_create_list(self, client):
+        """Test creating a new list"""
+        response = client.post("/lists", json={"name": "Smiths"})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["name"] == "Smiths"
+        assert data["id"] != DEFAULT_LIST_ID
+        assert "created_at" in data
+
+    def test_create_list_empty_name(self, client):
+        """Test that a list needs a name"""
+        response = client.post("/lists", json={"name": ""})
+        assert response.status_code == 422
+
+    def test_create_list_returns_token(self, client):
+        """Test that a new list comes with an unguessable token that unlocks it"""
+        # Arrange
+        created = client.post("/lists", json={"name": "Smiths"}).json()
+
+        # Act
+        without_token = client.get("/items", params={"list_id": created["id"]})
+        with_token = client.get("/items", params={"list_id": created["id"]}, headers={"X-List-Token": created["token"]})
+        query_token = client.get("/items", params={"list_id": created["id"], "token": created["token"]})
+
+        # Assert
+        assert len(created["token"]) >= 40
+        assert without_token.status_code == 404
+        assert with_token.status_code == 200
+        assert query_token.status_code == 200
+
+    def test_wrong_token_looks_like_missing_list(self, client, other_list):
+        """Test that a wrong token is rejected without confirming the list exists"""
+        # Act
+        response = client.get("/items", params={"list_id": other_list}, headers={"X-List-Token": "guess"})
+
+        # Assert
+        assert response.status_code == 404
+        assert response.json() == {"detail": "List not found"}
+
+    def test_lists_cannot_be_enumerated(self, client, other_list):
+        """Test that there is no endpoint listing every household's lists"""
+        # Act
+        response = client.get("/lists")
+
+        # Assert
+        assert response.status_code == 405
+
+
+class TestListScoping:
+    """Test that item endpoints only see the requested list"""
+
+    def test_unknown_list_returns_404(self, client):
+        """Test that requests for a missing list are rejected"""
+        response = client.get("/items", params={"list_id": 999})
+
+        assert response.status_code == 404
+        assert response.json() == {"detail": "List not found"}
+
+    def test_items_default_to_default_list(self, client, db_session):
+        """Test that clients without list_id keep using the default list"""
+        client.post("/items", json={"description": "Milk"})
+
+        assert db_session.query(Item).one().list_id == DEFAULT_LIST_ID
+
+    def test_get_items_scoped_by_list(self, client, other_list):
+        """Test that each list returns only its own items"""
+        # Arrange
+        client.post("/items", json={"description": "Milk"})
+        client.post("/items", params={"list_id": other_list}, headers=OTHER_TOKEN, json={"description": "Rice"})
+
+        # Act
+        default_items = client.get("/items").json()
+        other_items = client.get("/items", params={"list_id": other_list}, headers=OTHER_TOKEN).json()
+
+        # Assert
+        assert [item["description"] for item in default_items] == ["Milk"]
+        assert [item["description"] for item in other_items] == ["Rice"]
+
+    def test_cannot_update_item_of_another_list(self, client, other_list):
+        """Test that item ids from another list are not found"""
+        item_id = client.post("/items", json={"description": "Milk"}).json()["id"]
+
+        response = client.patch(
+            f"/items/{item_id}/checked", params={"list_id": other_list}, headers=OTHER_TOKEN, json={"checked": True}
+        )
+
+        assert response.status_code == 404
+
+    def test_cannot_delete_item_of_another_list(self, client, db_session, other_list):
+        """Test that deleting through another list leaves the item alone"""
+        item_id = client.post("/items", json={"description": "Milk"}).json()["id"]
+
+        response = client.delete(f"/items/{item_id}", params={"list_id": other_list}, headers=OTHER_TOKEN)
+
+        assert response.json() == {"message": "Item not found"}
+        assert db_session.query(Item).count() == 1
+
+    def test_clear_checked_scoped_by_list(self, client, db_session, other_list):
+        """Test that clearing checked items only touches one list"""
+        db_session.add_all([
+            Item(description="Milk", checked=True),
+            Item(description="Rice", checked=True, list_id=other_list),
+        ])
+        db_session.commit()
+
+        client.delete("/items", params={"checked": True, "list_id": other_list}, headers=OTHER_TOKEN)
+
+        assert [item.description for item in db_session.query(Item)] == ["Milk"]
+
+    def test_versions_are_per_list(self, client, other_list):
+        """Test that delta sync versions advance independently per list"""
+        client.post("/items", json={"description": "Milk"})
+        client.post("/items", json={"description": "Bread"})
+        client.post("/items", params={"list_id": other_list}, headers=OTHER_TOKEN, json={"description": "Rice"})
+
+        assert client.get("/items/changes").json()["version"] == 2
+        assert client.get("/items/changes", params={"list_id": other_list}, headers=OTHER_TOKEN).json()["version"] == 1
+
+    def test_chat_commands_scoped_by_list(self, client, db_session, other_list):
+        """Test that chat commands only match items of the requested list"""
+        # Arrange
+        db_session.add_all([Item(description="Milk"), Item(description="Milk", list_id=other_list)])
+        db_session.commit()
+
+        async def mock_llm_response(messages):
+            yield '[{"command": "CheckItem", "value": "milk"}]'
+
+        with patch('llm.get_response', side_effect=mock_llm_response):
+            # Act
+            client.post("/chat", params={"list_id": other_list}, headers=OTHER_TOKEN, json={"message": "check milk"})
+
+        # Assert
+        db_session.expire_all()
+        checked = {item.list_id: item.checked for item in db_session.query(Item)}
+        assert checked == {DEFAULT_LIST_ID: False, other_list: True}
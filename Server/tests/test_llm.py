@@ -1,12 +1,16 @@
 """
 Tests for the LLM integration module
 """
+import asyncio
 import pytest
 import os
+import json
 from unittest.mock import AsyncMock, patch, MagicMock
 from openai import AsyncOpenAI
 from ollama import AsyncClient
 import llm
+import prompts
+from slo import SLOController
 
 
 class TestLLMClient:
@@ -140,6 +144,43 @@ class TestChatGPTClient:
         assert len(result) == 0
 
 
+    @pytest.mark.asyncio
+    async def test_chatgpt_records_cached_tokens(self, monkeypatch):
+        """Test that the usage chunk is recorded and the prefix is used as cache key"""
+        # Arrange
+        client = llm.ChatGPTClient("gpt-4o-mini", "test-api-key")
+        metrics = prompts.PromptMetrics()
+        monkeypatch.setattr(prompts, "prompt_metrics", metrics)
+        messages = [{"role": "system", "content": "prefix"}, {"role": "user", "content": "Add milk"}]
+
+        content_chunk = MagicMock()
+        content_chunk.choices = [MagicMock()]
+        content_chunk.choices[0].delta.content = "[]"
+        usage_chunk = MagicMock()
+        usage_chunk.choices = []
+        usage_chunk.usage.prompt_tokens = 1200
+        usage_chunk.usage.prompt_tokens_details.cached_tokens = 1024
+        usage_chunk.usage.completion_tokens = 2
+
+        async def mock_stream():
+            yield content_chunk
+            yield usage_chunk
+
+        mock_create = AsyncMock(return_value=mock_stream())
+        client.client.chat.completions.create = mock_create
+
+        # Act
+        result = [chunk async for chunk in client.stream_chat(messages)]
+
+        # Assert
+        assert result == ["[]"]
+        call_kwargs = mock_create.call_args.kwargs
+        assert call_kwargs["stream_options"] == {"include_usage": True}
+        assert call_kwargs["prompt_cache_key"] == prompts.prefix_key("prefix")
+        assert metrics.snapshot()["cached_tokens"] == 1024
+        assert metrics.snapshot()["prompt_tokens"] == 1200
+
+
 class TestOllamaClient:
     """Test the Ollama client implementation"""
 
@@ -232,6 +273,29 @@ class TestOllamaClient:
         assert result[0] == "Valid"
 
 
+    @pytest.mark.asyncio
+    async def test_ollama_records_evaluated_tokens(self, monkeypatch):
+        """Test that the final chunk's token counts are recorded"""
+        # Arrange
+        client = llm.OllamaClient("llama2")
+        metrics = prompts.PromptMetrics()
+        monkeypatch.setattr(prompts, "prompt_metrics", metrics)
+
+        async def mock_stream():
+            yield {"message": {"content": "[]"}, "done": False}
+            yield {"message": {"content": ""}, "done": True, "prompt_eval_count": 12, "eval_count": 3}
+
+        client.client.chat = AsyncMock(return_value=mock_stream())
+
+        # Act
+        result = [chunk async for chunk in client.stream_chat([{"role": "user", "content": "Hi"}])]
+
+        # Assert
+        assert result == ["[]"]
+        assert metrics.snapshot()["prompt_tokens"] == 12
+        assert metrics.snapshot()["completion_tokens"] == 3
+
+
 class TestGetResponse:
     """Test the main get_response function"""
 
@@ -244,10 +308,9 @@ class TestGetResponse:
         # Mock the llm_client
         async def mock_stream_chat(messages):
             # Verify system prompt was added
-            assert len(messages) == 2
             assert messages[0]["role"] == "system"
             assert "grocery list" in messages[0]["content"].lower()
-            assert messages[1] == user_messages[0]
+            assert messages[-1] == user_messages[0]
             yield "[]"
 
         with patch.object(llm.llm_client, 'stream_chat', side_effect=mock_stream_chat):
@@ -258,6 +321,7 @@ class TestGetResponse:
 
             # Assert
             assert len(result) == 1
+            assert user_messages == [{"role": "user", "content": "Add milk"}]
 
     @pytest.mark.asyncio
     async def test_get_response_streams_chunks(self):
@@ -314,10 +378,10 @@ class TestGetResponse:
 
         # Mock the llm_client
         async def mock_stream_chat(messages):
-            # Verify all messages are preserved
-            assert len(messages) == 4  # system + 3 user messages
+            # Verify all messages are preserved, with per-turn examples before the last one
             assert messages[0]["role"] == "system"
-            assert messages[1:] == user_messages
+            assert messages[1:3] == user_messages[:2]
+            assert [m for m in messages[3:] if m["role"] != "system"] == user_messages[2:]
             yield "[]"
 
         with patch.object(llm.llm_client, 'stream_chat', side_effect=mock_stream_chat):
@@ -352,6 +416,625 @@ class TestGetResponse:
             assert len(result) == 1
 
 
+class TestPromptMode:
+    """Test choosing between the static and dynamic system prompt"""
+
+    def test_dynamic_prompt_uses_last_user_message(self, monkeypatch):
+        """Test that examples are picked for the latest user turn and placed before it"""
+        # Arrange
+        monkeypatch.setattr(llm, "prompt_mode", "dynamic")
+        messages = [
+            {"role": "user", "content": "what time is it"},
+            {"role": "assistant", "content": "[]"},
+            {"role": "user", "content": "remove eggs"},
+        ]
+
+        # Act
+        request = llm.build_messages(messages)
+
+        # Assert
+        assert request[0]["content"] == prompts.CORE_PROMPT
+        assert request[-2]["role"] == "system"
+        assert "RemoveItem" in request[-2]["content"]
+        assert request[-1] == messages[-1]
+
+    def test_static_prompt(self, monkeypatch):
+        """Test that PROMPT_MODE=static keeps the full SYSTEM_PROMPT"""
+        # Arrange
+        monkeypatch.setattr(llm, "prompt_mode", "static")
+        messages = [{"role": "user", "content": "add milk"}]
+
+        # Act & Assert
+        assert llm.build_messages(messages) == [{"role": "system", "content": llm.SYSTEM_PROMPT}] + messages
+
+
+class TestCompactFormat:
+    """Test COMMAND_FORMAT=compact"""
+
+    @pytest.mark.asyncio
+    async def test_compact_output_is_returned_as_json(self, monkeypatch):
+        """Test that the compact prompt is sent and the answer decoded"""
+        # Arrange
+        monkeypatch.setattr(llm, "command_format", "compact")
+        sent = []
+
+        async def mock_stream_chat(messages):
+            sent.append(messages)
+            yield "A Milk\n"
+            yield "A Bread"
+
+        with patch.object(llm.llm_client, 'stream_chat', side_effect=mock_stream_chat):
+            # Act
+            result = "".join([chunk async for chunk in llm.get_response([{"role": "user", "content": "add milk and bread"}])])
+
+        # Assert
+        assert sent[0][0]["content"] == prompts.COMPACT_PROMPT
+        assert json.loads(result) == [
+            {"command": "AddItem", "value": "Milk"},
+            {"command": "AddItem", "value": "Bread"},
+        ]
+
+    def test_compact_history_in_request(self, monkeypatch):
+        """Test that earlier JSON answers are sent in the compact format"""
+        # Arrange
+        monkeypatch.setattr(llm, "command_format", "compact")
+        messages = [
+            {"role": "user", "content": "add milk"},
+            {"role": "assistant", "content": '[{"command": "AddItem", "value": "Milk"}]'},
+            {"role": "user", "content": "add eggs"},
+        ]
+
+        # Act
+        request = llm.build_messages(messages)
+
+        # Assert
+        assert request[2] == {"role": "assistant", "content": "A Milk"}
+        assert "Answer:\nA " in request[-2]["content"]
+
+
+class TestDecodingPresets:
+    """Test generation limits and decoding presets"""
+
+    def test_command_preset(self):
+        """Test that the command preset caps output and stops at the closing bracket"""
+        # Act
+        options = llm.decoding_options("command")
+
+        # Assert
+        assert options["max_tokens"] > 0
+        assert options["temperature"] == 0
+        assert options["stop"] == ["]"]
+
+    def test_environment_overrides(self, monkeypatch):
+        """Test that LLM_* and OLLAMA_* variables override the preset"""
+        # Arrange
+        monkeypatch.setenv("LLM_MAX_TOKENS", "64")
+        monkeypatch.setenv("LLM_STOP", "]|END")
+        monkeypatch.setenv("OLLAMA_NUM_CTX", "2048")
+
+        # Act
+        options = llm.decoding_options("default")
+
+        # Assert
+        assert options == {"max_tokens": 64, "stop": ["]", "END"], "num_ctx": 2048}
+
+    def test_unknown_preset(self):
+        """Test that a typo in LLM_PRESET fails at startup"""
+        # Act & Assert
+        with pytest.raises(ValueError):
+            llm.decoding_options("fast")
+
+    @pytest.mark.parametrize("text, expected", [
+        ('[{"command": "AddItem", "value": "Milk"}', "]"),
+        ("[", "]"),
+        ("[]", ""),
+        ("A Milk", ""),
+    ])
+    def test_closing_stop(self, text, expected):
+        """Test that only an array left open by the stop sequence is closed"""
+        # Act & Assert
+        assert llm.closing_stop(text, ["]"]) == expected
+
+    @pytest.mark.asyncio
+    async def test_chatgpt_sends_preset(self):
+        """Test the OpenAI parameter names and the restored closing bracket"""
+        # Arrange
+        client = llm.ChatGPTClient("gpt-4o-mini", "test-api-key", llm.decoding_options("command"))
+        chunk = MagicMock()
+        chunk.choices = [MagicMock()]
+        chunk.choices[0].delta.content = '[{"command": "AddItem", "value": "Milk"}'
+
+        async def mock_stream():
+            yield chunk
+
+        mock_create = AsyncMock(return_value=mock_stream())
+        client.client.chat.completions.create = mock_create
+
+        # Act
+        result = "".join([c async for c in client.stream_chat([{"role": "user", "content": "Add milk"}])])
+
+        # Assert
+        assert json.loads(result) == [{"command": "AddItem", "value": "Milk"}]
+        call_kwargs = mock_create.call_args.kwargs
+        assert call_kwargs["max_completion_tokens"] == 256
+        assert call_kwargs["temperature"] == 0
+        assert call_kwargs["seed"] == 42
+        assert call_kwargs["stop"] == ["]"]
+
+    @pytest.mark.asyncio
+    async def test_reasoning_model_skips_sampling_options(self):
+        """Test that temperature, seed and stop are not sent to models that reject them"""
+        # Arrange
+        client = llm.ChatGPTClient("gpt-5-mini", "test-api-key", llm.decoding_options("command"))
+        chunk = MagicMock()
+        chunk.choices = [MagicMock()]
+        chunk.choices[0].delta.content = '[{"command": "AddItem", "value": "Milk"}]'
+
+        async def mock_stream():
+            yield chunk
+
+        mock_create = AsyncMock(return_value=mock_stream())
+        client.client.chat.completions.create = mock_create
+
+        # Act
+        result = "".join([c async for c in client.stream_chat([{"role": "user", "content": "Add milk"}])])
+
+        # Assert
+        assert json.loads(result) == [{"command": "AddItem", "value": "Milk"}]
+        call_kwargs = mock_create.call_args.kwargs
+        assert call_kwargs["max_completion_tokens"] == 256
+        assert not {"temperature", "seed", "stop"} & call_kwargs.keys()
+
+    @pytest.mark.asyncio
+    async def test_ollama_sends_preset(self):
+        """Test the Ollama option names"""
+        # Arrange
+        client = llm.OllamaClient("llama2", options={"max_tokens": 96, "stop": ["]"], "num_ctx": 2048, "num_thread": 4})
+
+        async def mock_stream():
+            yield {"message": {"content": "[]"}, "done": True}
+
+        mock_chat = AsyncMock(return_value=mock_stream())
+        client.client.chat = mock_chat
+
+        # Act
+        result = [c async for c in client.stream_chat([{"role": "user", "content": "Hi"}])]
+
+        # Assert
+        assert result == ["[]"]
+        assert mock_chat.call_args.kwargs["options"] == {
+            "num_predict": 96, "stop": ["]"], "num_ctx": 2048, "num_thread": 4,
+        }
+
+
+class TestFormatGuard:
+    """Test aborting answers that start off-format"""
+
+    @pytest.mark.asyncio
+    async def test_retry_with_stricter_prompt(self, monkeypatch):
+        """Test that prose is aborted and asked for again with the format reminder"""
+        # Arrange
+        monkeypatch.setattr(llm, "format_guard_mode", "retry")
+        requests = []
+
+        async def mock_stream_chat(messages):
+            requests.append(messages)
+            if len(requests) == 1:
+                yield "Sure! Here is"
+                yield " your list"
+            else:
+                yield '[{"command": "AddItem", "value": "Milk"}]'
+
+        with patch.object(llm.llm_client, 'stream_chat', side_effect=mock_stream_chat):
+            # Act
+            result = [chunk async for chunk in llm.get_response([{"role": "user", "content": "Add milk"}])]
+
+        # Assert
+        assert "".join(result) == '[{"command": "AddItem", "value": "Milk"}]'
+        assert len(requests) == 2
+        assert requests[1][-2] == {"role": "system", "content": prompts.STRICT_REMINDER}
+        assert requests[1][-1] == {"role": "user", "content": "Add milk"}
+
+    @pytest.mark.asyncio
+    async def test_fallback_to_empty_commands(self, monkeypatch):
+        """Test that an off-format answer becomes [] without a retry in fallback mode"""
+        # Arrange
+        monkeypatch.setattr(llm, "format_guard_mode", "fallback")
+        calls = []
+
+        async def mock_stream_chat(messages):
+            calls.append(messages)
+            yield "I can't help with that"
+
+        with patch.object(llm.llm_client, 'stream_chat', side_effect=mock_stream_chat):
+            # Act
+            result = [chunk async for chunk in llm.get_response([{"role": "user", "content": "Hi"}])]
+
+        # Assert
+        assert result == ["[]"]
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_off_streams_everything(self, monkeypatch):
+        """Test that with the guard off prose is streamed as before"""
+        # Arrange
+        monkeypatch.setattr(llm, "format_guard_mode", "off")
+
+        async def mock_stream_chat(messages):
+            yield "Sure!"
+
+        with patch.object(llm.llm_client, 'stream_chat', side_effect=mock_stream_chat):
+            # Act
+            result = [chunk async for chunk in llm.get_response([{"role": "user", "content": "Hi"}])]
+
+        # Assert
+        assert result == ["Sure!"]
+
+
+class TestPooledClient:
+    """Test spreading requests over several hosts"""
+
+    def test_create_pooled_client(self):
+        """Test that a host list creates a pool of Ollama and OpenAI-compatible clients"""
+        # Act
+        client = llm.create_llm_client("ollama", "llama2", hosts=[("ollama", "http://gpu1:11434"), ("openai", "http://gpu2:8080/v1")])
+
+        # Assert
+        assert isinstance(client, llm.PooledClient)
+        assert isinstance(client.pool.hosts[0].client, llm.OllamaClient)
+        assert isinstance(client.pool.hosts[1].client, llm.ChatGPTClient)
+        assert str(client.pool.hosts[1].client.client.base_url).startswith("http://gpu2:8080/v1")
+
+    def test_openai_key_is_not_sent_to_compatible_hosts(self, monkeypatch):
+        """Test that OpenAI-compatible hosts only get OPENAI_COMPAT_API_KEY"""
+        # Arrange
+        monkeypatch.delenv("OPENAI_COMPAT_API_KEY", raising=False)
+
+        # Act
+        client = llm.create_llm_client("ollama", "llama2", "sk-secret", hosts=[("openai", "http://gpu2:8080/v1")])
+        monkeypatch.setenv("OPENAI_COMPAT_API_KEY", "local-key")
+        keyed = llm.create_llm_client("ollama", "llama2", "sk-secret", hosts=[("openai", "http://gpu2:8080/v1")])
+
+        # Assert
+        assert client.pool.hosts[0].client.client.api_key == "unused"
+        assert keyed.pool.hosts[0].client.client.api_key == "local-key"
+
+    @pytest.mark.asyncio
+    async def test_failed_requests_eject_host(self):
+        """Test that requests stop going to a host that keeps failing"""
+        # Arrange
+        client = llm.PooledClient("llama2", [("ollama", "http://gpu1:11434"), ("ollama", "http://gpu2:11434")])
+        client.pool.max_failures = 1
+        bad, good = client.pool.hosts
+
+        async def failing(messages):
+            raise ConnectionError("refused")
+            yield
+
+        async def working(messages):
+            yield "[]"
+
+        bad.client.stream_chat = failing
+        good.client.stream_chat = working
+
+        # Act
+        with pytest.raises(ConnectionError):
+            async for _ in client.stream_chat([]):
+                pass
+        result = [[chunk async for chunk in client.stream_chat([])] for _ in range(3)]
+
+        # Assert
+        assert result == [["[]"]] * 3
+        assert [host["requests"] for host in client.pool.snapshot()] == [1, 3]
+        assert all(host["in_flight"] == 0 for host in client.pool.snapshot())
+
+
+class TestFailoverClient:
+    """Test failing over between providers behind circuit breakers"""
+
+    def make_client(self, primary, fallback):
+        first = llm.OllamaClient("llama2")
+        second = llm.OllamaClient("llama3.2")
+        first.stream_chat = primary
+        second.stream_chat = fallback
+        return llm.FailoverClient(
+            [("ollama:llama2", first), ("ollama:llama3.2", second)],
+            {"min_requests": 2, "open_seconds": 30},
+        )
+
+    @pytest.mark.asyncio
+    async def test_fails_over_before_first_token(self):
+        """Test that a provider failing before its first token hands over to the next one"""
+        # Arrange
+        async def failing(messages):
+            raise ConnectionError("refused")
+            yield
+
+        async def working(messages):
+            yield "[]"
+
+        client = self.make_client(failing, working)
+
+        # Act
+        result = [chunk async for chunk in client.stream_chat([])]
+
+        # Assert
+        assert result == ["[]"]
+        assert [provider["calls"] for provider in client.snapshot()] == [1, 1]
+
+    @pytest.mark.asyncio
+    async def test_records_slo_samples(self):
+        """Test that every provider call is reported to the SLO controller"""
+        # Arrange
+        async def failing(messages):
+            raise ConnectionError("refused")
+            yield
+
+        async def working(messages):
+            yield "[]"
+
+        client = self.make_client(failing, working)
+        client.slo_controller = SLOController(min_samples=1)
+
+        # Act
+        [chunk async for chunk in client.stream_chat([])]
+
+        # Assert
+        providers = client.slo_controller.snapshot()["providers"]
+        assert providers["ollama:llama2"]["error_rate"] == 1.0
+        assert providers["ollama:llama3.2"]["error_rate"] == 0.0
+
+    @pytest.mark.asyncio
+    async def test_hung_provider_fails_over(self):
+        """Test that a provider sending no first token within the deadline counts as failed"""
+        # Arrange
+        async def hanging(messages):
+            await asyncio.sleep(60)
+            yield "late"
+
+        async def working(messages):
+            yield "[]"
+
+        client = self.make_client(hanging, working)
+        client.first_token_seconds = 0.05
+        client.slo_controller = SLOController(min_samples=1)
+
+        # Act
+        result = [chunk async for chunk in client.stream_chat([])]
+
+        # Assert
+        assert result == ["[]"]
+        assert client.snapshot()[0]["error_rate"] == 1.0
+        assert client.slo_controller.snapshot()["providers"]["ollama:llama2"]["error_rate"] == 1.0
+
+    def test_sdk_clients_have_timeouts(self):
+        """Test that both SDK clients are built with an explicit timeout"""
+        # Act
+        chatgpt = llm.ChatGPTClient("gpt-4o-mini", "key")
+        ollama = llm.OllamaClient("llama2")
+
+        # Assert
+        assert chatgpt.client.timeout == llm.request_timeout
+        assert ollama.client._client.timeout.read == llm.request_timeout
+
+    def test_openai_sdk_does_not_retry(self):
+        """Test that the OpenAI SDK leaves retries to the retry policy"""
+        # Act
+        client = llm.ChatGPTClient("gpt-4o-mini", "key")
+
+        # Assert
+        assert client.client.max_retries == 0
+
+    @pytest.mark.asyncio
+    async def test_open_breaker_skips_provider(self):
+        """Test that once the breaker opens the failing provider is not called at all"""
+        # Arrange
+        calls = []
+
+        async def failing(messages):
+            calls.append(1)
+            raise ConnectionError("refused")
+            yield
+
+        async def working(messages):
+            yield "[]"
+
+        client = self.make_client(failing, working)
+
+        # Act
+        for _ in range(4):
+            [chunk async for chunk in client.stream_chat([])]
+
+        # Assert
+        assert len(calls) == 2
+        assert client.snapshot()[0]["state"] == "open"
+
+    @pytest.mark.asyncio
+    async def test_error_after_first_token_is_raised(self):
+        """Test that a stream failing halfway is not replayed on another provider"""
+        # Arrange
+        async def breaking(messages):
+            yield "["
+            raise ConnectionError("reset")
+
+        async def working(messages):
+            yield "[]"
+
+        client = self.make_client(breaking, working)
+
+        # Act
+        result = []
+        with pytest.raises(ConnectionError):
+            async for chunk in client.stream_chat([]):
+                result.append(chunk)
+
+        # Assert
+        assert result == ["["]
+
+    @pytest.mark.asyncio
+    async def test_all_providers_unavailable(self):
+        """Test that get_response fails fast when every breaker is open"""
+        # Arrange
+        async def failing(messages):
+            raise ConnectionError("refused")
+            yield
+
+        client = self.make_client(failing, failing)
+        for _, _, breaker in client.providers:
+            for _ in range(2):
+                breaker.record(False, 0.1)
+
+        # Act
+        with patch.object(llm, "llm_client", client):
+            result = [chunk async for chunk in llm.get_response([{"role": "user", "content": "Add milk"}])]
+
+        # Assert
+        assert len(result) == 1
+        assert "All LLM providers are unavailable" in result[0]
+
+    @pytest.mark.asyncio
+    async def test_retries_before_failing_over(self, monkeypatch):
+        """Test that a transient error is retried on the same provider first"""
+        # Arrange
+        monkeypatch.setattr(llm.retry.random, "uniform", lambda low, high: 0)
+        calls = []
+
+        async def blip(messages):
+            calls.append(1)
+            if len(calls) == 1:
+                raise ConnectionResetError("reset by peer")
+            yield "[]"
+
+        async def fallback(messages):
+            yield "fallback"
+
+        client = self.make_client(blip, fallback)
+        client.retry_policy = llm.retry.RetryPolicy(base_delay=0)
+
+        # Act
+        result = [chunk async for chunk in client.stream_chat([])]
+
+        # Assert
+        assert result == ["[]"]
+        assert len(calls) == 2
+        assert client.snapshot()[0]["error_rate"] == 0.0
+
+    def test_parse_providers(self):
+        """Test reading the fallback chain"""
+        # Act & Assert
+        assert llm.parse_providers("ollama:llama3.2, chatgpt:gpt-5-mini@default") == [
+            ("ollama", "llama3.2", None), ("chatgpt", "gpt-5-mini", "default")
+        ]
+        with pytest.raises(ValueError):
+            llm.parse_providers("ollama")
+
+
+class TestTieredClient:
+    """Test routing requests between model tiers"""
+
+    def make_client(self, small_answer, classifier=None):
+        small = llm.OllamaClient("llama3.2:1b")
+        large = llm.OllamaClient("llama3.1:8b")
+        calls = []
+
+        async def small_stream(messages):
+            calls.append("small")
+            yield small_answer
+
+        async def large_stream(messages):
+            calls.append("large")
+            yield '[{"command": "AddItem", "value": "Milk"}]'
+
+        small.stream_chat = small_stream
+        large.stream_chat = large_stream
+        client = llm.TieredClient([("llama3.2:1b", small), ("llama3.1:8b", large)], max_words=6, classifier=classifier)
+        return client, calls
+
+    @pytest.mark.asyncio
+    async def test_simple_command_uses_small_model(self):
+        """Test that a valid small model answer is returned"""
+        # Arrange
+        client, calls = self.make_client('[{"command": "AddItem", "value": "Eggs"}]')
+
+        # Act
+        result = [chunk async for chunk in client.stream_chat([{"role": "user", "content": "Add eggs"}])]
+
+        # Assert
+        assert result == ['[{"command": "AddItem", "value": "Eggs"}]']
+        assert calls == ["small"]
+
+    @pytest.mark.asyncio
+    async def test_invalid_answer_escalates(self):
+        """Test that an invalid small model answer is replaced by the large model's"""
+        # Arrange
+        client, calls = self.make_client("Sure, milk it is!")
+
+        # Act
+        result = [chunk async for chunk in client.stream_chat([{"role": "user", "content": "Add milk"}])]
+
+        # Assert
+        assert "".join(result) == '[{"command": "AddItem", "value": "Milk"}]'
+        assert calls == ["small", "large"]
+
+    @pytest.mark.asyncio
+    async def test_long_utterance_skips_small_model(self):
+        """Test that long utterances go straight to the large model"""
+        # Arrange
+        client, calls = self.make_client("[]")
+        message = "plan groceries for a week of vegetarian dinners"
+
+        # Act
+        [chunk async for chunk in client.stream_chat([{"role": "user", "content": message}])]
+
+        # Assert
+        assert calls == ["large"]
+
+    def test_create_tiered_client(self):
+        """Test that the factory builds one client per tier"""
+        # Act
+        client = llm.create_llm_client("ollama", "llama3.1:8b", tiers=["llama3.2:1b", "llama3.1:8b"])
+
+        # Assert
+        assert isinstance(client, llm.TieredClient)
+        assert [tier.model for _, tier in client.tiers] == ["llama3.2:1b", "llama3.1:8b"]
+
+    def test_tiers_share_one_host_pool(self):
+        """Test that tiers on OLLAMA_HOSTS share the hosts, their counters and health checks"""
+        # Act
+        client = llm.create_llm_client("ollama", "llama3.1:8b", tiers=["llama3.2:1b", "llama3.1:8b"],
+                                       hosts=[("ollama", "http://gpu1:11434"), ("ollama", "http://gpu2:11434")])
+
+        # Assert
+        small, large = [tier for _, tier in client.tiers]
+        assert small.pool is large.pool
+        assert [c.model for c in small.clients.values()] == ["llama3.2:1b"] * 2
+        assert [c.model for c in large.clients.values()] == ["llama3.1:8b"] * 2
+        assert small.clients["http://gpu1:11434"].client is large.clients["http://gpu1:11434"].client
+
+    @pytest.mark.asyncio
+    async def test_failover_times_the_tier_first_token(self):
+        """Test that the SLO sees when the small model started answering, not when it finished"""
+        # Arrange
+        client, _ = self.make_client("[]")
+        small = client.tiers[0][1]
+
+        async def slow_stream(messages):
+            yield "["
+            await asyncio.sleep(0.2)
+            yield "]"
+
+        small.stream_chat = slow_stream
+        failover = llm.FailoverClient([("ollama:tiers", client)], first_token_seconds=0.1,
+                                      slo_controller=SLOController(min_samples=1))
+
+        # Act
+        result = [chunk async for chunk in failover.stream_chat([{"role": "user", "content": "Add milk"}])]
+
+        # Assert
+        assert result == ["[]"]
+        assert failover.slo_controller.snapshot()["providers"]["ollama:tiers"]["p95_ttft_seconds"] < 0.1
+
+
 class TestSystemPrompt:
     """Test the system prompt configuration"""
 
@@ -0,0 +1,259 @@
+"""
+Tests for the llama.cpp worker protocol, with a fake model served from a thread
+"""
+import asyncio
+import multiprocessing
+import threading
+import time
+import pytest
+import local_llm
+import llm
+
+
+class FakeModel:
+    """Stands in for llama_cpp.Llama"""
+
+    def __init__(self, tokens=("[", "]"), delay=0.0):
+        self.tokens = tokens
+        self.delay = delay
+        self.requests = []
+
+    def create_chat_completion(self, messages, stream, **options):
+        self.requests.append((messages, options))
+        yield {"choices": [{"delta": {"role": "assistant"}}]}
+        for token in self.tokens:
+            time.sleep(self.delay)
+            if token == "boom":
+                raise ValueError("context window exceeded")
+            yield {"choices": [{"delta": {"content": token}}]}
+
+
+class ThreadPool(local_llm.WorkerPool):
+    """Serves the fake model from threads instead of processes"""
+
+    def __init__(self, model, workers=1):
+        super().__init__({"model_path": "fake.gguf"}, workers)
+        self.model = model
+
+    def _start_worker(self):
+        conn, child = multiprocessing.Pipe()
+        child.send(("ready", None))
+        threading.Thread(target=local_llm.serve, args=(child, self.model), daemon=True).start()
+        return conn
+
+
+class CrashingPool(ThreadPool):
+    """The first workers die after their first token, like a process killed by the OOM killer"""
+
+    def __init__(self, model, crashes=1, broken_restarts=False):
+        super().__init__(model)
+        self.crashes = crashes
+        self.broken_restarts = broken_restarts
+        self.started = 0
+
+    def _start_worker(self):
+        self.started += 1
+        if self.started > self.crashes and not self.broken_restarts:
+            return super()._start_worker()
+        conn, child = multiprocessing.Pipe()
+        if self.started > self.crashes:
+            child.send(("error", "model file is gone"))
+            return conn
+        child.send(("ready", None))
+
+        def crash():
+            child.recv()
+            child.send(("token", "["))
+            child.close()
+
+        threading.Thread(target=crash, daemon=True).start()
+        return conn
+
+
+class FailingStartPool(ThreadPool):
+    """The second worker of the first start cannot load its model"""
+
+    def __init__(self, model, workers=2):
+        super().__init__(model, workers)
+        self.conns = []
+        self.terminated = 0
+
+    def _start_worker(self):
+        pool = self
+
+        class Process:
+            def terminate(self):
+                pool.terminated += 1
+
+        self._processes.append(Process())
+        if len(self.conns) == 1:
+            conn, child = multiprocessing.Pipe()
+            child.send(("error", "out of memory"))
+        else:
+            conn = super()._start_worker()
+        self.conns.append(conn)
+        return conn
+
+
+class TestWorkerPool:
+    """Test streaming tokens from a worker over its pipe"""
+
+    @pytest.mark.asyncio
+    async def test_streams_tokens(self):
+        """Test that tokens arrive in order and options reach the model"""
+        # Arrange
+        model = FakeModel(tokens=("[{", '"command": "AddItem"', "}]"))
+        pool = ThreadPool(model)
+
+        # Act
+        result = [token async for token in pool.generate([{"role": "user", "content": "Add milk"}], {"max_tokens": 64})]
+
+        # Assert
+        assert result == ["[{", '"command": "AddItem"', "}]"]
+        assert model.requests == [([{"role": "user", "content": "Add milk"}], {"max_tokens": 64})]
+
+    @pytest.mark.asyncio
+    async def test_error_is_raised(self):
+        """Test that a failed generation raises and the worker stays usable"""
+        # Arrange
+        pool = ThreadPool(FakeModel(tokens=("[", "boom")))
+
+        # Act
+        with pytest.raises(RuntimeError, match="context window exceeded"):
+            async for _ in pool.generate([], {}):
+                pass
+        pool.model.tokens = ("[]",)
+        result = [token async for token in pool.generate([], {})]
+
+        # Assert
+        assert result == ["[]"]
+
+    @pytest.mark.asyncio
+    async def test_cancel_frees_worker(self):
+        """Test that a caller stopping early cancels the generation and the worker serves the next request"""
+        # Arrange
+        model = FakeModel(tokens=[str(i) for i in range(200)], delay=0.001)
+        pool = ThreadPool(model)
+
+        # Act
+        stream = pool.generate([], {})
+        first = await stream.__anext__()
+        await stream.aclose()
+        model.tokens, model.delay = ("[]",), 0
+        result = await asyncio.wait_for(_collect(pool.generate([], {})), 5)
+
+        # Assert
+        assert first == "0"
+        assert result == ["[]"]
+
+    @pytest.mark.asyncio
+    async def test_requests_share_workers(self):
+        """Test that concurrent requests wait for a free worker"""
+        # Arrange
+        pool = ThreadPool(FakeModel(tokens=("[", "]"), delay=0.01), workers=2)
+
+        # Act
+        results = await asyncio.gather(*(_collect(pool.generate([], {})) for _ in range(4)))
+
+        # Assert
+        assert results == [["[", "]"]] * 4
+
+
+    @pytest.mark.asyncio
+    async def test_crashed_worker_is_replaced(self):
+        """Test that a worker dying mid-generation fails that request and a new worker serves the next"""
+        # Arrange
+        pool = CrashingPool(FakeModel(tokens=("[]",)), crashes=1)
+
+        # Act
+        with pytest.raises(RuntimeError, match="worker died"):
+            await _collect(pool.generate([], {}))
+        result = await asyncio.wait_for(_collect(pool.generate([], {})), 5)
+
+        # Assert
+        assert result == ["[]"]
+        assert pool.started == 2
+
+    @pytest.mark.asyncio
+    async def test_idle_worker_that_died_is_replaced(self):
+        """Test that a worker that died between requests is detected on send and replaced"""
+        # Arrange
+        pool = ThreadPool(FakeModel(tokens=("[]",)))
+        await _collect(pool.generate([], {}))
+        dead = pool._idle.get_nowait()
+        dead.close()
+        conn, child = multiprocessing.Pipe()
+        child.close()
+        pool._idle.put_nowait(local_llm.Channel(conn))
+
+        # Act
+        with pytest.raises(RuntimeError, match="worker died"):
+            await _collect(pool.generate([], {}))
+        result = await asyncio.wait_for(_collect(pool.generate([], {})), 5)
+
+        # Assert
+        assert result == ["[]"]
+
+    @pytest.mark.asyncio
+    async def test_failed_restart_raises_instead_of_hanging(self):
+        """Test that when a replacement worker cannot load, requests fail with its error"""
+        # Arrange
+        pool = CrashingPool(FakeModel(tokens=("[]",)), crashes=1, broken_restarts=True)
+
+        # Act
+        with pytest.raises(RuntimeError, match="worker died"):
+            await _collect(pool.generate([], {}))
+
+        # Assert
+        with pytest.raises(RuntimeError, match="model file is gone"):
+            await asyncio.wait_for(_collect(pool.generate([], {})), 5)
+
+
+    @pytest.mark.asyncio
+    async def test_failed_start_is_retried_and_cleaned_up(self):
+        """Test that a start that fails stops the workers it started and the next request starts over"""
+        # Arrange
+        pool = FailingStartPool(FakeModel(tokens=("[]",)), workers=2)
+
+        # Act
+        with pytest.raises(RuntimeError, match="out of memory"):
+            await _collect(pool.generate([], {}))
+        result = await asyncio.wait_for(_collect(pool.generate([], {})), 5)
+
+        # Assert
+        assert result == ["[]"]
+        assert pool.terminated == 2
+        assert pool._starting is not None and pool._starting.done()
+
+
+async def _collect(stream):
+    return [token async for token in stream]
+
+
+class TestLlamaCppClient:
+    """Test the LLM client on top of the worker pool"""
+
+    def test_requires_llama_cpp(self, monkeypatch):
+        """Test a clear error when llama-cpp-python is missing"""
+        # Arrange
+        monkeypatch.setattr(local_llm, "available", lambda: False)
+
+        # Act & Assert
+        with pytest.raises(RuntimeError, match="llama-cpp-python"):
+            llm.LlamaCppClient("model.gguf")
+
+    @pytest.mark.asyncio
+    async def test_stream_chat(self, monkeypatch):
+        """Test that decoding options are passed and the cut-off ] is restored"""
+        # Arrange
+        monkeypatch.setattr(local_llm, "available", lambda: True)
+        client = llm.LlamaCppClient("model.gguf", {"max_tokens": 256, "stop": ["]"], "num_ctx": 4096}, workers=2)
+        model = FakeModel(tokens=('[{"command": "AddItem", "value": "Milk"}',))
+        client.pool = ThreadPool(model)
+
+        # Act
+        result = [chunk async for chunk in client.stream_chat([{"role": "user", "content": "Add milk"}])]
+
+        # Assert
+        assert "".join(result) == '[{"command": "AddItem", "value": "Milk"}]'
+        assert model.requests[0][1] == {"max_tokens": 256, "stop": ["]"]}
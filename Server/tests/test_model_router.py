@@ -0,0 +1,80 @@
+"""
+Tests for routing utterances between small and large models
+"""
+import pytest
+from model_router import TierMetrics, escalation_reason, is_valid_output
+
+
+class FakeClassifier:
+    def __init__(self, intent, confidence):
+        self.result = (intent, confidence)
+
+    def predict(self, text):
+        return self.result
+
+
+class TestEscalationReason:
+    """Test deciding which utterances need the large model"""
+
+    def test_short_command_stays_small(self):
+        """Test that a two-word command goes to the small model"""
+        # Act & Assert
+        assert escalation_reason("add milk", 12) is None
+
+    def test_long_utterance(self):
+        """Test that long utterances escalate"""
+        # Act & Assert
+        assert escalation_reason("plan groceries for a week of vegetarian dinners with two kids and a guest", 12) == "length"
+
+    @pytest.mark.parametrize("intent, confidence, expected", [
+        ("complex", 0.9, "complex"),
+        ("add", 0.3, "uncertain"),
+        ("add", 0.9, None),
+        ("out_of_scope", 0.8, None),
+    ])
+    def test_classifier(self, intent, confidence, expected):
+        """Test that complex or uncertain classifications escalate"""
+        # Act & Assert
+        assert escalation_reason("add milk", 12, FakeClassifier(intent, confidence), 0.5) == expected
+
+
+class TestIsValidOutput:
+    """Test validating a small model's answer"""
+
+    @pytest.mark.parametrize("text, expected", [
+        ('[{"command": "AddItem", "value": "Milk"}]', True),
+        ('```json\n[{"command": "CheckItem", "value": "Bread"}]\n```', True),
+        ("[]", True),
+        ("A Milk\nC Bread", True),
+        ("-", True),
+        ('[{"command": "AddItem", "value": "Milk"}', False),
+        ('[{"command": "BuyItem", "value": "Milk"}]', False),
+        ('[{"command": "AddItem"}]', False),
+        ("Sure! I added milk.", False),
+        ("", False),
+    ])
+    def test_is_valid_output(self, text, expected):
+        """Test JSON and compact answers"""
+        # Act & Assert
+        assert is_valid_output(text) is expected
+
+
+class TestTierMetrics:
+    """Test per-tier latency and escalation rates"""
+
+    def test_snapshot(self):
+        """Test averages and rates per tier"""
+        # Arrange
+        metrics = TierMetrics()
+
+        # Act
+        metrics.record("small", 0.2)
+        metrics.record("small", 0.4, escalated=True)
+        metrics.record("large", 1.5)
+        metrics.record_route("length")
+
+        # Assert
+        snapshot = metrics.snapshot()
+        assert snapshot["tiers"]["small"] == {"requests": 2, "avg_seconds": pytest.approx(0.3), "escalation_rate": 0.5}
+        assert snapshot["tiers"]["large"]["avg_seconds"] == 1.5
+        assert snapshot["routed"] == {"length": 1}
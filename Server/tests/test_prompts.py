@@ -0,0 +1,197 @@
+"""
+Tests for the few-shot system prompt builder
+"""
+import pytest
+from prompts import (
+    CORE_PROMPT, ExampleBank, PromptMetrics, assemble_messages, build_examples, example_bank, prefix_key,
+)
+import llm
+
+EXAMPLES = [
+    {"text": "add milk", "lang": "en", "intent": "add", "commands": [{"command": "AddItem", "value": "Milk"}]},
+    {"text": "add eggs to the list", "lang": "en", "intent": "add", "commands": [{"command": "AddItem", "value": "Eggs"}]},
+    {"text": "please add bread", "lang": "en", "intent": "add", "commands": [{"command": "AddItem", "value": "Bread"}]},
+    {"text": "remove milk", "lang": "en", "intent": "remove", "commands": [{"command": "RemoveItem", "value": "Milk"}]},
+    {"text": "adiciona leite", "lang": "pt", "intent": "add", "commands": [{"command": "AddItem", "value": "Leite"}]},
+    {"text": "remove it", "lang": "en", "intent": "complex"},
+]
+
+
+class TestExampleBank:
+    """Test the ExampleBank class"""
+
+    def test_examples_without_commands_are_skipped(self):
+        """Test that only examples with an answer can be used as shots"""
+        # Act
+        bank = ExampleBank(EXAMPLES)
+
+        # Assert
+        assert len(bank.examples) == 5
+
+    def test_matches_phrasing_not_item_names(self):
+        """Test that the verb drives the selection rather than the item"""
+        # Arrange
+        bank = ExampleBank(EXAMPLES)
+
+        # Act
+        selected = bank.select("remove cheese", k=1)
+
+        # Assert
+        assert selected[0]["text"] == "remove milk"
+
+    def test_selects_examples_in_the_utterance_language(self):
+        """Test that Portuguese utterances get Portuguese examples"""
+        # Arrange
+        bank = ExampleBank(EXAMPLES)
+
+        # Act
+        selected = bank.select("adiciona ovos", k=3)
+
+        # Assert
+        assert [example["lang"] for example in selected] == ["pt"]
+
+    def test_caps_examples_per_intent(self):
+        """Test that at most two examples of one intent are taken"""
+        # Arrange
+        bank = ExampleBank(EXAMPLES)
+
+        # Act
+        selected = bank.select("please add apples to the list", k=3)
+
+        # Assert
+        assert [example["intent"] for example in selected] == ["add", "add"]
+
+    def test_unrelated_utterance_selects_nothing(self):
+        """Test that no examples are forced into the prompt"""
+        # Act & Assert
+        assert ExampleBank(EXAMPLES).select("xyz", k=3) == []
+
+
+class TestBuildExamples:
+    """Test the per-turn examples block"""
+
+    def test_includes_relevant_examples(self):
+        """Test that the block has the requested number of examples"""
+        # Act
+        block = build_examples("add milk", k=2)
+
+        # Assert
+        assert block.startswith("Examples:\n")
+        assert block.count("Request: ") == 2
+        assert "AddItem" in block
+
+    def test_core_and_examples_are_smaller_than_the_static_prompt(self):
+        """Test that a one-word command costs fewer prompt characters"""
+        # Act & Assert
+        assert len(CORE_PROMPT) + len(build_examples("add milk")) < len(llm.SYSTEM_PROMPT)
+
+    def test_unrelated_utterance_has_no_block(self):
+        """Test that no examples are forced into the prompt"""
+        # Act & Assert
+        assert build_examples("xyz") is None
+
+    def test_bundled_bank_is_loaded(self):
+        """Test that the default example bank has examples in both languages"""
+        # Act & Assert
+        assert {example["lang"] for example in example_bank.examples} == {"en", "pt"}
+
+
+class TestAssembleMessages:
+    """Test the stable-prefix request layout"""
+
+    def test_volatile_blocks_go_before_last_user_message(self):
+        """Test the layout of a multi-turn request"""
+        # Arrange
+        messages = [
+            {"role": "user", "content": "add milk"},
+            {"role": "assistant", "content": "[]"},
+            {"role": "user", "content": "add eggs"},
+        ]
+
+        # Act
+        request = assemble_messages("prefix", messages, ["examples"])
+
+        # Assert
+        assert request == [
+            {"role": "system", "content": "prefix"},
+            messages[0],
+            messages[1],
+            {"role": "system", "content": "examples"},
+            messages[2],
+        ]
+
+    def test_consecutive_turns_share_the_prefix(self):
+        """Test that a turn's request starts with the previous turn's history"""
+        # Arrange
+        first = [{"role": "user", "content": "add milk"}]
+        second = first + [{"role": "assistant", "content": "[]"}, {"role": "user", "content": "add eggs"}]
+
+        # Act
+        first_request = assemble_messages("prefix", first, ["examples for milk"])
+        second_request = assemble_messages("prefix", second, ["examples for eggs"])
+
+        # Assert
+        shared = [first_request[0], first[0]]
+        assert second_request[:2] == shared
+
+    def test_does_not_modify_the_callers_list(self):
+        """Test that the caller's messages are left as they were"""
+        # Arrange
+        messages = [{"role": "user", "content": "add milk"}]
+
+        # Act
+        assemble_messages("prefix", messages, ["examples"])
+
+        # Assert
+        assert messages == [{"role": "user", "content": "add milk"}]
+
+    def test_without_user_message(self):
+        """Test that volatile blocks are appended when there is no user turn"""
+        # Act & Assert
+        assert assemble_messages("prefix", [], ["examples"]) == [
+            {"role": "system", "content": "prefix"},
+            {"role": "system", "content": "examples"},
+        ]
+
+    def test_prefix_key_is_versioned_and_stable(self):
+        """Test that the same prefix always maps to the same key"""
+        # Act & Assert
+        assert prefix_key(CORE_PROMPT) == prefix_key(CORE_PROMPT)
+        assert prefix_key(CORE_PROMPT).startswith("grocery-v")
+        assert prefix_key(CORE_PROMPT) != prefix_key(CORE_PROMPT + " ")
+
+
+class TestPromptMetrics:
+    """Test the PromptMetrics class"""
+
+    def test_record_and_snapshot(self):
+        """Test that prompt sizes are tracked per request and on average"""
+        # Arrange
+        metrics = PromptMetrics()
+
+        # Act
+        size = metrics.record([{"role": "system", "content": "x" * 40}, {"role": "user", "content": "add milk"}])
+        metrics.record([{"role": "system", "content": "x" * 20}])
+
+        # Assert
+        assert size == {"system_chars": 40, "total_chars": 48, "estimated_tokens": 12}
+        snapshot = metrics.snapshot()
+        assert snapshot["requests"] == 2
+        assert snapshot["avg_system_chars"] == 30
+        assert snapshot["avg_total_chars"] == 34
+
+    def test_record_usage(self):
+        """Test that provider token counts give the cached share of prompt tokens"""
+        # Arrange
+        metrics = PromptMetrics()
+
+        # Act
+        metrics.record_usage(100, 80, 10)
+        metrics.record_usage(100, None, 12)
+
+        # Assert
+        snapshot = metrics.snapshot()
+        assert snapshot["prompt_tokens"] == 200
+        assert snapshot["cached_tokens"] == 80
+        assert snapshot["completion_tokens"] == 22
+        assert snapshot["cached_ratio"] == 0.4
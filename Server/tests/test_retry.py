@@ -0,0 +1,181 @@
+"""
+Tests for retrying transient provider errors before the first token
+"""
+import httpx
+import ollama
+import openai
+import pytest
+from unittest.mock import patch
+import retry
+from retry import RetryMetrics, RetryPolicy, is_transient, retry_after, stream_with_retry
+
+
+def rate_limit_error(headers=None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, headers=headers or {}, request=request)
+    return openai.RateLimitError("Rate limit reached", response=response, body=None)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep():
+    async def sleep(seconds):
+        pass
+
+    with patch.object(retry.asyncio, "sleep", side_effect=sleep) as mock_sleep:
+        yield mock_sleep
+
+
+def flaky(failures, error=None):
+    """A stream_chat that fails `failures` times before answering"""
+    calls = []
+
+    async def stream_chat(messages):
+        calls.append(messages)
+        if len(calls) <= failures:
+            raise error or ollama.ResponseError("overloaded", 503)
+        yield "["
+        yield "]"
+
+    return stream_chat, calls
+
+
+class TestTransientErrors:
+    """Test telling transient errors from permanent ones"""
+
+    @pytest.mark.parametrize("error, expected", [
+        (ollama.ResponseError("overloaded", 503), True),
+        (ollama.ResponseError("too many requests", 429), True),
+        (ollama.ResponseError("model not found", 404), False),
+        (httpx.ConnectError("connection refused"), True),
+        (ConnectionResetError("reset by peer"), True),
+        (ValueError("bad request"), False),
+    ])
+    def test_is_transient(self, error, expected):
+        """Test which errors are retried"""
+        # Act & Assert
+        assert is_transient(error) is expected
+
+    def test_openai_rate_limit(self):
+        """Test that an OpenAI 429 is retried after its Retry-After"""
+        # Arrange
+        error = rate_limit_error({"retry-after": "2"})
+
+        # Act & Assert
+        assert is_transient(error) is True
+        assert retry_after(error) == 2.0
+
+    def test_no_retry_after(self):
+        """Test errors without a Retry-After header"""
+        # Act & Assert
+        assert retry_after(rate_limit_error()) is None
+        assert retry_after(ValueError("bad")) is None
+
+
+class TestRetryPolicy:
+    """Test the backoff delays"""
+
+    def test_jittered_exponential_backoff(self):
+        """Test that delays stay within the doubling, capped bound"""
+        # Arrange
+        policy = RetryPolicy(base_delay=0.5, max_delay=1.5)
+        error = ConnectionError("reset")
+
+        # Act
+        delays = [[policy.delay(retry_number, error) for _ in range(50)] for retry_number in (1, 2, 3)]
+
+        # Assert
+        assert max(delays[0]) <= 0.5
+        assert max(delays[1]) <= 1.0
+        assert max(delays[2]) <= 1.5
+        assert len(set(delays[2])) > 1
+
+    def test_retry_after_wins(self):
+        """Test that the provider's Retry-After replaces the backoff"""
+        # Act & Assert
+        assert RetryPolicy().delay(1, rate_limit_error({"retry-after": "3"})) == 3.0
+
+
+class TestStreamWithRetry:
+    """Test retrying a stream"""
+
+    @pytest.mark.asyncio
+    async def test_recovers_from_transient_errors(self):
+        """Test that a provider blip is retried and the answer streamed"""
+        # Arrange
+        stream_chat, calls = flaky(2)
+        metrics = RetryMetrics()
+
+        # Act
+        result = [chunk async for chunk in stream_with_retry(stream_chat, [], RetryPolicy(), metrics)]
+
+        # Assert
+        assert result == ["[", "]"]
+        assert len(calls) == 3
+        assert metrics.snapshot()["retries"] == 2
+        assert metrics.snapshot()["recovered"] == 1
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_attempts(self):
+        """Test that the last error is raised once the attempts are used up"""
+        # Arrange
+        stream_chat, calls = flaky(5)
+        metrics = RetryMetrics()
+
+        # Act
+        with pytest.raises(ollama.ResponseError):
+            async for _ in stream_with_retry(stream_chat, [], RetryPolicy(max_attempts=3), metrics):
+                pass
+
+        # Assert
+        assert len(calls) == 3
+        assert metrics.snapshot()["exhausted"] == 1
+
+    @pytest.mark.asyncio
+    async def test_retry_after_beyond_budget(self, no_sleep):
+        """Test that a Retry-After longer than the budget is not waited for"""
+        # Arrange
+        stream_chat, calls = flaky(1, rate_limit_error({"retry-after": "60"}))
+
+        # Act
+        with pytest.raises(openai.RateLimitError):
+            async for _ in stream_with_retry(stream_chat, [], RetryPolicy(budget_seconds=10), RetryMetrics()):
+                pass
+
+        # Assert
+        assert len(calls) == 1
+        no_sleep.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_permanent_error_is_not_retried(self):
+        """Test that errors like a missing model fail at once"""
+        # Arrange
+        stream_chat, calls = flaky(1, ollama.ResponseError("model not found", 404))
+
+        # Act
+        with pytest.raises(ollama.ResponseError):
+            async for _ in stream_with_retry(stream_chat, [], RetryPolicy(), RetryMetrics()):
+                pass
+
+        # Assert
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_no_retry_after_first_token(self):
+        """Test that an error after output was streamed is raised as is"""
+        # Arrange
+        calls = []
+
+        async def stream_chat(messages):
+            calls.append(messages)
+            yield "["
+            raise ConnectionResetError("reset by peer")
+
+        # Act
+        result = []
+        with pytest.raises(ConnectionResetError):
+            async for chunk in stream_with_retry(stream_chat, [], RetryPolicy(), RetryMetrics()):
+                result.append(chunk)
+
+        # Assert
+        assert result == ["["]
+        assert len(calls) == 1
@@ -0,0 +1,76 @@
+"""
+Tests for the fast item list encoders
+"""
+import pytest
+import orjson
+from datetime import datetime
+import serialization
+from serialization import (
+    JSON_MEDIA_TYPE, MSGPACK_MEDIA_TYPE, negotiate_media_type, rows_to_items, encode_items,
+)
+
+ROWS = [
+    (1, "Milk", False, datetime(2025, 1, 1, 10, 0, 0), datetime(2025, 1, 1, 10, 5, 0)),
+    (2, "Bread", True, datetime(2025, 1, 2, 9, 0, 0), datetime(2025, 1, 2, 9, 0, 0)),
+]
+
+
+class TestNegotiateMediaType:
+    """Test Accept header negotiation"""
+
+    def test_defaults_to_json(self):
+        """Test that missing or generic Accept headers get JSON"""
+        assert negotiate_media_type(None) == JSON_MEDIA_TYPE
+        assert negotiate_media_type("*/*") == JSON_MEDIA_TYPE
+        assert negotiate_media_type("application/json") == JSON_MEDIA_TYPE
+
+    def test_msgpack_when_requested(self):
+        """Test that MessagePack is chosen when asked for"""
+        pytest.importorskip("msgpack")
+
+        assert negotiate_media_type("application/x-msgpack") == MSGPACK_MEDIA_TYPE
+        assert negotiate_media_type("application/msgpack, application/json;q=0.5") == MSGPACK_MEDIA_TYPE
+
+    def test_json_when_msgpack_not_installed(self, monkeypatch):
+        """Test falling back to JSON without the optional dependency"""
+        monkeypatch.setattr(serialization, "msgpack", None)
+
+        assert negotiate_media_type("application/x-msgpack") == JSON_MEDIA_TYPE
+
+
+class TestEncodeItems:
+    """Test item list encoding"""
+
+    def test_rows_to_items(self):
+        """Test that column tuples map to the public item shape"""
+        items = rows_to_items(ROWS)
+
+        assert items[0] == {
+            "id": 1,
+            "description": "Milk",
+            "checked": False,
+            "created_at": ROWS[0][3],
+            "updated_at": ROWS[0][4],
+        }
+
+    def test_encode_json_matches_to_dict_format(self):
+        """Test that JSON output uses the same timestamp format as Item.to_dict"""
+        body = encode_items(rows_to_items(ROWS))
+
+        decoded = orjson.loads(body)
+        assert decoded[0]["created_at"] == ROWS[0][3].isoformat()
+        assert decoded[1]["checked"] == True
+
+    def test_encode_empty_list(self):
+        """Test encoding an empty list"""
+        assert encode_items([]) == b"[]"
+
+    def test_encode_msgpack(self):
+        """Test MessagePack output round-trips"""
+        msgpack = pytest.importorskip("msgpack")
+
+        body = encode_items(rows_to_items(ROWS), MSGPACK_MEDIA_TYPE)
+
+        decoded = msgpack.unpackb(body)
+        assert decoded[1]["description"] == "Bread"
+        assert decoded[1]["updated_at"] == ROWS[1][4].isoformat()
@@ -0,0 +1,140 @@
+"""
+Tests for SLO tracking and the degradation mode
+"""
+import pytest
+import slo
+from slo import SLOController, llm_allowed
+
+
+def fill(controller: SLOController, provider: str, ok: bool, seconds: float, count: int = 5):
+    for _ in range(count):
+        controller.record(provider, ok, seconds)
+
+
+class TestSLOController:
+    """Test stepping the degradation mode up and down"""
+
+    def test_starts_normal(self):
+        """Test that without samples the service is not degraded"""
+        # Act
+        controller = SLOController()
+
+        # Assert
+        assert controller.evaluate() == "normal"
+
+    def test_too_few_samples_do_not_degrade(self):
+        """Test that a couple of failures are not enough to judge a provider"""
+        # Arrange
+        controller = SLOController(min_samples=5, step_seconds=0)
+
+        # Act
+        fill(controller, "ollama:llama2", False, 0.1, count=4)
+
+        # Assert
+        assert controller.mode == "normal"
+
+    def test_steps_up_one_level_at_a_time(self):
+        """Test that a failing provider degrades the mode by one step per step_seconds"""
+        # Arrange
+        controller = SLOController(step_seconds=60)
+
+        # Act
+        fill(controller, "ollama:llama2", False, 0.1)
+
+        # Assert
+        assert controller.mode == "cache_first"
+        controller.changed_at -= 60
+        assert controller.evaluate() == "fast_path_only"
+        assert controller.evaluate() == "fast_path_only"
+
+    def test_slow_provider_degrades(self):
+        """Test that a p95 time to first token over the threshold counts as a miss"""
+        # Arrange
+        controller = SLOController(ttft_p95_seconds=1.0, step_seconds=0)
+
+        # Act
+        fill(controller, "ollama:llama2", True, 2.5)
+
+        # Assert
+        assert controller.mode != "normal"
+        assert controller.snapshot()["providers"]["ollama:llama2"]["p95_ttft_seconds"] == 2.5
+
+    def test_one_healthy_provider_is_enough(self):
+        """Test that a healthy fallback keeps the service in normal mode"""
+        # Arrange
+        controller = SLOController(step_seconds=0)
+
+        # Act
+        fill(controller, "ollama:llama2", False, 0.1)
+        controller.level = 0
+        fill(controller, "chatgpt:gpt-4o-mini", True, 0.5)
+
+        # Assert
+        assert controller.evaluate() == "normal"
+
+    def test_stops_at_shed(self):
+        """Test that the mode never goes past shed"""
+        # Arrange
+        controller = SLOController(step_seconds=0)
+
+        # Act
+        fill(controller, "ollama:llama2", False, 0.1, count=10)
+
+        # Assert
+        assert controller.mode == "shed"
+
+    def test_recovers_with_hysteresis(self):
+        """Test that the mode only steps down after the provider stays comfortably healthy"""
+        # Arrange
+        controller = SLOController(ttft_p95_seconds=2.0, error_rate=0.2, window_seconds=60, recover_seconds=30)
+        controller.level = 2
+
+        # Act: just inside the SLO but not within the recovery margin
+        fill(controller, "ollama:llama2", True, 1.5, count=10)
+        still_degraded = controller.evaluate()
+        controller._samples.clear()
+        fill(controller, "ollama:llama2", True, 0.5, count=10)
+        controller.healthy_since -= 30
+        recovered = controller.evaluate()
+
+        # Assert
+        assert still_degraded == "fast_path_only"
+        assert recovered == "cache_first"
+        assert controller.healthy_since is None
+
+    def test_old_samples_expire(self):
+        """Test that samples older than the window no longer count"""
+        # Arrange
+        controller = SLOController(window_seconds=60, step_seconds=0)
+        fill(controller, "ollama:llama2", False, 0.1)
+        samples = controller._samples["ollama:llama2"]
+        controller._samples["ollama:llama2"] = type(samples)((at - 120, seconds, ok) for at, seconds, ok in samples)
+
+        # Act
+        snapshot = controller.snapshot()
+
+        # Assert
+        assert snapshot["providers"]["ollama:llama2"] is None
+
+
+class TestLLMAllowed:
+    """Test which messages may reach the LLM in each mode"""
+
+    @pytest.mark.parametrize("mode, intent, expected", [
+        ("normal", "add_items", True),
+        ("cache_first", "add_items", True),
+        ("fast_path_only", "complex", True),
+        ("fast_path_only", None, True),
+        ("fast_path_only", "add_items", False),
+        ("shed", "complex", False),
+        ("shed", None, False),
+    ])
+    def test_llm_allowed(self, mode, intent, expected):
+        """Test the per-mode rules"""
+        # Act & Assert
+        assert llm_allowed(mode, intent) == expected
+
+    def test_modes_are_ordered(self):
+        """Test that the levels go from least to most degraded"""
+        # Assert
+        assert slo.MODES == ("normal", "cache_first", "fast_path_only", "shed")
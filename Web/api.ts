@@ -32,6 +32,40 @@ export const markItemAsChecked = async (id: number, checked: boolean) => {
     return response.data
 }
 
+export interface ItemChange {
+    version: number
+    item: { id: number; description?: string; checked?: boolean }
+}
+
+// Subscribe to the live item feed; the browser reconnects (and receives a
+// fresh snapshot) on its own whenever the stream drops or the server resets it
+export const subscribeToItems = (
+    onSnapshot: (items: { id: number; description: string; checked: boolean }[]) => void,
+    onChange: (type: 'created' | 'updated' | 'deleted', change: ItemChange) => void
+) => {
+    const source = new EventSource(`${apiUrl}/items/stream`)
+
+    source.addEventListener('snapshot', (event) => {
+        onSnapshot(JSON.parse((event as MessageEvent).data).items)
+    })
+    for (const type of ['created', 'updated', 'deleted'] as const) {
+        source.addEventListener(type, (event) => {
+            onChange(type, JSON.parse((event as MessageEvent).data))
+        })
+    }
+    // Bulk writes arrive as one event listing every change they made
+    source.addEventListener('batch', (event) => {
+        const { changes } = JSON.parse((event as MessageEvent).data)
+        for (const { type, ...change } of changes) {
+            onChange(type, change)
+        }
+    })
+
+    return () => source.close()
+}
+
+let conversationId: string | null = null
+
 export const chat = async(message: string, onChunk?: (chunk: string) => void) => {
     try {
         const response = await fetch(`${apiUrl}/chat`, {
@@ -39,7 +73,7 @@ export const chat = async(message: string, onChunk?: (chunk: string) => void) =>
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ message })
+            body: JSON.stringify(conversationId ? { conversation_id: conversationId, message } : { message })
         })
 
         if (!response.ok) {
@@ -47,6 +81,8 @@ export const chat = async(message: string, onChunk?: (chunk: string) => void) =>
             throw new Error(`Chat request failed: ${response.status} - ${errorText}`)
         }
 
+        conversationId = response.headers.get('X-Conversation-Id') ?? conversationId
+
         if (!response.body) {
             throw new Error('Response body is empty')
         }
@@ -91,4 +127,53 @@ export const chat = async(message: string, onChunk?: (chunk: string) => void) =>
     }
 }
 
-export default api
\ No newline at end of file
+export default api
+
+export interface CommandResult {
+    command: string
+    value: string
+    status: 'ok' | 'not_found' | 'unknown_command'
+    item?: { id: number; description?: string; checked?: boolean }
+}
+
+// One WebSocket per voice session: every utterance is a single frame and the
+// reply arrives as a single result frame (stream: false)
+export const openChatSocket = () => {
+    const socket = new WebSocket(`${apiUrl.replace(/^http/, 'ws')}/ws/chat`)
+    const pending = new Map<string, { resolve: (results: CommandResult[]) => void; reject: (error: Error) => void }>()
+    let nextId = 0
+    // Interim transcripts and the final one share the id of the utterance
+    let utteranceId: string | null = null
+
+    socket.onmessage = (event) => {
+        const frame = JSON.parse(event.data)
+        const request = pending.get(frame.id)
+        if (!request) return
+        if (frame.type === 'result') {
+            pending.delete(frame.id)
+            request.resolve(frame.commands)
+        } else if (frame.type === 'cancelled' || frame.type === 'error') {
+            pending.delete(frame.id)
+            request.reject(new Error(frame.message ?? 'Cancelled'))
+        }
+    }
+    socket.onclose = () => {
+        pending.forEach(request => request.reject(new Error('Chat socket closed')))
+        pending.clear()
+    }
+
+    return {
+        isOpen: () => socket.readyState === WebSocket.OPEN,
+        partial: (text: string) => {
+            utteranceId = utteranceId ?? String(++nextId)
+            socket.send(JSON.stringify({ type: 'partial', id: utteranceId, text }))
+        },
+        chat: (message: string) => new Promise<CommandResult[]>((resolve, reject) => {
+            const id = utteranceId ?? String(++nextId)
+            utteranceId = null
+            pending.set(id, { resolve, reject })
+            socket.send(JSON.stringify({ type: 'chat', id, message, stream: false }))
+        }),
+        close: () => socket.close(),
+    }
+}
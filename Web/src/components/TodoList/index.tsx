@@ -1,6 +1,6 @@
-import React, { useState, useEffect, forwardRef, useImperativeHandle } from 'react';
+import React, { useState, useEffect, useRef, forwardRef, useImperativeHandle } from 'react';
 import './style.css';
-import { getGroceryList, addItem, deleteItem, markItemAsChecked, chat } from '../../../api';
+import { getGroceryList, addItem, deleteItem, markItemAsChecked, chat, subscribeToItems, openChatSocket } from '../../../api';
 import { toast } from 'react-toastify';
 import VoiceButton from '../VoiceButton';
 import { TrashIcon } from '../icons';
@@ -21,9 +21,37 @@ const TodoList = forwardRef<TodoListRef>((_props, ref) => {
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState<string | null>(null)
 
-  // Load todos from API on component mount
+  const chatSocket = useRef<ReturnType<typeof openChatSocket> | null>(null)
+
+  // Keep one chat connection open for the whole voice session
   useEffect(() => {
-    loadTodos()
+    const socket = openChatSocket()
+    chatSocket.current = socket
+    return () => socket.close()
+  }, [])
+
+  // Keep todos in sync with changes made by other devices and voice commands
+  useEffect(() => {
+    return subscribeToItems(
+      (items) => setTodos(items.map(item => ({
+        id: item.id,
+        description: item.description,
+        checked: item.checked || false
+      }))),
+      (type, { item }) => setTodos(current => {
+        if (type === 'deleted') {
+          return current.filter(todo => todo.id !== item.id)
+        }
+        const todo: Todo = {
+          id: item.id,
+          description: item.description ?? '',
+          checked: item.checked || false
+        }
+        return current.some(t => t.id === item.id)
+          ? current.map(t => (t.id === item.id ? todo : t))
+          : [...current, todo]
+      })
+    )
   }, [])
 
   // Expose refreshTodos method to parent component
@@ -66,7 +94,7 @@ const TodoList = forwardRef<TodoListRef>((_props, ref) => {
         description: description,
         checked: false
       }
-      setTodos([...todos, newTodo])
+      setTodos(current => current.some(t => t.id === newTodo.id) ? current : [...current, newTodo])
       setInputValue('')
       toast.success('Item added successfully!')
     } catch (err) {
@@ -129,8 +157,12 @@ const TodoList = forwardRef<TodoListRef>((_props, ref) => {
   const handleVoiceTranscript = async (text: string) => {
     try {
       setLoading(true)
-      await chat(text, () => {})
-      await loadTodos()
+      // The resulting changes arrive through the live item feed
+      if (chatSocket.current?.isOpen()) {
+        await chatSocket.current.chat(text)
+      } else {
+        await chat(text, () => {})
+      }
     } catch (err) {
       console.error('Voice command error:', err)
       toast.error('Voice command failed. Please try again.')
@@ -139,6 +171,13 @@ const TodoList = forwardRef<TodoListRef>((_props, ref) => {
     }
   }
 
+  // Lets the server resolve the command while the user is still speaking
+  const handleInterimTranscript = (text: string) => {
+    if (chatSocket.current?.isOpen()) {
+      chatSocket.current.partial(text)
+    }
+  }
+
   const retryLoad = () => {
     loadTodos()
   }
@@ -166,7 +205,11 @@ const TodoList = forwardRef<TodoListRef>((_props, ref) => {
           className="todo-input"
           disabled={loading}
         />
-        <VoiceButton onTranscript={handleVoiceTranscript} disabled={loading} />
+        <VoiceButton
+          onTranscript={handleVoiceTranscript}
+          onInterimTranscript={handleInterimTranscript}
+          disabled={loading}
+        />
         <button
           onClick={addTodo}
           className="add-button"
@@ -6,11 +6,12 @@ import { MicrophoneIcon, StopRecordingIcon } from '../icons';
 
 interface VoiceButtonProps {
   onTranscript: (text: string) => void;
+  onInterimTranscript?: (text: string) => void;
   disabled?: boolean;
   className?: string;
 }
 
-const VoiceButton: React.FC<VoiceButtonProps> = ({ onTranscript, disabled, className }) => {
+const VoiceButton: React.FC<VoiceButtonProps> = ({ onTranscript, onInterimTranscript, disabled, className }) => {
   const [isListening, setIsListening] = useState(false);
   const [speechSupported, setSpeechSupported] = useState(false);
   const recognitionRef = useRef<any>(null);
@@ -27,12 +28,16 @@ const VoiceButton: React.FC<VoiceButtonProps> = ({ onTranscript, disabled, class
 
     const recognition = new SpeechRecognition();
     recognition.continuous = false;
-    recognition.interimResults = false;
+    recognition.interimResults = Boolean(onInterimTranscript);
     recognition.lang = getLanguage();
     recognition.maxAlternatives = 1;
 
     recognition.onresult = (event: any) => {
       const transcript = event.results[0][0].transcript;
+      if (!event.results[0].isFinal) {
+        onInterimTranscript?.(transcript);
+        return;
+      }
       setIsListening(false);
       onTranscript(transcript);
     };